@@ -0,0 +1,348 @@
+"""
+Ascend AsyncSession module
+
+The AsyncSession module is the asyncio counterpart of `ascend.session`.
+It exposes the same request surface as `Session`, but every call is a
+coroutine, so many requests can be in flight on a single event loop.
+
+Requires the optional `aiohttp` dependency:
+
+```sh
+pip install "ascend-python-sdk[async]"
+```
+"""
+
+from ascend import ndjson
+from ascend.auth import AwsV4Auth, token_expiry
+from ascend.pool import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from ascend.session import TOKEN_REFRESH_AHEAD
+import ascend.cli.sh as sh
+
+import aiohttp
+import asyncio
+import contextlib
+import json
+import time
+
+# marker for exchange_tokens: exchange regardless of the current token
+_ANY_TOKEN = object()
+
+
+class AsyncSession:
+    """
+    AsyncSession implements an authenticated asyncio HTTP session to an
+    Ascend host, including handling token exchange.
+
+    The token exchange is deferred until the first request, since it
+    cannot happen in a constructor. The session should be closed when no
+    longer needed, either explicitly with `close()` or by using it as an
+    async context manager.
+
+    ```python
+    async with AsyncSession("trial.ascend.io", access_id, secret_key) as session:
+        flows = await asyncio.gather(*[
+            session.get(f"organizations/{ds}/projects") for ds in data_service_ids
+        ])
+    ```
+
+    # Parameters
+    environment_hostname (str):
+        hostname on which the Ascend environment you wish connect to is deployed
+    access_key (str):
+        Access Key ID you wish to use to authenticate with Ascend
+    secret_key (str):
+        Secret Access Key to use to authenticate with Ascend
+    verify (bool):
+        verify the server's SSL certificate
+        (default is `True`)
+    base_uri (str):
+        URL to send requests to instead of `https://<environment_hostname>:443/`
+        (default is `None`)
+    connect_timeout (float):
+        seconds to wait for a connection to the host, or `None` for no limit
+        (default is `ascend.pool.DEFAULT_CONNECT_TIMEOUT`)
+    read_timeout (float):
+        seconds to wait for each read of a response, or `None` for no limit;
+        there is no limit on a whole request, so streams may run for as long
+        as records keep arriving
+        (default is `ascend.pool.DEFAULT_READ_TIMEOUT`)
+    """
+
+    def __init__(self, environment_hostname, access_key, secret_key, verify=True, base_uri=None,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        if not access_key:
+            raise ValueError("Missing api access key")
+        if not secret_key:
+            raise ValueError("Missing api secret key")
+        if not environment_hostname:
+            raise ValueError("Missing environment hostname")
+
+        self.verify = verify
+        self.base_uri = base_uri or "https://{}:443/".format(environment_hostname)
+        self.timeout = (connect_timeout, read_timeout)
+        self.signed_auth = AwsV4Auth(access_key, secret_key, environment_hostname, "POST")
+        self.access_token = None
+        self.refresh_token = None
+        self._token_refresh_at = None
+        self._client = None
+        self._token_lock = None
+
+    @staticmethod
+    def from_session(session) -> 'AsyncSession':
+        """
+        Build an AsyncSession sharing the credentials and current tokens of a
+        blocking `ascend.session.Session`, so no extra token exchange is needed
+        once the Session has authenticated.
+
+        # Parameters
+        session (ascend.session.Session): the session to mirror
+
+        # Returns
+        AsyncSession: the new session
+        """
+        auth = session.signed_session.auth
+        async_session = AsyncSession(auth.environment_hostname, auth.access_key, auth.secret_key,
+                                     verify=session.verify, base_uri=session.base_uri,
+                                     connect_timeout=session.timeout[0],
+                                     read_timeout=session.timeout[1])
+        async_session._set_tokens(session.access_token, session.refresh_token)
+        return async_session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def _get_client(self) -> aiohttp.ClientSession:
+        # aiohttp sessions must be created inside a running event loop
+        if self._client is None:
+            connector = aiohttp.TCPConnector(ssl=None if self.verify else False)
+            # aiohttp limits whole requests to 5 minutes by default, which
+            # would cut long streams short
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout[0],
+                                            sock_read=self.timeout[1])
+            self._client = aiohttp.ClientSession(
+                connector=connector, headers={"Ascend-Service-Name": "sdk"}, timeout=timeout)
+            self._token_lock = asyncio.Lock()
+        return self._client
+
+    async def _token_exchange(self, headers):
+        async with self._get_client().post(self.base_uri + "authn/tokenExchange",
+                                           headers=headers) as resp:
+            resp.raise_for_status()
+            respJson = await resp.json(content_type=None)
+        self._set_tokens(respJson["data"]["access_token"], respJson["data"]["refresh_token"])
+
+    def _set_tokens(self, access_token, refresh_token):
+        self.access_token, self.refresh_token = access_token, refresh_token
+        expiry = token_expiry(access_token)
+        if expiry is None:
+            self._token_refresh_at = None
+            return
+        lifetime = max(0.0, expiry - time.time())
+        self._token_refresh_at = time.monotonic() + lifetime - min(TOKEN_REFRESH_AHEAD,
+                                                                   lifetime / 5)
+
+    async def init_token_exchange(self):
+        await self._token_exchange(self.signed_auth.signed_headers(self.base_uri + "authn/tokenExchange"))
+
+    async def refresh_token_exchange(self):
+        await self._token_exchange({'Authorization': 'RefreshToken ' + self.refresh_token})
+
+    async def exchange_tokens(self, stale_token=_ANY_TOKEN):
+        """
+        Exchange tokens, unless another coroutine already replaced `stale_token`
+        while this one was waiting, so a burst of 401s results in one exchange.
+        """
+        self._get_client()
+        async with self._token_lock:
+            if stale_token is not _ANY_TOKEN and self.access_token != stale_token:
+                return
+            if self.refresh_token:
+                try:
+                    await self.refresh_token_exchange()
+                    return
+                except aiohttp.ClientResponseError as e:
+                    # spent, such as by the blocking session this one mirrors
+                    if e.status != 401:
+                        raise
+                    sh.debug('refresh token rejected; exchanging the access keys again')
+            await self.init_token_exchange()
+
+    @contextlib.asynccontextmanager
+    async def request_with_bearer(self, method, url, **kwargs):
+        resp = await self._send_with_bearer(method, url, **kwargs)
+        try:
+            yield resp
+        finally:
+            resp.release()
+
+    async def _send_with_bearer(self, method, url, **kwargs):
+        sh.debug(f'{method} {url}')
+        if self.access_token is None:
+            await self.exchange_tokens(stale_token=None)
+        elif self._token_refresh_at is not None and time.monotonic() >= self._token_refresh_at:
+            # refreshed ahead of its expiry, in one exchange for every task
+            await self.exchange_tokens(stale_token=self.access_token)
+        client = self._get_client()
+        token = self.access_token
+        resp = await client.request(method, url, headers={'Authorization': 'Bearer ' + token}, **kwargs)
+        if resp.status == 401:
+            resp.release()
+            await self.exchange_tokens(stale_token=token)
+            resp = await client.request(
+                method, url, headers={'Authorization': 'Bearer ' + self.access_token}, **kwargs)
+        return resp
+
+    async def delete(self, endpoint, service='api'):
+        """
+        Make a DELETE request
+
+        # Parameters
+        endpoint (str):
+            the partial URL of the request (does not include hostname or API prefix)
+
+        # Returns
+        int: the HTTP response code status
+        """
+        async with self.request_with_bearer('DELETE', self.make_url(endpoint, service)) as resp:
+            resp.raise_for_status()
+            return resp.status
+
+    async def get(self, endpoint, query=None, service='api'):
+        """
+        Make a GET request.
+
+        # Parameters
+        endpoint (str):
+            the partial URL of the request (does not include hostname or API prefix)
+        query (dict):
+            query parameters to send with the request
+
+        # Returns
+        dict: the parsed JSON response
+        """
+        async with self.request_with_bearer(
+                'GET', self.make_url(endpoint, service), params=_query_params(query)) as resp:
+            if resp.status == 404:
+                raise KeyError(resp.reason)
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def patch(self, endpoint, data=None, service='api', return_json=False):
+        """
+        Make a PATCH request.
+
+        # Parameters
+        endpoint (str):
+            the partial URL of the request (does not include hostname or API prefix)
+        data (dict):
+            JSON to send in the request body
+        return_json (bool):
+            return the parsed JSON response instead of the status code
+            (default is `False`)
+
+        # Returns
+        int: the HTTP response status code, or
+        dict: the parsed JSON response (empty if there is no body), with `return_json`
+        """
+        async with self.request_with_bearer(
+                'PATCH', self.make_url(endpoint, service), data=json.dumps(data)) as resp:
+            resp.raise_for_status()
+            if return_json:
+                body = await resp.read()
+                return json.loads(body) if body else {}
+            return resp.status
+
+    async def post(self, endpoint, data=None, service='api'):
+        """
+        Make a POST request.
+
+        # Parameters
+        endpoint (str):
+            the partial URL of the request (does not include hostname or API prefix)
+        data (dict):
+            JSON to send in the request body
+
+        # Returns
+        dict: the parsed JSON response
+        """
+        async with self.request_with_bearer(
+                'POST', self.make_url(endpoint, service), data=json.dumps(data)) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    def make_url(self, endpoint, service):
+        return f'{self.base_uri}{service}/v1/{endpoint}'
+
+    async def stream(self, endpoint, query=None, service='api', transform=None):
+        """
+        Make a GET request and process the results as a stream of JSON lines
+
+        ```python
+        async for row in session.stream(f"{component.resource_path}/records-stream"):
+            ...
+        ```
+
+        # Parameters
+        endpoint (str):
+            the partial URL of the request (does not include hostname or API prefix)
+        query (dict):
+            query parameters to send with the request
+        transform (callable):
+            if given, called with each list of lines decoded together, to return
+            those to yield instead (see `ascend.ndjson.decode_chunks`)
+
+        # Returns
+        AsyncIterator<dict>: an async iterator over the parsed JSON lines
+        """
+        batches = self.stream_batches(endpoint, query, service, transform)
+        try:
+            async for values in batches:
+                for row in values:
+                    yield row
+        finally:
+            await batches.aclose()
+
+    async def stream_batches(self, endpoint, query=None, service='api', transform=None):
+        """
+        As `stream`, but yield the lines decoded from each chunk of the
+        response together, as a list, rather than one at a time.
+
+        # Returns
+        AsyncIterator<list>: an async iterator over non-empty lists of parsed JSON lines
+        """
+        # released here rather than by a context manager, which is a generator
+        # the loop could close first, if this one is left unclosed
+        resp = await self._send_with_bearer(
+            'GET', self.make_url(endpoint, service), params=_query_params(query))
+        try:
+            resp.raise_for_status()
+            decoder = ndjson.NDJSONDecoder()
+            async for chunk in resp.content.iter_any():
+                values = decoder.decode(chunk)
+                if transform is not None:
+                    values = transform(values)
+                if values:
+                    yield values
+            values = decoder.flush()
+            if transform is not None:
+                values = transform(values)
+            if values:
+                yield values
+        finally:
+            resp.release()
+
+
+def _query_params(query):
+    # unlike requests, aiohttp only accepts str query values; like requests,
+    # parameters whose value is None are left out
+    if not query:
+        return None
+    return {k: str(v) for k, v in query.items() if v is not None}
@@ -11,10 +11,14 @@ but the keys used will be generated and authenticated by Ascend, not AWS.
 from ascend.util import create_signature_key
 from datetime import datetime
 from requests.auth import AuthBase
+from typing import Optional
 from urllib.parse import quote, urlparse
 
+import base64
+import binascii
 import hashlib
 import hmac
+import json
 
 SIGNED_REGION = ""
 SIGNED_SERVICE = "ascend"
@@ -37,12 +41,25 @@ class AwsV4Auth(AuthBase):
         return self.add_request_auth_headers(req)
 
     def add_request_auth_headers(self, req):
-        curr_timestamp = datetime.utcnow()
+        req.headers.update(self.signed_headers(req.url))
+
+        return req
+
+    def signed_headers(self, url, timestamp=None):
+        """
+        Compute the SigV4 headers for a request to `url`.
+
+        Kept separate from `add_request_auth_headers` so that transports
+        other than `requests` can sign their requests. `timestamp` defaults
+        to now; a verifier passes the request's `X-Amz-Date` to recompute
+        the signature.
+        """
+        curr_timestamp = timestamp or datetime.utcnow()
         amz_timestamp = curr_timestamp.strftime(ISO8601_FORMAT)  # Needed for x-amz-date header
         date_timestamp = curr_timestamp.strftime(DATE_FORMAT)  # Needed for Authorization header
 
         # Step 1: Create a Canonical Request
-        parsed_url = urlparse(req.url)
+        parsed_url = urlparse(str(url))
         canonical_path = quote(parsed_url.path if parsed_url.path else "/", safe="/-_.~")
 
         canonical_query = ""
@@ -90,10 +107,7 @@ class AwsV4Auth(AuthBase):
             scope,
             signed_headers,
             signature)
-        headers = {'X-Amz-Date': amz_timestamp, 'Authorization': authz_header}
-        req.headers.update(headers)
-
-        return req
+        return {'X-Amz-Date': amz_timestamp, 'Authorization': authz_header}
 
 
 class BearerAuth(AuthBase):
@@ -124,3 +138,17 @@ class RefreshAuth(AuthBase):
         req.headers.update(header)
 
         return req
+
+
+def token_expiry(token) -> Optional[float]:
+    """
+    The expiry of an access token shaped like a JWT, in seconds since the
+    epoch, read from its `exp` claim without verifying it, or `None` if the
+    token has no readable expiry.
+    """
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError, binascii.Error):
+        return None
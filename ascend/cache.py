@@ -0,0 +1,414 @@
+"""
+Ascend Cache module
+
+Opt-in, on-disk caches: `SnapshotCache` holds the raw JSON responses used to
+build `ascend.model` objects, so repeated CLI invocations do not have to
+re-crawl the environment, `RecordCache` holds the records of components, and
+`TokenCache` holds the tokens exchanged for access keys.
+
+Snapshot entries live under `~/.ascend/cache/<host>/<service>/<endpoint path>/`,
+one file per query string, and expire after a TTL. Writes through the `Session`
+invalidate the data service or dataflow they touched, so `apply` and `delete`
+never leave stale entries behind.
+"""
+
+from ascend import ndjson
+from itertools import islice
+from typing import Iterator, Optional
+from urllib.parse import urlencode, quote
+
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import ascend.cli.sh as sh
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_CACHE_DIR = '~/.ascend/cache'
+
+# listings which aggregate across data services, invalidated on any write
+GLOBAL_ENDPOINTS = [('api', 'data-feeds'), ('authz', '')]
+
+
+class SnapshotCache:
+    """
+    SnapshotCache stores API responses for one Ascend host on disk.
+
+    # Parameters
+    hostname (str):
+        hostname of the Ascend environment, used to namespace entries
+    ttl (float):
+        number of seconds an entry stays valid
+    cache_dir (str):
+        directory in which to store entries
+        (default is `~/.ascend/cache`)
+    """
+
+    def __init__(self, hostname, ttl, cache_dir=DEFAULT_CACHE_DIR):
+        if ttl is None or ttl <= 0:
+            raise ValueError("Cache ttl must be a positive number of seconds")
+        self.ttl = ttl
+        self.root = os.path.join(os.path.expanduser(cache_dir), quote(hostname, safe=''))
+
+    def _dir(self, service, endpoint):
+        path = endpoint.split('?', 1)[0]
+        segments = [quote(s, safe='') for s in path.split('/') if s]
+        return os.path.join(self.root, service, *segments)
+
+    def _file(self, service, endpoint, query):
+        params = []
+        if '?' in endpoint:
+            params.append(endpoint.split('?', 1)[1])
+        if query:
+            params.append(urlencode(sorted(query.items())))
+        return os.path.join(self._dir(service, endpoint), '@' + quote('&'.join(params), safe='') + '.json')
+
+    def get(self, service, endpoint, query=None):
+        """
+        Get a cached response.
+
+        # Returns
+        dict: the parsed JSON response, or `None` if missing or expired
+        """
+        path = self._file(service, endpoint, query)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, service, endpoint, query, data):
+        path = self._file(service, endpoint, query)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            # write then rename, so concurrent readers never see a partial entry
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except OSError:
+            # the cache is best effort
+            pass
+
+    def invalidate(self, service, endpoint):
+        """
+        Drop everything a write to `endpoint` may have changed: the enclosing
+        dataflow (or data service) with everything below it, the listings
+        above it, and listings which aggregate across data services.
+        """
+        segments = [s for s in endpoint.split('?', 1)[0].split('/') if s]
+        if len(segments) >= 4 and segments[0] == 'organizations' and segments[2] == 'projects':
+            scope = segments[:4]
+        else:
+            scope = segments[:2]
+        shutil.rmtree(self._dir(service, '/'.join(scope)), ignore_errors=True)
+        for i in range(len(scope)):
+            self._remove_entries(self._dir(service, '/'.join(scope[:i])))
+        for global_service, global_endpoint in GLOBAL_ENDPOINTS:
+            shutil.rmtree(self._dir(global_service, global_endpoint), ignore_errors=True)
+
+    def _remove_entries(self, directory):
+        # only the entries for this path, not those of its children
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith('@') and name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+DEFAULT_RECORDS_DIR = '~/.ascend/records'
+# bytes read from a cached file at a time
+RECORDS_READ_SIZE = 256 * 1024
+# records encoded per write to a cached file
+RECORDS_WRITE_BATCH = 1000
+
+
+class RecordCache:
+    """
+    RecordCache stores the records of components for one Ascend host on disk,
+    as gzipped JSON lines, so that reading records which have not changed
+    does not download them again.
+
+    Entries are keyed by component uuid and a fingerprint of the component's
+    JSON definition, under `~/.ascend/records/<host>/<uuid>/<fingerprint>/`,
+    so any change the API reports on a component makes its entries stale. A
+    full read of a component also serves later reads of any range of its
+    records. Reading an entry marks it as recently used, and once the cache
+    grows past `max_bytes`, the least recently used entries are removed.
+
+    # Parameters
+    hostname (str):
+        hostname of the Ascend environment, used to namespace entries
+    max_bytes (int):
+        maximum total size of the cached files
+    cache_dir (str):
+        directory in which to store entries
+        (default is `~/.ascend/records`)
+    """
+
+    def __init__(self, hostname, max_bytes, cache_dir=DEFAULT_RECORDS_DIR):
+        if max_bytes is None or max_bytes <= 0:
+            raise ValueError("Record cache size must be a positive number of bytes")
+        self.max_bytes = max_bytes
+        self.root = os.path.join(os.path.expanduser(cache_dir), quote(hostname, safe=''))
+
+    @staticmethod
+    def fingerprint(definition) -> str:
+        """
+        Fingerprint of a component's JSON definition.
+        """
+        canonical = json.dumps(definition, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+    def _dir(self, component_uuid, fingerprint):
+        return os.path.join(self.root, quote(component_uuid, safe=''), fingerprint)
+
+    def _file(self, component_uuid, fingerprint, offset, limit):
+        return os.path.join(self._dir(component_uuid, fingerprint), f'{offset}-{limit}.jsonl.gz')
+
+    def get(self, component_uuid, fingerprint, offset=0, limit=0) -> Optional[Iterator[dict]]:
+        """
+        Get cached records: those of the same range, or else a slice of all
+        the records of the component.
+
+        # Returns
+        Iterator<dict>: the records, or `None` if they are not cached
+        """
+        exact = self._file(component_uuid, fingerprint, offset, limit)
+        for path in (exact, self._file(component_uuid, fingerprint, 0, 0)):
+            try:
+                f = gzip.open(path, 'rb')
+            except OSError:
+                continue
+            with contextlib.suppress(OSError):
+                # mark as recently used
+                os.utime(path)
+            rows = self._read(f)
+            if path != exact:
+                rows = islice(rows, offset, offset + limit if limit else None)
+            return rows
+        return None
+
+    @staticmethod
+    def _read(f):
+        with f:
+            yield from ndjson.decode_chunks(iter(lambda: f.read(RECORDS_READ_SIZE), b''))
+
+    def write_through(self, component_uuid, fingerprint, offset, limit, rows) -> Iterator[dict]:
+        """
+        Yield `rows` while writing them to the cache. The entry is only stored
+        once every record has been read, so a read which fails or stops early
+        leaves nothing behind.
+        """
+        directory = self._dir(component_uuid, fingerprint)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        except OSError:
+            # the cache is best effort
+            yield from rows
+            return
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile('', 'wb', 1, raw) as f:
+                rows = iter(rows)
+                while True:
+                    batch = list(islice(rows, RECORDS_WRITE_BATCH))
+                    if not batch:
+                        break
+                    f.write(b''.join(map(ndjson.encode_line, batch)))
+                    yield from batch
+            os.replace(tmp, self._file(component_uuid, fingerprint, offset, limit))
+            complete = True
+        finally:
+            if not complete:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp)
+        self._remove_stale(component_uuid, fingerprint)
+        self.evict()
+
+    def _remove_stale(self, component_uuid, fingerprint):
+        # entries for earlier definitions of the component will never be read
+        directory = os.path.dirname(self._dir(component_uuid, fingerprint))
+        with contextlib.suppress(OSError):
+            for name in os.listdir(directory):
+                if name != fingerprint:
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    def size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.jsonl.gz'):
+                    path = os.path.join(directory, name)
+                    with contextlib.suppress(OSError):
+                        stat = os.stat(path)
+                        yield path, stat.st_mtime, stat.st_size
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                total -= size
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+DEFAULT_TOKENS_DIR = '~/.ascend/tokens'
+# seconds between attempts to lock a token file, where locks cannot block
+TOKEN_LOCK_POLL = 0.05
+
+
+class TokenCache:
+    """
+    TokenCache stores the access and refresh tokens exchanged for access keys
+    on disk, so that each CLI invocation or process using the same keys does
+    not exchange them again while a token is still valid.
+
+    Entries are keyed by hostname and access key, one file under
+    `~/.ascend/tokens/` each, named by a hash of the two so that neither is
+    written in the clear. The tokens are not encrypted: like the credentials
+    file, the directory and files are only readable by their owner, and an
+    entry which is readable by anyone else, or owned by another user, is
+    ignored. Processes sharing an entry take its lock around reading and
+    replacing it, so that one exchanges tokens while the others wait for its
+    result, and no refresh token is used twice.
+
+    # Parameters
+    cache_dir (str):
+        directory in which to store entries
+        (default is `~/.ascend/tokens`)
+    """
+
+    def __init__(self, cache_dir=DEFAULT_TOKENS_DIR):
+        self.root = os.path.expanduser(cache_dir)
+
+    def _file(self, hostname, access_key):
+        key = hashlib.sha256(f'{hostname}\0{access_key}'.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.root, key + '.json')
+
+    @contextlib.contextmanager
+    def lock(self, hostname, access_key):
+        """
+        Hold the lock on the entry for `hostname` and `access_key`, shared
+        between processes, for the duration of the block. The cache is best
+        effort: if the lock file cannot be opened, the block runs unlocked.
+        """
+        try:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            fd = os.open(self._file(hostname, access_key) + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            sh.debug(f'unable to lock the token cache: {e!r}')
+            yield
+            return
+        try:
+            _lock_file(fd)
+            try:
+                yield
+            finally:
+                _unlock_file(fd)
+        finally:
+            os.close(fd)
+
+    def get(self, hostname, access_key) -> Optional[dict]:
+        """
+        Get the cached tokens for `hostname` and `access_key`.
+
+        # Returns
+        dict: the `access_token` and `refresh_token`, or `None` if missing,
+        unreadable or readable by other users
+        """
+        path = self._file(hostname, access_key)
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+        except OSError:
+            return None
+        with os.fdopen(fd) as f:
+            try:
+                if not _private(os.fstat(fd)):
+                    sh.warn(f'Ignoring cached tokens in {path}: the file must be readable '
+                            f'by its owner only')
+                    return None
+                data = json.load(f)
+            except (OSError, ValueError):
+                return None
+        if not isinstance(data, dict) or not data.get('access_token'):
+            return None
+        return data
+
+    def put(self, hostname, access_key, access_token, refresh_token):
+        try:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            # mkstemp creates the file readable by its owner only
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'access_token': access_token, 'refresh_token': refresh_token}, f)
+            os.replace(tmp, self._file(hostname, access_key))
+        except OSError as e:
+            sh.debug(f'unable to cache tokens: {e!r}')
+
+    def remove(self, hostname, access_key):
+        with contextlib.suppress(OSError):
+            os.remove(self._file(hostname, access_key))
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _private(stat) -> bool:
+    # owned by this user, and not readable or writable by anyone else
+    if not hasattr(os, 'getuid'):
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+
+def _lock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(TOKEN_LOCK_POLL)
+
+
+def _unlock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
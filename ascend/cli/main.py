@@ -1,8 +1,11 @@
 from ascend.client import Client
+from ascend.pool import DEFAULT_POOL_SIZE
 from ascend.resource_definitions import ResourceSession
 from ascend.cli import cli, global_values
 from ascend.cli import sh
 from ascend import credentials
+from ascend import records as ascend_records
+from requests import HTTPError
 
 import contextlib
 import subprocess
@@ -32,13 +35,62 @@ delete_flag = cli.Flag("--delete", "-d", default=None, required=False, action="s
 credentials_flag = cli.Flag("--credentials",
                             help="(Deprecated) Override component credentials file to use")
 
+jobs_flag = cli.Flag("--jobs", "-j", type=int, default=1,
+                     help="number of concurrent API requests to use when loading resources")
+
+cache_flag = cli.Flag("--cache-ttl", type=float, default=None,
+                      help="cache API responses under ~/.ascend/cache for this many seconds, "
+                           "so repeated commands do not re-download the environment")
+
 dry_run_flag = cli.Flag("--dry-run", default=False, action="store_true",
                         help="Do not run commands against API (can cause premature failures)")
+plan_flag = cli.Flag("--plan", default=False, action="store_true",
+                     help="Print which resources would be created, updated, deleted or left "
+                          "unchanged, without applying anything")
+records_resource_flag = cli.Flag("resource", help="component to read, as "
+                                                   "`data_service.dataflow.component`, or data feed, "
+                                                   "as `data_service.data_feed`")
+records_output_flag = cli.Flag("--output", "-o", default=None, required=False,
+                               help="output file, otherwise will go to stdout. The format and "
+                                    "compression follow the extension: .jsonl, .csv or .parquet, "
+                                    "optionally followed by .gz")
+format_flag = cli.Flag("--format", "-f", default=None, choices=sorted(ascend_records.OUTPUT_FORMATS),
+                       help="output format, overriding the extension of the output file "
+                            "(default jsonl)")
+gzip_flag = cli.Flag("--gzip", "-z", default=False, action="store_true",
+                     help="gzip the output; Parquet columns are compressed with gzip instead")
+offset_flag = cli.Flag("--offset", type=int, default=0,
+                       help="index of the first record to read")
+limit_flag = cli.Flag("--limit", type=int, default=0,
+                      help="maximum number of records to read, or 0 for all of them")
+parallel_flag = cli.Flag("--parallel", "-p", type=int, default=1,
+                         help="number of concurrent connections downloading ranges of records")
+retries_flag = cli.Flag("--retries", type=int, default=ascend_records.DEFAULT_RETRIES,
+                        help="times to reconnect in a row when the stream drops, resuming after "
+                             "the records already read")
+columns_flag = cli.Flag("--columns", "-c", default=None,
+                        help="comma-separated names of the columns to write, in order")
+where_flag = cli.Flag("--where", "-w", default=None,
+                      help="only write records matching this expression, such as "
+                           "`value > 10 and name is not None`")
+records_cache_flag = cli.Flag("--records-cache-mb", type=float, default=None,
+                              help="cache records under ~/.ascend/records, using up to this many "
+                                   "megabytes, and read them from there while the component is "
+                                   "unchanged")
+
+force_flag = cli.Flag("--force", default=False, action="store_true",
+                      help="Apply every resource, including those that match what is deployed")
+
+
+def pool_size(concurrency):
+    # a connection for each concurrent request, besides the token exchanges
+    return max(DEFAULT_POOL_SIZE, concurrency + 1)
 
 
 class FailureHandler(contextlib.AbstractContextManager):
-    def __init__(self, name):
+    def __init__(self, name, subject='resource definition(s)'):
         self.name = name
+        self.subject = subject
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is None:
@@ -48,7 +100,7 @@ class FailureHandler(contextlib.AbstractContextManager):
             if isinstance(exc_val, KeyError):
                 sh.die(f"Resource does not exist: {exc_val}")
             else:
-                sh.die(f"Unable to {self.name} resource definition(s): {exc_val}")
+                sh.die(f"Unable to {self.name} {self.subject}: {exc_val}")
 
 
 @cli.command_from_block
@@ -83,6 +135,8 @@ class app:
             output_flag,
             host_flag,
             resource_flag,
+            jobs_flag,
+            cache_flag,
         ]
 
         def action(args):
@@ -92,8 +146,9 @@ class app:
                 return
 
             with FailureHandler('get'):
-                client = Client.build(hostname=args.host)
-                rs = ResourceSession(client, client.get_session())
+                client = Client.build(hostname=args.host, cache_ttl=args.cache_ttl,
+                                      pool_size=pool_size(args.jobs))
+                rs = ResourceSession(client, client.get_session(), jobs=args.jobs)
                 rs.get(args.resource, args)
 
 
@@ -109,11 +164,16 @@ class app:
             credentials_flag,
             resource_flag,
             dry_run_flag,
+            plan_flag,
+            force_flag,
+            jobs_flag,
+            cache_flag,
         ]
 
         def action(args):
             with FailureHandler('apply'):
-                client = Client.build(hostname=args.host)
+                client = Client.build(hostname=args.host, cache_ttl=args.cache_ttl,
+                                      pool_size=pool_size(args.jobs))
                 if args.config is not None:
                     config_file = args.config
                     try:
@@ -124,7 +184,7 @@ class app:
                 else:
                     args.config = {}
 
-                rs = ResourceSession(client, client.get_session())
+                rs = ResourceSession(client, client.get_session(), jobs=args.jobs)
                 rs.apply(args.resource, {}, args)
 
     @subcommands.append
@@ -135,12 +195,15 @@ class app:
             host_flag,
             resource_flag,
             dry_run_flag,
+            jobs_flag,
+            cache_flag,
         ]
 
         def action(args):
             with FailureHandler('delete'):
-                client = Client.build(hostname=args.host)
-                rs = ResourceSession(client, client.get_session())
+                client = Client.build(hostname=args.host, cache_ttl=args.cache_ttl,
+                                      pool_size=pool_size(args.jobs))
+                rs = ResourceSession(client, client.get_session(), jobs=args.jobs)
                 rs.delete(args.resource, args)
 
     @subcommands.append
@@ -150,14 +213,72 @@ class app:
             recursive_flag,
             host_flag,
             resource_flag,
+            jobs_flag,
+            cache_flag,
         ]
 
         def action(args):
             with FailureHandler('list'):
-                client = Client.build(hostname=args.host)
-                rs = ResourceSession(client, client.get_session())
+                client = Client.build(hostname=args.host, cache_ttl=args.cache_ttl,
+                                      pool_size=pool_size(args.jobs))
+                rs = ResourceSession(client, client.get_session(), jobs=args.jobs)
                 rs.list(args.resource, args.recursive)
 
+    @subcommands.append
+    @cli.command_from_block
+    class records:
+        plugins = [
+            host_flag,
+            records_resource_flag,
+            records_output_flag,
+            format_flag,
+            gzip_flag,
+            offset_flag,
+            limit_flag,
+            parallel_flag,
+            retries_flag,
+            columns_flag,
+            where_flag,
+            records_cache_flag,
+        ]
+
+        def action(args):
+            path = args.output or '-'
+            fmt, compress = ascend_records.output_format(path)
+            fmt = args.format or fmt or 'jsonl'
+            compress = compress or args.gzip
+            parts = args.resource.split('.')
+            if len(parts) not in (2, 3):
+                sh.die(f"Expected `data_service.dataflow.component` or "
+                       f"`data_service.data_feed`, got `{args.resource}`")
+
+            with FailureHandler('read', 'records'):
+                cache_size = int(args.records_cache_mb * 1024 * 1024) \
+                    if args.records_cache_mb else None
+                client = Client.build(hostname=args.host, records_cache_size=cache_size,
+                                      pool_size=pool_size(args.parallel))
+                if len(parts) == 3:
+                    component = client.get_component(*parts)
+                else:
+                    component = client.get_data_feed(*parts)
+                columns = [c.strip() for c in args.columns.split(',')] if args.columns else None
+                schema = None
+                if fmt != 'jsonl':
+                    try:
+                        schema = component.get_schema()
+                    except (HTTPError, KeyError) as e:
+                        # a 404 on the lineage raises KeyError
+                        sh.debug(f'no schema for {args.resource}, using the first record: {e}')
+                if schema is not None and columns is not None:
+                    types = dict(schema)
+                    schema = [(name, types.get(name)) for name in columns]
+                rows = component.get_records(offset=args.offset, limit=args.limit,
+                                             parallel=args.parallel, retries=args.retries,
+                                             columns=columns, where=args.where)
+                count = ascend_records.write_records(rows, path, fmt, compress, schema)
+                if args.output:
+                    sh.info(f'wrote {count} records to {path}')
+
 
 if __name__ == "__main__":
     app.main()
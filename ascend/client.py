@@ -5,8 +5,11 @@ The Client module of the Ascend SDK manages an API connection to
 an Ascend environment.
 """
 
+from ascend import records
+from ascend.cache import RecordCache, SnapshotCache, TokenCache
 from ascend.model import Component, DataFeed, Dataflow, DataService
 from ascend.lineage import LineageGraph
+from ascend.pool import DEFAULT_POOL_SIZE
 from ascend.session import Session
 from urllib.error import HTTPError
 from ascend.credentials import Credential, CredentialEntry
@@ -53,14 +56,56 @@ class Client(object):
     verify (bool):
         Verify the server's SSL certificate
         (default is `True`)
+    cache_ttl (float):
+        If given, cache API responses on disk under `~/.ascend/cache` for this
+        many seconds. Writes made through this Client invalidate affected entries.
+        (default is `None`, no caching)
+    base_uri (str):
+        URL of the Ascend API, if not `https://<environment_hostname>:443/`
+        (default is `None`)
+    records_cache_size (int):
+        If given, cache the records read with `get_records` on disk under
+        `~/.ascend/records`, using up to this many bytes. Cached records are
+        read again for as long as the component's definition is unchanged.
+        (default is `None`, no caching)
+    retry (ascend.session.RetryPolicy):
+        When and how often to send requests again after transient failures,
+        such as throttling.
+        (default is `None`, the Session's default policy)
+    token_cache (bool):
+        Cache the tokens exchanged for the access key under `~/.ascend/tokens`,
+        readable by the current user only, and reuse them in later Clients and
+        processes while they are valid, rather than exchange the keys again.
+        (default is `False`)
+    pool_size (int):
+        Number of connections to keep open for reuse; at least the number of
+        concurrent requests made through this Client, so that none opens a
+        connection of its own.
+        (default is `None`, `ascend.pool.DEFAULT_POOL_SIZE`)
     """
 
-    def __init__(self, environment_hostname, access_key=None, secret_key=None, verify=True):
+    def __init__(self, environment_hostname, access_key=None, secret_key=None, verify=True,
+                 cache_ttl=None, base_uri=None, records_cache_size=None, retry=None,
+                 token_cache=False, pool_size=None):
+        cache = SnapshotCache(environment_hostname, cache_ttl) if cache_ttl else None
+        record_cache = RecordCache(environment_hostname, records_cache_size) \
+            if records_cache_size else None
         if access_key is not None and secret_key is not None:
-            self.session = Session(environment_hostname, access_key, secret_key, verify)
+            self.session = Session(environment_hostname, access_key, secret_key, verify, cache=cache,
+                                   base_uri=base_uri, record_cache=record_cache, retry=retry,
+                                   token_cache=TokenCache() if token_cache else None,
+                                   pool_size=pool_size or DEFAULT_POOL_SIZE)
 
     @staticmethod
-    def build(hostname: str) -> 'Client':
+    def build(hostname: str, cache_ttl=None, records_cache_size=None, retry=None,
+              token_cache=None, pool_size=None) -> 'Client':
+        """
+        Build a Client for `hostname` with the credentials in the environment
+        variables `ASCEND_ACCESS_KEY_ID` and `ASCEND_SECRET_ACCESS_KEY`, or else
+        in the profile of `~/.ascend/credentials` named for the host. The token
+        cache is used if `token_cache` is true or, when `None`, if the
+        environment variable `ASCEND_TOKEN_CACHE` is.
+        """
         if hostname.endswith(".ascend.io"):
             profile = hostname[:-10]
         else:
@@ -84,8 +129,12 @@ class Client(object):
 
         if not access_key or not secret_key:
             raise ValueError("Must have credentials to build client.")
+        if token_cache is None:
+            token_cache = sh.getenvbool("ASCEND_TOKEN_CACHE")
 
-        return Client(hostname, access_key=access_key, secret_key=secret_key, verify=verify_ssl)
+        return Client(hostname, access_key=access_key, secret_key=secret_key, verify=verify_ssl,
+                      cache_ttl=cache_ttl, records_cache_size=records_cache_size, retry=retry,
+                      token_cache=token_cache, pool_size=pool_size)
 
     def get_session(self):
         """
@@ -199,6 +248,60 @@ class Client(object):
             pub_list
         ))
 
+    async def read_data_feeds(self, data_feeds, offset=0, limit=0, columns=None, where=None,
+                              queue_size=records.DEFAULT_MERGE_QUEUE_SIZE, session=None):
+        """
+        Stream the records of several Data Feeds concurrently, merged into one
+        async iterator of `(data_feed, record)` pairs as the records arrive.
+
+        ```python
+        feeds = client.list_data_feeds("my_data_service")
+        async for feed, record in client.read_data_feeds(feeds):
+            print(feed.data_feed_id, record)
+        ```
+
+        The records of each Data Feed come in order, interleaved with those of
+        the others (see `records.merge_records`). Requires the optional
+        `aiohttp` dependency.
+
+        # Parameters
+        data_feeds (List<ascend.model.DataFeed>):
+            the Data Feeds, or any Components, to read
+        offset (int):
+            index at which the records of each Data Feed start streaming from
+        limit (int):
+            maximum number of records returned for each Data Feed
+        columns (list):
+            names of the columns to keep in each record
+        where (callable or str):
+            filter on the records
+            (see `ascend.model.Component.get_records`)
+        queue_size (int):
+            maximum number of batches of records buffered ahead of the consumer
+        session (ascend.async_session.AsyncSession):
+            the session to stream with
+            (default is a session sharing the tokens of the Client's session,
+            closed once the records are read)
+
+        # Returns
+        AsyncIterator<tuple>: `(data_feed, record)` pairs
+
+        # Raises
+        ValueError: on invalid query parameter inputs
+        aiohttp.ClientResponseError:  on API errors
+        """
+        selection = records.selection(columns, where)
+        sources = [(feed, feed.resource_path + "/records-stream") for feed in data_feeds]
+        async with records.mirror_session(self.session, session) as async_session:
+            merged = records.merge_records(async_session, sources, offset, limit, selection,
+                                           queue_size)
+            try:
+                async for pair in merged:
+                    yield pair
+            finally:
+                # stop the streams before the session they read from is closed
+                await merged.aclose()
+
     def create_credential_entry(self, org_id, entry: 'CredentialEntry') -> 'CredentialEntry':
         payload = entry.get_creation_payload()
         sh.debug(f'create payload: {payload}')
@@ -0,0 +1,926 @@
+"""
+Ascend Fake API module
+
+A local stand-in for the parts of the Ascend API which the SDK uses, so that
+`Session`, `ResourceSession`, `LineageGraph` and `get_records` can be exercised
+without a live environment, in tests and to measure performance work without
+a network.
+
+The server runs on localhost in a background thread. It verifies SigV4 token
+exchanges and refresh tokens, and rejects expired bearer tokens, like the real
+API. Latency, jitter and injected errors make it possible to reproduce slow or
+flaky environments, and `FakeEnvironment.synthetic` builds environments of any
+size.
+
+```python
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+
+env = FakeEnvironment.synthetic(data_services=2, dataflows=10, components=50, records=1000)
+with FakeAscendServer(env, latency=0.005, jitter=0.002) as server:
+    client = server.client()
+    component = client.get_component('ds_0', 'df_0', 'transform_1')
+    rows = list(component.get_records())
+```
+"""
+
+from ascend.auth import AwsV4Auth, ISO8601_FORMAT
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from array import array
+
+import base64
+import hmac
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+
+DEFAULT_HOSTNAME = 'fake.ascend.io'
+DEFAULT_ACCESS_KEY = 'FAKEACCESSKEYID'
+DEFAULT_SECRET_KEY = 'fake-secret-access-key'
+
+# columns of synthetic records, as (name, type)
+DEFAULT_SCHEMA = [
+    ('id', 'long'),
+    ('name', 'string'),
+    ('value', 'double'),
+    ('flag', 'boolean'),
+    ('ts', 'timestamp'),
+]
+
+# component api types, keyed by the collection name in their URL
+COLLECTIONS = {
+    'sources': 'source',
+    'views': 'view',
+    'sinks': 'sink',
+    'pubs': 'pub',
+    'subs': 'sub',
+}
+
+SIGV4_MAX_SKEW = timedelta(minutes=15)
+STREAM_BATCH_SIZE = 1000
+ENCODED_CHUNK_SIZE = 1024 * 1024
+TIMESTAMP_BASE = datetime(2021, 1, 1)
+
+
+class SyntheticRecords:
+    """
+    Deterministic records, generated on demand so that streaming millions of
+    them costs no memory. Every tenth `string` value is null.
+
+    # Parameters
+    count (int):
+        number of records
+    schema (list):
+        `(name, type)` pairs, with types from `long`, `double`, `string`,
+        `boolean` and `timestamp`
+        (default is `DEFAULT_SCHEMA`)
+    """
+
+    def __init__(self, count, schema=None):
+        self.count = count
+        self.schema = list(schema or DEFAULT_SCHEMA)
+
+    def __len__(self):
+        return self.count
+
+    def row(self, i):
+        row = {}
+        for name, typ in self.schema:
+            if typ == 'long':
+                row[name] = i
+            elif typ == 'double':
+                row[name] = i * 0.5
+            elif typ == 'boolean':
+                row[name] = i % 2 == 0
+            elif typ == 'timestamp':
+                row[name] = (TIMESTAMP_BASE + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            else:
+                row[name] = None if i % 10 == 9 else f'{name}_{i}'
+        return row
+
+    def rows(self, offset=0, limit=None):
+        end = self.count if limit is None else min(self.count, offset + limit)
+        for i in range(offset, end):
+            yield self.row(i)
+
+    def chunks(self, offset=0, limit=None):
+        return _encode_chunks(self.rows(offset, limit))
+
+
+class ListRecords:
+    """
+    Records given explicitly, as a list of dicts.
+    """
+
+    def __init__(self, records, schema=None):
+        self.records = list(records)
+        if schema is None:
+            schema = [(name, _schema_type(value)) for name, value in
+                      (self.records[0].items() if self.records else ())]
+        self.schema = list(schema)
+
+    def __len__(self):
+        return len(self.records)
+
+    def rows(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        return iter(self.records[offset:end])
+
+    def chunks(self, offset=0, limit=None):
+        return _encode_chunks(self.rows(offset, limit))
+
+
+class EncodedRecords:
+    """
+    Records encoded as NDJSON once, up front, so that serving them costs
+    little more than copying bytes; for measuring how fast clients decode.
+
+    # Parameters
+    records (SyntheticRecords or ListRecords):
+        the records to encode
+    """
+
+    def __init__(self, records):
+        self.schema = records.schema
+        self.data = b''.join(records.chunks())
+        # byte offset at which each record starts, and one past the end
+        self.starts = array('q', [0])
+        start = 0
+        for _ in range(len(records)):
+            start = self.data.index(b'\n', start) + 1
+            self.starts.append(start)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def rows(self, offset=0, limit=None):
+        end = len(self) if limit is None else min(len(self), offset + limit)
+        for i in range(offset, end):
+            yield json.loads(self.data[self.starts[i]:self.starts[i + 1]])
+
+    def chunks(self, offset=0, limit=None):
+        count = len(self)
+        end = count if limit is None else min(count, offset + limit)
+        if offset >= end:
+            return
+        view = memoryview(self.data)[self.starts[offset]:self.starts[end]]
+        for i in range(0, len(view), ENCODED_CHUNK_SIZE):
+            yield view[i:i + ENCODED_CHUNK_SIZE]
+
+
+class FakeEnvironment:
+    """
+    The state served by a `FakeAscendServer`: Data Services, Dataflows, Components,
+    Groups, vault entries and records. Writes made through the API change it, so
+    it can be inspected after `apply` or `delete`.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data_services = {}  # ds id -> json
+        self.dataflows = {}  # (ds id, df id) -> json
+        self.components = {}  # (ds id, df id) -> component id -> json, for every api type
+        self.groups = {}  # (ds id, df id) -> group id -> json
+        self.vault = {}  # ds id -> [entry json]
+        self.roles = []
+        self.records = {}  # component uuid -> SyntheticRecords or ListRecords
+        self.by_uuid = {}  # component uuid -> json
+
+    @staticmethod
+    def synthetic(data_services=1, dataflows=1, components=10, records=0, schema=None,
+                  seed=0) -> 'FakeEnvironment':
+        """
+        Build an environment of `data_services` x `dataflows` x `components`.
+
+        Each dataflow has one Read Connector followed by Transforms, each reading
+        from a random earlier component, so dependency chains stay shallow as in
+        real dataflows. Every component serves the same `records` synthetic records.
+        """
+        rng = random.Random(seed)
+        env = FakeEnvironment()
+        spec = SyntheticRecords(records, schema) if records else None
+        for i in range(data_services):
+            ds_id = f'ds_{i}'
+            env.add_data_service(ds_id)
+            for j in range(dataflows):
+                df_id = f'df_{j}'
+                env.add_dataflow(ds_id, df_id)
+                uuids = []
+                for k in range(components):
+                    if k == 0:
+                        comp = env.add_component(ds_id, df_id, 'source', 'read_0',
+                                                 _source_definition(ds_id, df_id, spec))
+                    else:
+                        comp = env.add_component(ds_id, df_id, 'view', f'transform_{k}', {
+                            'inputs': [{'uuid': rng.choice(uuids)}],
+                            'view': {'operator': {'sqlQuery': {'sql': 'SELECT * FROM {{input}}'}}},
+                        })
+                    uuids.append(comp['uuid'])
+                    if spec is not None:
+                        env.records[comp['uuid']] = spec
+        return env
+
+    def add_data_service(self, data_service_id, **fields):
+        with self.lock:
+            ds = {'id': data_service_id, 'name': data_service_id, 'description': '',
+                  'uuid': _new_uuid(), **fields}
+            self.data_services[data_service_id] = ds
+            self.vault.setdefault(data_service_id, [])
+            self.roles.append({'uuid': _new_uuid(), 'id': 'Everyone', 'orgId': ds['uuid']})
+            return ds
+
+    def add_dataflow(self, data_service_id, dataflow_id, **fields):
+        with self.lock:
+            self._require_data_service(data_service_id)
+            df = {'id': dataflow_id, 'name': dataflow_id, 'description': '',
+                  'uuid': _new_uuid(), **fields}
+            self.dataflows[(data_service_id, dataflow_id)] = df
+            self.components.setdefault((data_service_id, dataflow_id), {})
+            self.groups.setdefault((data_service_id, dataflow_id), {})
+            return df
+
+    def add_component(self, data_service_id, dataflow_id, api_type, component_id,
+                      definition=None, records=None):
+        """
+        Add a component of `api_type` (`source`, `view`, `sink`, `pub` or `sub`).
+        `records` is a list of dicts, `SyntheticRecords` or `EncodedRecords`.
+        """
+        with self.lock:
+            key = self._require_dataflow(data_service_id, dataflow_id)
+            comp = {
+                'name': component_id,
+                'description': '',
+                'uuid': _new_uuid(),
+                **(definition or {}),
+                'id': component_id,
+                'type': api_type,
+                'organization': {'id': data_service_id},
+                'project': {'id': dataflow_id},
+            }
+            old = self.components[key].get(component_id)
+            if old is not None:
+                self.by_uuid.pop(old['uuid'], None)
+            self.components[key][component_id] = comp
+            self.by_uuid[comp['uuid']] = comp
+            if records is not None:
+                self.set_records(comp['uuid'], records)
+            return comp
+
+    def add_group(self, data_service_id, dataflow_id, group_id, content_uuids=(), **fields):
+        with self.lock:
+            key = self._require_dataflow(data_service_id, dataflow_id)
+            group = {'id': group_id, 'name': group_id, 'description': '', 'uuid': _new_uuid(),
+                     'content': [{'uuid': u} for u in content_uuids], **fields}
+            self.groups[key][group_id] = group
+            return group
+
+    def set_records(self, component_uuid, records):
+        if not isinstance(records, (SyntheticRecords, ListRecords, EncodedRecords)):
+            records = ListRecords(records)
+        self.records[component_uuid] = records
+
+    def component_count(self):
+        return sum(len(comps) for comps in self.components.values())
+
+    def schema(self, component_uuid):
+        """
+        The schema of a component as `(name, type)` pairs: that of its records,
+        or else that of its first input.
+        """
+        seen = set()
+        while component_uuid is not None and component_uuid not in seen:
+            seen.add(component_uuid)
+            if component_uuid in self.records:
+                return self.records[component_uuid].schema
+            comp = self.by_uuid.get(component_uuid)
+            if comp is None:
+                break
+            inputs = _input_uuids(comp) or ([comp['pubUUID']] if comp.get('pubUUID') else [])
+            component_uuid = inputs[0] if inputs else None
+        return []
+
+    def lineage(self, component_uuid):
+        """
+        Lineage of a component and everything upstream of it within its dataflow,
+        in the shape of the `lineage` endpoint.
+        """
+        with self.lock:
+            root = self.by_uuid[component_uuid]
+            dataflow = (root['organization']['id'], root['project']['id'])
+            order = []
+            pending = [component_uuid]
+            while pending:
+                u = pending.pop()
+                comp = self.by_uuid.get(u)
+                if u in order or comp is None:
+                    continue
+                if (comp['organization']['id'], comp['project']['id']) != dataflow:
+                    continue
+                order.append(u)
+                pending.extend(_input_uuids(comp))
+            order.reverse()
+            node_index = {u: i for i, u in enumerate(order)}
+            component_nodes, column_nodes, column_index = [], [], {}
+            for i, u in enumerate(order):
+                comp = self.by_uuid[u]
+                schema = self.schema(u)
+                component_nodes.append({
+                    'uuid': u,
+                    'data_service_id': comp['organization']['id'],
+                    'data_flow_id': comp['project']['id'],
+                    'schema': [f'{name} {typ}' for name, typ in schema],
+                    'expression': _expression(comp),
+                })
+                for name, _ in schema:
+                    column_index[(i, name)] = len(column_nodes)
+                    column_nodes.append({'name': name, 'component_node_index': i, 'expression': name})
+            component_edges, column_edges = [], []
+            for u in order:
+                out = node_index[u]
+                for inp in _input_uuids(self.by_uuid[u]):
+                    if inp not in node_index:
+                        continue
+                    component_edges.append({'input': node_index[inp], 'output': out,
+                                            'expression': _expression(self.by_uuid[u])})
+                    for name, _ in self.schema(u):
+                        if (node_index[inp], name) in column_index:
+                            column_edges.append({
+                                'input': column_index[(node_index[inp], name)],
+                                'Type': {'Identity': {}},
+                                'Output': {'OutputColumn': column_index[(out, name)]},
+                                'expression': name,
+                            })
+            return {
+                'component_nodes': component_nodes,
+                'column_nodes': column_nodes,
+                'component_edges': component_edges,
+                'column_edges': column_edges,
+            }
+
+    def delete_component(self, key, component_id):
+        with self.lock:
+            comp = self.components[key].pop(component_id)
+            self.by_uuid.pop(comp['uuid'], None)
+            self.records.pop(comp['uuid'], None)
+
+    def delete_dataflow(self, key):
+        with self.lock:
+            for component_id in list(self.components.get(key, {})):
+                self.delete_component(key, component_id)
+            self.components.pop(key, None)
+            self.groups.pop(key, None)
+            del self.dataflows[key]
+
+    def delete_data_service(self, data_service_id):
+        with self.lock:
+            for key in [k for k in self.dataflows if k[0] == data_service_id]:
+                self.delete_dataflow(key)
+            ds = self.data_services.pop(data_service_id)
+            self.vault.pop(data_service_id, None)
+            self.roles = [r for r in self.roles if r['orgId'] != ds['uuid']]
+
+    def _require_data_service(self, data_service_id):
+        if data_service_id not in self.data_services:
+            raise KeyError(f'data service {data_service_id} not found')
+        return data_service_id
+
+    def _require_dataflow(self, data_service_id, dataflow_id):
+        key = (data_service_id, dataflow_id)
+        if key not in self.dataflows:
+            raise KeyError(f'dataflow {data_service_id}.{dataflow_id} not found')
+        return key
+
+
+class FakeAscendServer:
+    """
+    FakeAscendServer serves a `FakeEnvironment` over HTTP on localhost.
+
+    # Parameters
+    environment (FakeEnvironment):
+        the environment to serve
+        (default is an empty environment)
+    access_key (str):
+        the only Access Key ID accepted by the token exchange
+    secret_key (str):
+        the Secret Access Key for `access_key`
+    hostname (str):
+        the hostname token exchanges must be signed for
+        (default is `fake.ascend.io`)
+    latency (float):
+        seconds to wait before handling each request
+        (default is `0`)
+    jitter (float):
+        maximum seconds added to or removed from `latency`, uniformly at random
+        (default is `0`)
+    error_rate (float):
+        probability of failing an `api` or `authz` request with `error_status`
+        (default is `0`)
+    error_status (int):
+        HTTP status of randomly injected errors
+        (default is `503`)
+    token_ttl (float):
+        seconds before an access token expires
+        (default is `3600`)
+    seed (int):
+        seed for latency jitter and error injection
+        (default is `None`)
+    """
+
+    def __init__(self, environment=None, access_key=DEFAULT_ACCESS_KEY,
+                 secret_key=DEFAULT_SECRET_KEY, hostname=DEFAULT_HOSTNAME, latency=0.0,
+                 jitter=0.0, error_rate=0.0, error_status=503, token_ttl=3600, seed=None):
+        self.environment = environment if environment is not None else FakeEnvironment()
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.hostname = hostname
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ttl = token_ttl
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.access_tokens = {}  # token -> expiry, as seconds since the epoch
+        self.refresh_tokens = set()
+        self.injected = []  # [remaining, status, path prefix, retry after]
+        self.stream_drops = []  # [remaining, records sent before the drop]
+        self.requests = Counter()  # (method, path) -> count
+        self.token_exchanges = 0
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_uri(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self) -> 'FakeAscendServer':
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,),
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def session(self, **kwargs):
+        """
+        Build an `ascend.session.Session` connected to this server.
+        """
+        from ascend.session import Session
+        return Session(self.hostname, self.access_key, self.secret_key,
+                       base_uri=self.base_uri, **kwargs)
+
+    def client(self, **kwargs):
+        """
+        Build an `ascend.client.Client` connected to this server.
+        """
+        from ascend.client import Client
+        return Client(self.hostname, self.access_key, self.secret_key,
+                      base_uri=self.base_uri, **kwargs)
+
+    def inject_errors(self, count=1, status=503, path=None, retry_after=None):
+        """
+        Fail the next `count` `api` or `authz` requests whose path starts with
+        `path` (any path if `None`) with `status`, and a `Retry-After` header if
+        `retry_after` is given.
+        """
+        with self.lock:
+            self.injected.append([count, status, path, retry_after])
+
+    def drop_streams(self, count=1, after=0):
+        """
+        Cut off the next `count` record streams after `after` records and part
+        of the next one, as a dropped connection would.
+        """
+        with self.lock:
+            self.stream_drops.append([count, after])
+
+    def expire_tokens(self):
+        """
+        Expire every access token issued so far, as if `token_ttl` had passed.
+        """
+        with self.lock:
+            self.access_tokens.clear()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.token_exchanges = 0
+
+    def _delay(self):
+        delay = self.latency
+        if self.jitter:
+            with self.lock:
+                delay += self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _stream_drop(self):
+        with self.lock:
+            if not self.stream_drops:
+                return None
+            drop = self.stream_drops[0]
+            drop[0] -= 1
+            if drop[0] <= 0:
+                self.stream_drops.pop(0)
+            return drop[1]
+
+    def _injected_error(self, path):
+        with self.lock:
+            for injection in self.injected:
+                remaining, status, prefix, retry_after = injection
+                if prefix is None or path.startswith(prefix):
+                    injection[0] -= 1
+                    if injection[0] <= 0:
+                        self.injected.remove(injection)
+                    return status, retry_after
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.error_status, None
+        return None
+
+    def _issue_tokens(self):
+        now = time.time()
+        access_token = _make_token(self.access_key, now + self.token_ttl)
+        refresh_token = _make_token(self.access_key, now + 30 * 24 * 3600)
+        with self.lock:
+            self.access_tokens[access_token] = now + self.token_ttl
+            self.refresh_tokens.add(refresh_token)
+            self.token_exchanges += 1
+        return {'access_token': access_token, 'refresh_token': refresh_token}
+
+    def _verify_signature(self, headers, path):
+        authorization = headers.get('Authorization', '')
+        amz_date = headers.get('X-Amz-Date', '')
+        try:
+            timestamp = datetime.strptime(amz_date, ISO8601_FORMAT)
+            credential = authorization.split('Credential=', 1)[1].split('/', 1)[0]
+        except (ValueError, IndexError):
+            return False
+        if credential != self.access_key or abs(datetime.utcnow() - timestamp) > SIGV4_MAX_SKEW:
+            return False
+        signer = AwsV4Auth(self.access_key, self.secret_key, self.hostname, 'POST')
+        expected = signer.signed_headers(f'https://{self.hostname}{path}', timestamp)['Authorization']
+        return hmac.compare_digest(expected, authorization)
+
+    def _token_exchange(self, headers, path):
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('RefreshToken '):
+            token = authorization[len('RefreshToken '):]
+            with self.lock:
+                if token not in self.refresh_tokens:
+                    return 401, {'error': 'invalid refresh token'}
+                # refresh tokens are single use
+                self.refresh_tokens.discard(token)
+        elif not self._verify_signature(headers, path):
+            return 401, {'error': 'invalid signature'}
+        return 200, {'data': self._issue_tokens()}
+
+    def _authorized(self, headers):
+        authorization = headers.get('Authorization', '')
+        if not authorization.startswith('Bearer '):
+            return False
+        with self.lock:
+            expiry = self.access_tokens.get(authorization[len('Bearer '):])
+        return expiry is not None and expiry > time.time()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send each response in as few packets as possible, or small responses
+    # wait on delayed ACKs
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        with fake.lock:
+            fake.requests[(method, url.path)] += 1
+        fake._delay()
+
+        if url.path == '/authn/tokenExchange' and method == 'POST':
+            return self._send_json(*fake._token_exchange(self.headers, self.path))
+        if url.path.startswith('/api/v1/'):
+            service, endpoint = 'api', url.path[len('/api/v1/'):]
+        elif url.path.startswith('/authz/v1/'):
+            service, endpoint = 'authz', url.path[len('/authz/v1/'):]
+        else:
+            return self._send_json(404, {'error': f'no route for {url.path}'})
+
+        error = fake._injected_error(endpoint)
+        if error is not None:
+            status, retry_after = error
+            headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+            return self._send_json(status, {'error': 'injected error'}, headers)
+        if not fake._authorized(self.headers):
+            return self._send_json(401, {'error': 'unauthorized'})
+
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return self._send_json(400, {'error': 'invalid JSON body'})
+        segments = [s for s in endpoint.split('/') if s]
+        try:
+            with fake.environment.lock:
+                result = _route(fake.environment, service, method, segments, query, data)
+        except KeyError as e:
+            return self._send_json(404, {'error': str(e)})
+        except ValueError as e:
+            return self._send_json(409, {'error': str(e)})
+        except Exception as e:
+            return self._send_json(500, {'error': repr(e)})
+        if result is None:
+            return self._send_json(404, {'error': f'no route for {method} {url.path}'})
+        if isinstance(result, _RecordStream):
+            return self._send_stream(result)
+        return self._send_json(200, result)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, stream):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        drop_after = self.server.fake._stream_drop()
+        if drop_after is not None:
+            stream = stream.truncated(drop_after)
+        try:
+            for chunk in stream.chunks():
+                self._send_chunk(chunk)
+            if drop_after is not None:
+                # half a record, then no terminating chunk
+                self._send_chunk(b'{"id": ')
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                self.close_connection = True
+                return
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading
+            self.close_connection = True
+
+    def _send_chunk(self, chunk):
+        self.wfile.write(b'%x\r\n' % len(chunk))
+        self.wfile.write(chunk)
+        self.wfile.write(b'\r\n')
+
+
+class _RecordStream:
+    def __init__(self, records, offset, limit):
+        self.records = records
+        self.offset = offset
+        self.limit = limit
+
+    def truncated(self, count):
+        limit = count if self.limit is None else min(self.limit, count)
+        return _RecordStream(self.records, self.offset, limit)
+
+    def chunks(self):
+        if self.records is None:
+            return iter(())
+        return self.records.chunks(self.offset, self.limit)
+
+
+def _route(env: FakeEnvironment, service, method, segments, query, data):
+    if service == 'authz':
+        if segments == ['org_roles'] and method == 'GET':
+            return {'data': env.roles}
+        return None
+    if segments == ['data-feeds'] and method == 'GET':
+        return {'data': {
+            comp['uuid']: {**comp, 'fromOrgId': ds_id, 'fromProjId': df_id}
+            for (ds_id, df_id), comps in env.components.items()
+            for comp in comps.values() if comp['type'] == 'pub'
+        }}
+    if not segments or segments[0] != 'organizations':
+        return None
+    if len(segments) == 1:
+        if method == 'GET':
+            return {'data': list(env.data_services.values())}
+        if method == 'POST':
+            if data['id'] in env.data_services:
+                raise ValueError(f'data service {data["id"]} already exists')
+            return {'data': env.add_data_service(data['id'], **_fields(data))}
+        return None
+    ds_id = segments[1]
+    if len(segments) == 2:
+        ds = env.data_services[env._require_data_service(ds_id)]
+        if method == 'GET':
+            return {'data': ds}
+        if method == 'PATCH':
+            ds.update(_fields(data))
+            return {'data': ds}
+        if method == 'DELETE':
+            env.delete_data_service(ds_id)
+            return {}
+        return None
+    env._require_data_service(ds_id)
+    if segments[2] == 'vault' and len(segments) == 3 and method == 'POST':
+        entry = json.loads(json.dumps(data))
+        entry.setdefault('credential', {})['id'] = {'value': _new_uuid()}
+        env.vault[ds_id].append(entry)
+        return {'data': entry}
+    if segments[2] != 'projects':
+        return None
+    if len(segments) == 3:
+        if method == 'GET':
+            return {'data': [df for (d, _), df in env.dataflows.items() if d == ds_id]}
+        if method == 'POST':
+            if (ds_id, data['id']) in env.dataflows:
+                raise ValueError(f'dataflow {data["id"]} already exists')
+            return {'data': env.add_dataflow(ds_id, data['id'], **_fields(data))}
+        return None
+    key = env._require_dataflow(ds_id, segments[3])
+    if len(segments) == 4:
+        df = env.dataflows[key]
+        if method == 'GET':
+            return {'data': df}
+        if method == 'PATCH':
+            df.update(_fields(data))
+            return {'data': df}
+        if method == 'DELETE':
+            env.delete_dataflow(key)
+            return {}
+        return None
+    collection = segments[4]
+    if collection == 'components' and len(segments) == 5 and method == 'GET':
+        return {'data': list(env.components[key].values())}
+    if collection == 'groups':
+        return _route_groups(env, key, method, segments[5:], data)
+    api_type = COLLECTIONS.get(collection)
+    if api_type is None:
+        return None
+    comps = env.components[key]
+    if len(segments) == 5:
+        if method == 'POST':
+            if data['id'] in comps:
+                raise ValueError(f'component {data["id"]} already exists')
+            return {'data': env.add_component(*key, api_type, data['id'], _fields(data))}
+        return None
+    comp = comps.get(segments[5])
+    if comp is None or comp['type'] != api_type:
+        raise KeyError(f'{api_type} {segments[5]} not found')
+    if len(segments) == 6:
+        if method == 'GET':
+            return {'data': comp}
+        if method == 'PATCH':
+            comp.update(_fields(data))
+            return {'data': comp}
+        if method == 'DELETE':
+            env.delete_component(key, comp['id'])
+            return {}
+        return None
+    action = segments[6]
+    if action == 'records-stream' and method == 'GET':
+        offset = int(query.get('offset', 0))
+        limit = int(query['limit']) if int(query.get('limit', 0)) > 0 else None
+        return _RecordStream(env.records.get(comp['uuid']), offset, limit)
+    if action == 'lineage' and method == 'GET':
+        return {'data': env.lineage(comp['uuid'])}
+    if action == 'pub' and api_type == 'sub' and method == 'GET':
+        pub = env.by_uuid.get(comp.get('pubUUID'))
+        if pub is None:
+            raise KeyError(f'data feed for {comp["id"]} not found')
+        return {'data': pub}
+    if action == 'refresh' and api_type == 'source' and method == 'POST':
+        return {}
+    return None
+
+
+def _route_groups(env: FakeEnvironment, key, method, segments, data):
+    groups = env.groups[key]
+    if not segments:
+        if method == 'GET':
+            return {'data': list(groups.values())}
+        if method == 'POST':
+            if data['id'] in groups:
+                raise ValueError(f'group {data["id"]} already exists')
+            fields = _fields(data)
+            content = [c['uuid'] for c in fields.pop('content', [])]
+            return {'data': env.add_group(*key, data['id'], content, **fields)}
+        return None
+    group = groups[segments[0]]
+    if len(segments) > 1:
+        return None
+    if method == 'GET':
+        return {'data': group}
+    if method == 'PATCH':
+        group.update(_fields(data))
+        return {'data': group}
+    if method == 'DELETE':
+        del groups[segments[0]]
+        return {}
+    return None
+
+
+def _fields(data):
+    # the fields a client may set; ids and uuids are assigned by the server
+    return {k: v for k, v in (data or {}).items()
+            if k not in ('id', 'uuid', 'type', 'organization', 'project',
+                         'data_service_id', 'dataflow_id')}
+
+
+def _encode_chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(row))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield ('\n'.join(batch) + '\n').encode('utf-8')
+            batch = []
+    if batch:
+        yield ('\n'.join(batch) + '\n').encode('utf-8')
+
+
+def _input_uuids(comp):
+    if comp['type'] == 'view':
+        return [i['uuid'] for i in comp.get('inputs', [])]
+    if comp['type'] in ('sink', 'pub') and comp.get('inputUUID'):
+        return [comp['inputUUID']]
+    # sources have no inputs, and the input of a sub lives in another dataflow
+    return []
+
+
+def _expression(comp):
+    operator = comp.get('view', {}).get('operator', {})
+    return operator.get('sqlQuery', {}).get('sql', comp['type'])
+
+
+def _source_definition(data_service_id, dataflow_id, records):
+    schema = records.schema if records is not None else DEFAULT_SCHEMA
+    return {'source': {
+        'container': {'s3': {'bucket': 'fake', 'prefix': f'{data_service_id}/{dataflow_id}/'}},
+        'records': {'schema': {'field': [
+            {'name': name, 'schema': {typ: {}}} for name, typ in schema
+        ]}},
+    }}
+
+
+def _schema_type(value):
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'long'
+    if isinstance(value, float):
+        return 'double'
+    return 'string'
+
+
+def _new_uuid():
+    return str(uuid.uuid4())
+
+
+def _make_token(subject, expiry):
+    # shaped like a JWT, so clients can read the expiry, but not signed
+    def encode(d):
+        return base64.urlsafe_b64encode(json.dumps(d).encode('utf-8')).rstrip(b'=').decode('ascii')
+    return '.'.join([
+        encode({'alg': 'none', 'typ': 'JWT'}),
+        encode({'sub': subject, 'exp': int(expiry), 'jti': uuid.uuid4().hex}),
+        uuid.uuid4().hex,
+    ])
@@ -0,0 +1,63 @@
+"""
+Ascend Index module
+
+A hierarchical index over loaded resources, so that finding the children of
+a Data Service or Dataflow costs time proportional to the number of children
+rather than to the size of the whole environment.
+"""
+
+from collections import defaultdict
+from typing import List, Optional
+
+
+class ResourceIndex:
+    """
+    Maps data service id -> dataflow id -> api type -> resource id -> uuid.
+
+    Resources are indexed by their api path, a tuple of
+    `(data_service_id, dataflow_id, resource_id)`. Data Services are filed
+    under a `None` dataflow.
+    """
+
+    def __init__(self):
+        self._index = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+
+    def add(self, api_type, api_path, uuid):
+        data_service_id, dataflow_id, resource_id = api_path
+        if api_type == 'project':
+            # dataflows are children of their data service
+            dataflow_id, resource_id = None, dataflow_id
+        self._index[data_service_id][dataflow_id][api_type][resource_id] = uuid
+
+    def data_service_ids(self) -> List[str]:
+        """
+        The ids of all indexed Data Services
+        """
+        return [
+            ds_id for ds_id, dataflows in self._index.items()
+            if dataflows.get(None, {}).get('organization')
+        ]
+
+    def find(self, api_type, data_service_id, dataflow_id: Optional[str] = None) -> List[str]:
+        """
+        Find the uuids of resources of `api_type` within a Data Service, or within
+        one of its Dataflows if `dataflow_id` is given.
+        Dataflows (`project`) are always found within the Data Service.
+        """
+        dataflows = self._index.get(data_service_id)
+        if dataflows is None:
+            return []
+        if api_type == 'project':
+            buckets = [dataflows.get(None, {})]
+        elif dataflow_id is None:
+            buckets = [b for df_id, b in dataflows.items() if df_id is not None]
+        else:
+            buckets = [dataflows.get(dataflow_id, {})]
+        return [uuid for b in buckets for uuid in b.get(api_type, {}).values()]
+
+    def get(self, api_type, api_path) -> Optional[str]:
+        data_service_id, dataflow_id, resource_id = api_path
+        if api_type == 'project':
+            dataflow_id, resource_id = None, dataflow_id
+        dataflows = self._index.get(data_service_id, {})
+        return dataflows.get(dataflow_id, {}).get(api_type, {}).get(resource_id)
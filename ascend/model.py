@@ -100,19 +100,13 @@ class DataService(Resource):
         if top_level:
             self.set_boilerplate(d)
         rs.load_data_service(self)
-        pub_uuids = [
-            v for k, v in rs.type_to_api_path_to_uuid['pub'].items()
-            if k[0] == self.data_service_id
-        ]
+        pub_uuids = rs.index.find('pub', self.data_service_id)
         d['dataFeeds'] = sorted([
             MessageToDict(rs.uuid_to_resource[uuid].to_type_proto(rs, options, top_level=True))
             for uuid in pub_uuids
         ], key=lambda d: d['id'])
         if options.recursive and not getattr(options, 'directory', False):
-            uuids = [
-                v for k, v in rs.type_to_api_path_to_uuid['project'].items()
-                if k[0] == self.data_service_id
-            ]
+            uuids = rs.index.find('project', self.data_service_id)
             d['dataflows'] = sorted([
                 MessageToDict(rs.uuid_to_resource[uuid].to_type_proto(rs, options, top_level=True))
                 for uuid in uuids
@@ -238,10 +232,7 @@ class Dataflow(Resource):
         if top_level:
             self.set_boilerplate(d)
         rs.load_dataflow(self)
-        group_uuids = [
-            v for k, v in rs.type_to_api_path_to_uuid['group'].items()
-            if k[0] == self.data_service_id and k[1] == self.resource_id
-        ]
+        group_uuids = rs.index.find('group', self.data_service_id, self.resource_id)
         if options.recursive:
             groups = [rs.uuid_to_resource[uuid] for uuid in group_uuids]
             d['groups'] = sorted([
@@ -250,9 +241,8 @@ class Dataflow(Resource):
         if not getattr(options, 'directory', False) and options.recursive:
             # add components for nested style
             uuids = [
-                v for t in ['source', 'view', 'sink']
-                for k, v in rs.type_to_api_path_to_uuid[t].items()
-                if k[0] == self.data_service_id and k[1] == self.dataflow_id
+                uuid for t in ['source', 'view', 'sink']
+                for uuid in rs.index.find(t, self.data_service_id, self.dataflow_id)
             ]
             protos = [rs.uuid_to_resource[uuid].to_type_proto(rs, options, True) for uuid in uuids]
             d['components'] = sorted([
@@ -0,0 +1,147 @@
+"""
+Ascend NDJSON module
+
+An incremental decoder for streams of newline-delimited JSON, such as the
+`records-stream` endpoint, which takes the bytes of a response as they arrive
+in chunks of any size, and the matching encoder.
+
+Rather than copying and decoding each line on its own, the decoder splits each
+chunk at its last newline through a `memoryview`, and decodes every complete
+line in it with a single call, as the items of one JSON array. Lines split
+across chunks are carried over to the next one.
+
+Both use `orjson` if it is installed:
+
+```sh
+pip install "ascend-python-sdk[orjson]"
+```
+"""
+
+from typing import Iterable, Iterator, List
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# bytes read from a response at a time
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+def default_loads():
+    """
+    The fastest JSON decoding function available: `orjson.loads` if installed,
+    or else `json.loads`.
+    """
+    return orjson.loads if orjson is not None else json.loads
+
+
+def encode_line(value) -> bytes:
+    """
+    Encode `value` as one line of NDJSON, with its newline.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(value).encode('utf-8') + b'\n'
+
+
+class NDJSONDecoder:
+    """
+    Incremental decoder for newline-delimited JSON.
+
+    ```python
+    decoder = NDJSONDecoder()
+    for chunk in chunks:
+        yield from decoder.decode(chunk)
+    yield from decoder.flush()
+    ```
+
+    Blank lines are skipped. A line which is not valid JSON raises a
+    `ValueError` for that line, as `json.loads` would.
+
+    # Parameters
+    loads (callable):
+        function decoding a JSON document from `bytes`
+        (default is `default_loads()`)
+    """
+
+    def __init__(self, loads=None):
+        self.loads = loads or default_loads()
+        # chunks holding the start of a line whose end has not arrived yet
+        self._pending = []
+
+    def decode(self, chunk) -> List:
+        """
+        Decode the lines completed by `chunk`.
+
+        # Parameters
+        chunk (bytes): the next bytes of the stream
+
+        # Returns
+        list: the decoded values, in order
+        """
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            if chunk:
+                self._pending.append(chunk)
+            return []
+        view = memoryview(chunk)
+        parts = self._pending + [view[:end]]
+        self._pending = [view[end + 1:]] if end + 1 < len(chunk) else []
+        return self._decode_lines(parts)
+
+    def flush(self) -> List:
+        """
+        Decode the last line of the stream, if it does not end with a newline.
+
+        # Returns
+        list: the decoded value, if there is one
+        """
+        parts, self._pending = self._pending, []
+        return self._decode_lines(parts) if parts else []
+
+    def _decode_lines(self, parts) -> List:
+        # every line in one call, as the items of an array; the count guards
+        # against lines which are not valid JSON alone, but are once joined
+        document = b''.join([b'[', *parts, b']'])
+        lines = document.count(b'\n') + 1
+        try:
+            values = self.loads(document.replace(b'\n', b','))
+            if len(values) == lines:
+                return values
+        except ValueError:
+            pass
+        return self._decode_each(memoryview(document)[1:-1])
+
+    def _decode_each(self, view) -> List:
+        # the slow path skips blank lines, and raises for the first bad line
+        values = []
+        for line in bytes(view).split(b'\n'):
+            if line.strip():
+                values.append(json.loads(line))
+        return values
+
+
+def decode_chunks(chunks: Iterable[bytes], loads=None, transform=None) -> Iterator:
+    """
+    Decode a stream of newline-delimited JSON arriving as `chunks`.
+
+    # Parameters
+    chunks (Iterable<bytes>): the bytes of the stream, split anywhere
+    loads (callable): as for `NDJSONDecoder`
+    transform (callable):
+        if given, called with the list of values decoded from each chunk, to
+        return those to yield instead, such as a filtered list
+        (default is `None`)
+
+    # Returns
+    Iterator: the decoded values
+    """
+    decoder = NDJSONDecoder(loads)
+    for chunk in chunks:
+        values = decoder.decode(chunk)
+        yield from transform(values) if transform is not None else values
+    values = decoder.flush()
+    yield from transform(values) if transform is not None else values
@@ -0,0 +1,184 @@
+"""
+Ascend Pool module
+
+The connection pool which the HTTP sessions of a `Session` share: a
+`requests` transport adapter, whose pool holds up to `pool_size` open
+connections per host for requests to reuse, and counts how often requests
+find it saturated.
+
+A request which finds every pooled connection in use opens one more, which
+is closed rather than returned to the full pool once the request is done;
+under sustained concurrency beyond the pool size, each of those requests
+pays for a new connection and TLS handshake. `PoolStats` records how often
+that happens, so the pool can be sized to the concurrency in use.
+"""
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import ascend.cli.sh as sh
+
+import socket
+import threading
+import urllib3
+
+# connections kept open per host; `requests` keeps 10
+DEFAULT_POOL_SIZE = 32
+
+# seconds to wait for a connection, and between bytes of a response
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0
+
+# probe idle connections, so those kept in the pool are not silently
+# dropped by firewalls and load balancers
+KEEP_ALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+
+class PoolStats:
+    """
+    Counters of the use of a connection pool, shared by every host it
+    connects to, and safe to update from any thread.
+
+    # Attributes
+    requests (int): connections taken from the pool, one per request sent
+    opened (int): connections opened, or opened again after being closed
+    saturated (int): requests which found every pooled connection in use
+    discarded (int): connections closed on their return to a full pool
+    in_use (int): connections taken from the pool and not yet returned
+    peak_in_use (int): the most connections in use at once
+    """
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.requests = 0
+        self.opened = 0
+        self.saturated = 0
+        self.discarded = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self, pool, opened):
+        with self._lock:
+            self.requests += 1
+            if opened:
+                self.opened += 1
+            saturated = pool._in_use >= pool.pool_size
+            if saturated:
+                self.saturated += 1
+            first = saturated and self.saturated == 1
+            pool._in_use += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        if first:
+            sh.debug(f'connection pool of {pool.pool_size} saturated; opening connections '
+                     f'which will not be reused')
+
+    def _checkin(self, pool, discarded):
+        with self._lock:
+            pool._in_use -= 1
+            self.in_use -= 1
+            if discarded:
+                self.discarded += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'requests': self.requests,
+                'opened': self.opened,
+                'saturated': self.saturated,
+                'discarded': self.discarded,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+            }
+
+
+class _CountingPool:
+    # counts checkouts and returns of connections to `stats`
+    stats = None
+    _in_use = 0
+
+    @property
+    def pool_size(self):
+        return self.pool.maxsize if self.pool is not None else 0
+
+    def _get_conn(self, timeout=None):
+        connection = super()._get_conn(timeout)
+        # new, or closed since its last use: the request connects it
+        self.stats._checkout(self, opened=connection.sock is None)
+        return connection
+
+    def _put_conn(self, connection):
+        discarded = connection is not None and self.pool is not None and self.pool.full()
+        try:
+            super()._put_conn(connection)
+        finally:
+            self.stats._checkin(self, discarded)
+
+
+class _HTTPPool(_CountingPool, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSPool(_CountingPool, HTTPSConnectionPool):
+    pass
+
+
+class _PoolManager(urllib3.PoolManager):
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+        self.pool_classes_by_scheme = {'http': _HTTPPool, 'https': _HTTPSPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.stats = self.stats
+        return pool
+
+
+class PoolAdapter(HTTPAdapter):
+    """
+    Transport adapter for `requests` sessions which keeps up to `pool_size`
+    connections per host open, and counts their use in `stats`. Mounting
+    one on several sessions makes them share its pool.
+
+    # Parameters
+    pool_size (int):
+        connections kept open per host
+        (default is `DEFAULT_POOL_SIZE`)
+    keep_alive (bool):
+        keep connections open between requests, probing them while idle;
+        otherwise each request opens its own
+        (default is `True`)
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['keep_alive']
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keep_alive=True):
+        if pool_size < 1:
+            raise ValueError("Pool size must be a positive number of connections.")
+        self.keep_alive = keep_alive
+        self.stats = PoolStats(pool_size)
+        super().__init__(pool_maxsize=pool_size)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        if self.keep_alive:
+            pool_kwargs.setdefault('socket_options', KEEP_ALIVE_SOCKET_OPTIONS)
+        self.poolmanager = _PoolManager(self.stats, num_pools=connections, maxsize=maxsize,
+                                        block=block, **pool_kwargs)
+
+    def add_headers(self, request, **kwargs):
+        if not self.keep_alive:
+            request.headers['Connection'] = 'close'
+
+    def __setstate__(self, state):
+        # `stats` holds a lock, so is not pickled
+        self.stats = PoolStats(state['_pool_maxsize'])
+        self.keep_alive = state['keep_alive']
+        super().__setstate__(state)
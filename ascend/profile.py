@@ -0,0 +1,470 @@
+"""
+Ascend Profile module
+
+Statistics of the columns of a Component's records, computed in one streaming
+pass in constant memory: null counts, minimum and maximum, mean and variance,
+approximate distinct counts with a HyperLogLog sketch, and approximate
+quantiles with a KLL sketch.
+
+Records are decoded into columnar batches (see `ascend.records.record_batches`)
+and every statistic is updated from a whole batch at a time with NumPy, so a
+profile never holds more than one batch.
+
+```python
+for column in component.profile().values():
+    print(column.name, column.nulls, column.distinct, column.quantiles)
+```
+
+Requires the optional `numpy` dependency:
+
+```sh
+pip install "ascend-python-sdk[numpy]"
+```
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from ascend import records
+
+import itertools
+import math
+import numpy as np
+
+# HyperLogLog registers, as a power of 2: a standard error of 1.04 / sqrt(2^p),
+# about 0.8% for 16KB per column
+DEFAULT_PRECISION = 14
+
+# items kept by the top level of a quantile sketch: a rank error of about 1%
+DEFAULT_SKETCH_SIZE = 200
+
+# quantiles reported for each column which has an order
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+NUMERIC_TYPES = {'byte', 'short', 'int', 'long', 'float', 'double'}
+TEMPORAL_TYPES = {'date', 'timestamp'}
+
+
+def mix64(values) -> np.ndarray:
+    """
+    Spread the bits of an array of 64-bit integers with the splitmix64
+    finalizer, so that similar values get unrelated hashes.
+
+    # Parameters
+    values (numpy.ndarray): 64-bit integers, signed or not
+
+    # Returns
+    numpy.ndarray: the hashes, as `uint64`
+    """
+    h = np.asarray(values).view(np.uint64).copy()
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xbf58476d1ce4e5b9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94d049bb133111eb)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def hash_values(values) -> np.ndarray:
+    """
+    64-bit hashes of an array of column values without nulls.
+
+    Numbers and datetimes are hashed from their bits, with `-0.0` and `0.0`
+    alike. Other values are hashed with Python's `hash`, which for strings
+    differs between processes: sketches built in different processes can
+    only be merged for numeric and temporal columns.
+
+    # Parameters
+    values (numpy.ndarray): the values
+
+    # Returns
+    numpy.ndarray: the hashes, as `uint64`
+    """
+    values = np.asarray(values)
+    kind = values.dtype.kind
+    if kind == 'f':
+        # adding 0.0 turns -0.0 into 0.0
+        return mix64(values.astype(np.float64) + 0.0)
+    if kind in 'iub':
+        return mix64(values.astype(np.int64))
+    if kind in 'mM':
+        return mix64(values.view(np.int64))
+    try:
+        hashes = np.fromiter(map(hash, values), dtype=np.int64, count=len(values))
+    except TypeError:
+        # records hold lists and dicts for nested columns
+        hashes = np.fromiter((hash(v if not isinstance(v, (list, dict)) else repr(v))
+                              for v in values), dtype=np.int64, count=len(values))
+    return mix64(hashes)
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog sketch, estimating the number of distinct values added to it
+    with a standard error of `1.04 / sqrt(2 ** precision)`, in `2 ** precision`
+    bytes.
+
+    # Parameters
+    precision (int):
+        number of bits of each hash which select a register, from 4 to 18
+        (default is `DEFAULT_PRECISION`)
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError("Precision must be between 4 and 18.")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """
+        Add values by their 64-bit hashes (see `hash_values`).
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        # the remaining 64 - p bits, at most 60, are exact as float64, and
+        # frexp gives their bit length: 0 for 0
+        rest = (hashes & np.uint64((1 << (64 - p)) - 1)).astype(np.float64)
+        rank = (64 - p + 1 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def add(self, values):
+        """
+        Add an array of values without nulls.
+        """
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other: 'HyperLogLog'):
+        """
+        Add every value added to `other`, which must have the same precision.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precisions.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """
+        The estimated number of distinct values added.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int32)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate for few values
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    """
+    A KLL sketch, estimating the quantiles of the values added to it with a
+    rank error of about `1.65 / size`, in `O(size)` memory.
+
+    Values are kept in levels, where each value of level `h` stands for `2^h`
+    values added. A level over its capacity is sorted, and every other value
+    of it, from a random start, is promoted to the level above. Capacities
+    shrink by 2/3 for each level below the top one.
+
+    # Parameters
+    size (int):
+        capacity of the top level
+        (default is `DEFAULT_SKETCH_SIZE`)
+    seed (int):
+        seed of the random choices of compactions
+        (default is `None`)
+    """
+
+    def __init__(self, size=DEFAULT_SKETCH_SIZE, seed=None):
+        if size < 2:
+            raise ValueError("Sketch size must be at least 2.")
+        self.size = size
+        self.count = 0
+        self.levels: List[np.ndarray] = []
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.size * (2 / 3) ** depth)))
+
+    def add(self, values):
+        """
+        Add an array of values without nulls.
+        """
+        values = np.asarray(values)
+        if not len(values):
+            return
+        self.count += len(values)
+        if not self.levels:
+            self.levels.append(values[:0])
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        Add every value added to `other`.
+        """
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(values[:0])
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(values[:0])
+            values = np.sort(values, kind='stable')
+            # an odd value out stays behind, so the weight is kept exactly
+            kept = values[:len(values) % 2]
+            pairs = values[len(kept):]
+            promoted = pairs[self._rng.integers(2)::2]
+            self.levels[level] = kept
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # a lower level may be over its capacity again, once there is a new top
+            level = 0
+
+    def quantiles(self, qs) -> list:
+        """
+        The estimated values at each quantile of `qs`, from 0 to 1, or `None`
+        for each if no value was added.
+        """
+        if not self.count:
+            return [None] * len(qs)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 1 << level, dtype=np.int64)
+                                  for level, v in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values, ranks = values[order], np.cumsum(weights[order])
+        index = np.searchsorted(ranks, np.asarray(qs, dtype=np.float64) * ranks[-1])
+        return list(values[np.minimum(index, len(values) - 1)])
+
+
+class ColumnProfile:
+    """
+    Statistics of one column, updated one batch of values at a time.
+
+    - `count`: number of values, nulls included
+    - `nulls`: number of nulls
+    - `min`, `max`: smallest and largest values, for values which can be compared
+    - `mean`, `variance`: for numeric and boolean columns, the latter with
+      `count - nulls - 1` degrees of freedom
+    - `distinct`: estimated number of distinct values, nulls excluded
+    - `quantiles`: estimated values at each quantile, for numeric and temporal columns
+
+    Timestamps and dates are reported as ISO 8601 strings, as in records.
+
+    # Parameters
+    name (str): name of the column
+    type (str): Ascend type of the column, or `None` if unknown
+    quantiles (Iterable<float>): quantiles to estimate
+    precision (int): precision of the HyperLogLog sketch
+    sketch_size (int): size of the quantile sketch
+    """
+
+    def __init__(self, name, type=None, quantiles=DEFAULT_QUANTILES,
+                 precision=DEFAULT_PRECISION, sketch_size=DEFAULT_SKETCH_SIZE):
+        self.name = name
+        self.type = type
+        self.count = 0
+        self.nulls = 0
+        self._min = None
+        self._max = None
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._comparable = True
+        self._qs = tuple(quantiles)
+        self._numeric = type in NUMERIC_TYPES or type == 'boolean'
+        self._distinct = HyperLogLog(precision)
+        ordered = type in NUMERIC_TYPES or type in TEMPORAL_TYPES
+        self._sketch = QuantileSketch(sketch_size) if ordered else None
+
+    def update(self, column):
+        """
+        Update the statistics with a column of a batch: a NumPy array, masked
+        or holding `None` for nulls (see `ascend.records.record_batches`).
+        """
+        column = np.asanyarray(column)
+        self.count += len(column)
+        values = _present(column)
+        self.nulls += len(column) - len(values)
+        if not len(values):
+            return
+        self._distinct.add(values)
+        self._update_range(values)
+        if self._numeric:
+            self._update_moments(values.astype(np.float64))
+        if self._sketch is not None:
+            self._sketch.add(values)
+
+    def _update_range(self, values):
+        if not self._comparable:
+            return
+        try:
+            low, high = values.min(), values.max()
+            if self._min is not None:
+                low, high = min(low, self._min), max(high, self._max)
+        except TypeError:
+            # values of mixed types, which cannot be compared
+            self._comparable = False
+            self._min = self._max = None
+            return
+        self._min, self._max = low, high
+
+    def _update_moments(self, values):
+        # Chan et al.'s parallel update of the mean and sum of squared deviations
+        n, mean = len(values), values.mean()
+        m2 = float(((values - mean) ** 2).sum())
+        seen = self.count - self.nulls - n
+        total = seen + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta * delta * seen * n / total
+
+    @property
+    def min(self):
+        return _python(self._min, self.type) if self._min is not None else None
+
+    @property
+    def max(self):
+        return _python(self._max, self.type) if self._max is not None else None
+
+    @property
+    def mean(self) -> Optional[float]:
+        return float(self._mean) if self._numeric and self.count > self.nulls else None
+
+    @property
+    def variance(self) -> Optional[float]:
+        present = self.count - self.nulls
+        return float(self._m2 / (present - 1)) if self._numeric and present > 1 else None
+
+    @property
+    def distinct(self) -> int:
+        return min(self._distinct.estimate(), self.count - self.nulls)
+
+    @property
+    def quantiles(self) -> Optional[Dict[float, object]]:
+        if self._sketch is None:
+            return None
+        values = self._sketch.quantiles(self._qs)
+        return {q: _python(v, self.type) if v is not None else None
+                for q, v in zip(self._qs, values)}
+
+    def to_dict(self) -> dict:
+        """
+        The statistics, as a JSON-serializable dict.
+        """
+        quantiles = self.quantiles
+        return {
+            'name': self.name,
+            'type': self.type,
+            'count': self.count,
+            'nulls': self.nulls,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'variance': self.variance,
+            'distinct': self.distinct,
+            'quantiles': {str(q): v for q, v in quantiles.items()} if quantiles else None,
+        }
+
+    def __repr__(self):
+        return f'ColumnProfile({self.to_dict()!r})'
+
+
+def _present(column):
+    # the values which are not null, as a plain array
+    if np.ma.isMaskedArray(column):
+        return np.ma.getdata(column)[~np.ma.getmaskarray(column)]
+    if column.dtype.kind in 'mM':
+        return column[~np.isnat(column)]
+    if column.dtype == object:
+        return column[np.not_equal(column, None)]
+    return column
+
+
+def _python(value, typ):
+    if typ == 'timestamp':
+        text = str(np.datetime64(value, 'us'))
+        # whole seconds are written without a fraction, as records are
+        return (text[:-7] if text.endswith('.000000') else text) + 'Z'
+    if typ == 'date':
+        return str(np.datetime64(value, 'D'))
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def infer_schema(row: dict) -> list:
+    """
+    A schema of `(name, type)` pairs guessed from the Python types of the
+    values of one record, with `None` for types which are not known.
+    """
+    types = {bool: 'boolean', int: 'long', float: 'double', str: 'string'}
+    return [(name, types.get(type(value))) for name, value in row.items()]
+
+
+def profile_batches(batches: Iterable[dict], schema, quantiles=DEFAULT_QUANTILES,
+                    precision=DEFAULT_PRECISION,
+                    sketch_size=DEFAULT_SKETCH_SIZE) -> Dict[str, ColumnProfile]:
+    """
+    Profile the columns of batches of NumPy arrays keyed by column name.
+
+    # Parameters
+    batches (Iterable<dict>): the batches
+    schema (list): `(name, type)` pairs of the columns to profile
+    quantiles (Iterable<float>): quantiles to estimate
+    precision (int): precision of the HyperLogLog sketches
+    sketch_size (int): size of the quantile sketches
+
+    # Returns
+    Dict<str, ColumnProfile>: the profile of each column, in schema order
+    """
+    profiles = {name: ColumnProfile(name, typ, quantiles, precision, sketch_size)
+                for name, typ in schema}
+    for batch in batches:
+        for name, column in profiles.items():
+            column.update(batch[name])
+    return profiles
+
+
+def profile_records(rows: Iterator[dict], schema=None, batch_size=records.DEFAULT_BATCH_SIZE,
+                    quantiles=DEFAULT_QUANTILES, precision=DEFAULT_PRECISION,
+                    sketch_size=DEFAULT_SKETCH_SIZE) -> Dict[str, ColumnProfile]:
+    """
+    Profile the columns of a stream of records, in one pass.
+
+    # Parameters
+    rows (Iterator<dict>): the records
+    schema (list):
+        `(name, type)` pairs giving the columns and their Ascend types
+        (default is `infer_schema` of the first record)
+    batch_size (int): number of records decoded and profiled at a time
+    quantiles (Iterable<float>): quantiles to estimate
+    precision (int): precision of the HyperLogLog sketches
+    sketch_size (int): size of the quantile sketches
+
+    # Returns
+    Dict<str, ColumnProfile>: the profile of each column, in schema order
+
+    # Raises
+    ValueError: on invalid sketch parameters or batch size
+    """
+    for q in quantiles:
+        if not 0 <= q <= 1:
+            raise ValueError("Quantiles must be between 0 and 1.")
+    rows = iter(rows)
+    if not schema:
+        first = next(rows, None)
+        if first is None:
+            return {}
+        schema = infer_schema(first)
+        rows = itertools.chain([first], rows)
+    batches = records.record_batches(rows, schema, batch_size, arrow=False)
+    return profile_batches(batches, schema, quantiles, precision, sketch_size)
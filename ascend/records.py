@@ -0,0 +1,1307 @@
+"""
+Ascend Records module
+
+Helpers for reading the records of a Component through its `records-stream`
+endpoint, beyond a single sequential stream of dicts: parallel downloads,
+asyncio streams merged from several components, decoding into columnar
+batches for NumPy, pyarrow or pandas, writing to files, and comparing two
+sets of records.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import AsyncIterator, Iterator, Optional
+
+from ascend import ndjson
+from ascend.session import DeadlineExceeded
+import ascend.cli.sh as sh
+
+import ast
+import asyncio
+import contextlib
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import os
+import queue
+import requests
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# records fetched per request by a parallel download
+DEFAULT_WINDOW_SIZE = 100000
+
+
+def records_query(offset=0, limit=0):
+    """
+    Query parameters for a `records-stream` request
+
+    # Raises
+    ValueError: on negative offset or limit
+    """
+    if offset < 0:
+        raise ValueError("Offset must be a non-negative value.")
+    if limit < 0:
+        raise ValueError("Limit must be a non-negative value.")
+    query = {}
+    if offset > 0:
+        query["offset"] = offset
+    if limit > 0:
+        query["limit"] = limit
+    return query
+
+
+def windows(offset, limit, window_size):
+    """
+    Split the records from `offset` into consecutive `(offset, limit)` windows
+    of at most `window_size`, ending after `limit` records, or never if `limit` is 0.
+    """
+    start = offset
+    end = offset + limit if limit > 0 else None
+    while end is None or start < end:
+        size = window_size if end is None else min(window_size, end - start)
+        yield start, size
+        start += size
+
+
+def parallel_records(session, endpoint, offset=0, limit=0, parallel=2,
+                     window_size=DEFAULT_WINDOW_SIZE, ordered=True,
+                     selection=None) -> Iterator[dict]:
+    """
+    Stream records from a `records-stream` endpoint on `parallel` concurrent
+    connections, each fetching one window of `window_size` records at a time.
+
+    The number of records does not need to be known: the first window which
+    comes back short marks the end, and windows past it are dropped. The server
+    must not cap a request at fewer than `window_size` records.
+
+    At most `parallel` windows are in flight or buffered at once, so memory use
+    is bounded by `parallel * window_size` records.
+
+    # Parameters
+    session (ascend.session.Session): the session to stream with
+    endpoint (str): the `records-stream` endpoint
+    offset (int): index of the first record
+    limit (int): maximum number of records, or 0 for all of them
+    parallel (int): number of concurrent connections
+    window_size (int): number of records fetched per request
+    ordered (bool):
+        yield records in order; otherwise windows are yielded as they complete,
+        which avoids waiting on a slow window
+        (default is `True`)
+    selection (Selection):
+        if given, applied to each window as it is decoded, so that only the
+        selected records and columns are buffered
+        (default is `None`)
+
+    # Returns
+    Iterator<dict>: the records
+    """
+    # validate before the first record is asked for
+    records_query(offset, limit)
+    if window_size <= 0:
+        raise ValueError("Window size must be a positive value.")
+    return _parallel_records(session, endpoint, windows(offset, limit, window_size), parallel,
+                             ordered, selection)
+
+
+def _parallel_records(session, endpoint, pending_windows, parallel, ordered, selection):
+    def fetch(window):
+        start, size = window
+        # the end is found from the number of records before selection
+        count = 0
+
+        def transform(values):
+            nonlocal count
+            count += len(values)
+            return selection(values) if selection is not None else values
+
+        rows = list(session.stream(endpoint, query=records_query(start, size),
+                                   transform=transform))
+        return count, rows
+
+    pool = ThreadPoolExecutor(max_workers=parallel)
+    in_flight = deque()  # (window, future), in window order
+    end = None  # offset one past the last record, once known
+
+    def submit():
+        window = next(pending_windows, None)
+        if window is not None:
+            in_flight.append((window, pool.submit(fetch, window)))
+
+    try:
+        for _ in range(parallel):
+            submit()
+        while in_flight:
+            if ordered:
+                window, future = in_flight.popleft()
+            else:
+                wait([f for _, f in in_flight], return_when=FIRST_COMPLETED)
+                window, future = next((w, f) for w, f in in_flight if f.done())
+                in_flight.remove((window, future))
+            start, size = window
+            if end is not None and start >= end:
+                continue
+            count, rows = future.result()
+            if count < size:
+                end = start + count
+                for w, f in list(in_flight):
+                    if w[0] >= end:
+                        f.cancel()
+                        in_flight.remove((w, f))
+            elif end is None:
+                submit()
+            yield from rows
+    finally:
+        for _, f in in_flight:
+            f.cancel()
+        pool.shutdown(wait=False)
+
+
+# syntax allowed in `where` expressions
+WHERE_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Is, ast.IsNot, ast.Name, ast.Load, ast.Constant, ast.Tuple, ast.List, ast.Set,
+)
+if sys.version_info < (3, 8):
+    # literals, which Python 3.8 on parses as a Constant; newer versions
+    # deprecate the names
+    WHERE_NODES += tuple(filter(None, (
+        getattr(ast, name, None) for name in ('Num', 'Str', 'Bytes', 'NameConstant'))))
+
+
+def compile_where(expression):
+    """
+    Compile a filter expression into a predicate over records.
+
+    An expression is Python syntax restricted to literals, column names,
+    arithmetic, comparisons (including `in` and `is None`) and `and`, `or`
+    and `not`, such as `"value > 10 and name is not None"`. A column missing
+    from a record is `None`. A comparison which raises `TypeError`, such as
+    one between a null and a number, is false.
+
+    # Parameters
+    expression (str): the expression
+
+    # Returns
+    callable: `predicate(record) -> bool`
+
+    # Raises
+    ValueError: on invalid syntax, or syntax which is not allowed
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f'Invalid where expression {expression!r}: {e.msg}') from e
+    for node in ast.walk(tree):
+        if not isinstance(node, WHERE_NODES):
+            raise ValueError(f'Invalid where expression {expression!r}: '
+                             f'{type(node).__name__} is not allowed')
+    # read each column with `row.get`, in a lambda taking the row
+    function = ast.parse('lambda row: None', mode='eval')
+    function.body.body = _ColumnReader().visit(tree.body)
+    ast.fix_missing_locations(function)
+    return eval(compile(function, '<where>', 'eval'), {'__builtins__': {}, '_compare': _compare})
+
+
+def _compare(comparison):
+    try:
+        return comparison()
+    except TypeError:
+        return False
+
+
+class _ColumnReader(ast.NodeTransformer):
+    def visit_Name(self, node):
+        return ast.copy_location(ast.Call(
+            func=ast.Attribute(value=ast.Name(id='row', ctx=ast.Load()), attr='get',
+                               ctx=ast.Load()),
+            args=[ast.Constant(value=node.id)], keywords=[]), node)
+
+    def visit_Compare(self, node):
+        # `_compare(lambda: <comparison>)`, so that a failed comparison is false
+        self.generic_visit(node)
+        comparison = ast.parse('lambda: None', mode='eval').body
+        comparison.body = node
+        return ast.copy_location(ast.Call(func=ast.Name(id='_compare', ctx=ast.Load()),
+                                          args=[comparison], keywords=[]), node)
+
+
+class Selection:
+    """
+    The records, and the columns of each record, to keep out of a stream.
+
+    As a callable, it selects from a list of records, such as those decoded
+    from one chunk of a stream; `apply` selects from an iterator.
+
+    # Parameters
+    columns (list):
+        names of the columns to keep, in order; a column missing from a
+        record is `None`
+        (default is `None`, all columns)
+    where (callable or str):
+        predicate on a record, or an expression for `compile_where`; it sees
+        every column, not only `columns`
+        (default is `None`, all records)
+
+    # Raises
+    ValueError: on an invalid `where` expression
+    """
+
+    def __init__(self, columns=None, where=None):
+        self.columns = list(columns) if columns is not None else None
+        self.where = compile_where(where) if isinstance(where, str) else where
+
+    def __call__(self, rows: list) -> list:
+        if self.where is not None:
+            rows = [row for row in rows if self.where(row)]
+        if self.columns is not None:
+            columns = self.columns
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        return rows
+
+    def apply(self, rows: Iterator[dict]) -> Iterator[dict]:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, SELECTION_BATCH_SIZE))
+            if not batch:
+                return
+            yield from self(batch)
+
+
+# records selected together by `Selection.apply`
+SELECTION_BATCH_SIZE = 1000
+
+
+def selection(columns=None, where=None) -> Optional[Selection]:
+    """
+    A `Selection`, or `None` if it would keep everything.
+    """
+    if columns is None and where is None:
+        return None
+    return Selection(columns, where)
+
+
+# consecutive reconnection attempts before a dropped stream is given up on
+DEFAULT_RETRIES = 5
+# seconds before the first reconnection, doubling for each further attempt
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+# records delivered between two writes of a checkpoint file
+DEFAULT_CHECKPOINT_INTERVAL = 10000
+
+# transport errors after which a stream is resumed; an SSLError will not go
+# away, and neither will a passed deadline
+RESUMABLE_ERRORS = (requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.Timeout)
+
+
+class ResumableRecords:
+    """
+    An iterator over the records of a `records-stream` endpoint which survives
+    dropped connections.
+
+    It counts the records it has delivered, and when the stream fails with a
+    transport error, reconnects with `offset` moved past them, after a delay
+    growing exponentially from `backoff` up to `max_backoff`. It gives up after
+    `retries` consecutive failures which delivered no records.
+
+    With a `checkpoint` file, the offset of the next record is written to it
+    every `checkpoint_interval` records, on failure and when the iterator is
+    closed, and the file is removed once every record has been delivered. A
+    new iterator on the same endpoint and checkpoint starts where the last one
+    stopped. A record counts as delivered once it is returned by `next()`: a
+    consumer which buffers its output should set `checkpoint_interval` to 0,
+    and call `save_checkpoint` after flushing instead.
+
+    # Parameters
+    session (ascend.session.Session): the session to stream with
+    endpoint (str): the `records-stream` endpoint
+    offset (int): index of the first record
+    limit (int): maximum number of records, or 0 for all of them
+    retries (int): consecutive failed attempts allowed
+    backoff (float): seconds to wait before the first reconnection
+    max_backoff (float): maximum seconds to wait before a reconnection
+    checkpoint (str): path of the checkpoint file
+    checkpoint_interval (int): records between two checkpoints, or 0 for none
+    stream (callable):
+        `stream(offset, limit)` opens the stream at `offset`
+        (default streams `endpoint` on `session`)
+
+    # Raises
+    ValueError:
+        on invalid query parameter inputs, or a checkpoint for another
+        endpoint or starting offset
+    """
+
+    def __init__(self, session, endpoint, offset=0, limit=0, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, checkpoint=None,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, stream=None):
+        records_query(offset, limit)
+        if retries < 0:
+            raise ValueError("Retries must be a non-negative value.")
+        self.endpoint = endpoint
+        self.start = offset
+        # offset one past the last record, if limited
+        self.end = offset + limit if limit > 0 else None
+        self.offset = offset
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self._stream = stream or (
+            lambda o, n: session.stream(endpoint, query=records_query(o, n)))
+        self._rows = None
+        self._done = False
+        self._last_checkpoint = offset
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    @property
+    def delivered(self):
+        """
+        Number of records delivered since the first offset, including those
+        delivered before the checkpoint this iterator resumed from.
+        """
+        return self.offset - self.start
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        failures = 0
+        while True:
+            try:
+                if self._rows is None:
+                    if self.end is not None and self.offset >= self.end:
+                        raise StopIteration
+                    limit = self.end - self.offset if self.end is not None else 0
+                    self._rows = iter(self._stream(self.offset, limit))
+                row = next(self._rows)
+            except StopIteration:
+                self._finish()
+                raise
+            except RESUMABLE_ERRORS as e:
+                self._rows = None
+                if not isinstance(e, (requests.exceptions.SSLError, DeadlineExceeded)) \
+                        and failures < self.retries:
+                    delay = min(self.max_backoff, self.backoff * 2 ** failures)
+                    failures += 1
+                    sh.debug(f'{self.endpoint} dropped after {self.delivered} records ({e}); '
+                             f'resuming in {delay:.1f}s')
+                    time.sleep(delay)
+                    continue
+                self.save_checkpoint()
+                raise
+            self.offset += 1
+            if self.checkpoint_interval and \
+                    self.offset - self._last_checkpoint >= self.checkpoint_interval:
+                self.save_checkpoint()
+            return row
+
+    def close(self):
+        """
+        Stop streaming, and save a checkpoint.
+        """
+        if self._rows is not None and hasattr(self._rows, 'close'):
+            self._rows.close()
+        self._rows = None
+        if not self._done:
+            self.save_checkpoint()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def save_checkpoint(self):
+        """
+        Write the offset of the next record to the checkpoint file, if any.
+        """
+        if self.checkpoint is None:
+            return
+        state = {'endpoint': self.endpoint, 'start': self.start, 'end': self.end,
+                 'offset': self.offset}
+        temp = self.checkpoint + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp, self.checkpoint)
+        self._last_checkpoint = self.offset
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        if state.get('endpoint') != self.endpoint or state.get('start') != self.start:
+            raise ValueError(f'Checkpoint {self.checkpoint} is for another stream: '
+                             f'{state.get("endpoint")} from offset {state.get("start")}')
+        self.offset = self._last_checkpoint = state['offset']
+
+    def _finish(self):
+        self._done = True
+        self._rows = None
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+
+# records handed from the prefetching thread to the consumer at a time, and
+# seconds a record may wait for the rest of its batch
+PREFETCH_BATCH_SIZE = 1000
+PREFETCH_MAX_DELAY = 0.01
+
+
+class PrefetchedRecords:
+    """
+    An iterator which reads records on a background thread, so that network
+    reads and decoding overlap with the work the consumer does on each record.
+
+    At most `size` records are read ahead, in a bounded queue. They are handed
+    over in batches of up to `PREFETCH_BATCH_SIZE` records, or of those read
+    within `PREFETCH_MAX_DELAY` seconds. An error raised while reading is
+    raised again by `next()` once the records before it have been consumed.
+    Closing the iterator, or dropping it, stops the background thread and
+    closes `rows` after the read in progress.
+
+    The gain comes from a consumer which waits on I/O, or otherwise releases
+    the GIL, while the network is read; a consumer which only runs Python
+    code competes with decoding for the GIL, and is better off without it.
+
+    # Parameters
+    rows (Iterator<dict>): the records to read ahead
+    size (int): maximum number of records read ahead
+    """
+
+    def __init__(self, rows, size):
+        if size <= 0:
+            raise ValueError("Prefetch must be a positive value.")
+        batch_size = min(size, PREFETCH_BATCH_SIZE)
+        self._queue = queue.Queue(maxsize=max(1, size // batch_size))
+        self._stop = threading.Event()
+        self._batch = iter(())
+        self._done = False
+        # the thread must not hold a reference to self, so that an abandoned
+        # iterator is collected, and stops it
+        self._thread = threading.Thread(
+            target=_prefetch, args=(rows, batch_size, self._queue, self._stop),
+            name='ascend-records-prefetch', daemon=True)
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for row in self._batch:
+            return row
+        if self._done:
+            raise StopIteration
+        item = self._queue.get()
+        if isinstance(item, list):
+            self._batch = iter(item)
+            return next(self._batch)
+        self._done = True
+        if isinstance(item, BaseException):
+            raise item
+        raise StopIteration
+
+    def close(self):
+        """
+        Stop reading ahead, and discard the records read but not consumed.
+        """
+        self._done = True
+        self._batch = iter(())
+        self._stop.set()
+        # unblock the thread if it is waiting for room in the queue
+        with contextlib.suppress(queue.Empty):
+            while True:
+                self._queue.get_nowait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        # absent if the constructor raised
+        if hasattr(self, '_stop'):
+            self._stop.set()
+
+
+def _prefetch(rows, batch_size, records_queue, stop):
+    def put(item):
+        while not stop.is_set():
+            try:
+                records_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    batch = []
+    started = time.monotonic()
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size or time.monotonic() - started >= PREFETCH_MAX_DELAY:
+                put(batch)
+                if stop.is_set():
+                    return
+                batch = []
+                started = time.monotonic()
+        if batch:
+            put(batch)
+        put(_PREFETCH_END)
+    except BaseException as e:
+        if batch:
+            put(batch)
+        put(e)
+    finally:
+        if hasattr(rows, 'close'):
+            rows.close()
+
+
+# marks the end of the records in a prefetch queue
+_PREFETCH_END = object()
+
+
+# batches of records buffered by `merge_records` ahead of the consumer
+DEFAULT_MERGE_QUEUE_SIZE = 16
+
+
+def mirror_session(session, async_session=None) -> '_MirrorSession':
+    """
+    Use `async_session` if given, or else an `AsyncSession` mirroring the
+    blocking `session`, which is closed on exit.
+
+    ```python
+    async with records.mirror_session(session) as async_session:
+        ...
+    ```
+
+    # Parameters
+    session (ascend.session.Session): the blocking session to mirror
+    async_session (ascend.async_session.AsyncSession): a session to use instead
+    """
+    return _MirrorSession(session, async_session)
+
+
+class _MirrorSession:
+    # an async context manager, as `contextlib.asynccontextmanager` needs 3.7
+
+    def __init__(self, session, async_session):
+        self.session = session
+        self.async_session = async_session
+        self.mirror = None
+
+    async def __aenter__(self):
+        if self.async_session is not None:
+            return self.async_session
+        # aiohttp is optional
+        from ascend.async_session import AsyncSession
+        self.mirror = AsyncSession.from_session(self.session)
+        return await self.mirror.__aenter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.mirror is not None:
+            await self.mirror.__aexit__(exc_type, exc_val, exc_tb)
+
+
+async def aiter_records(session, endpoint, offset=0, limit=0,
+                        selection=None) -> AsyncIterator[dict]:
+    """
+    Stream records from a `records-stream` endpoint on an asyncio session.
+
+    # Parameters
+    session (ascend.async_session.AsyncSession): the session to stream with
+    endpoint (str): the `records-stream` endpoint
+    offset (int): index of the first record
+    limit (int): maximum number of records, or 0 for all of them
+    selection (Selection): if given, applied to each chunk as it is decoded
+
+    # Returns
+    AsyncIterator<dict>: the records
+    """
+    query = records_query(offset, limit)
+    batches = session.stream_batches(endpoint, query=query, transform=selection)
+    try:
+        async for values in batches:
+            for row in values:
+                yield row
+    finally:
+        # closed here, while this generator closes, rather than finalized later
+        await batches.aclose()
+
+
+def merge_records(session, sources, offset=0, limit=0, selection=None,
+                  queue_size=DEFAULT_MERGE_QUEUE_SIZE) -> AsyncIterator[tuple]:
+    """
+    Stream records from several `records-stream` endpoints at once, on one
+    asyncio session, and merge them into one stream as they arrive.
+
+    Each endpoint is read by its own task, which hands the records decoded
+    from each chunk to a queue of at most `queue_size` batches, so that a
+    slow consumer holds back every stream rather than buffering them. The
+    records of one source keep their order; those of different sources are
+    interleaved.
+
+    The first error raised by any stream is raised again once the records
+    queued before it have been consumed, and stops the other streams, as does
+    closing the iterator early with `aclose()`.
+
+    # Parameters
+    session (ascend.async_session.AsyncSession): the session to stream with
+    sources (list): `(source, endpoint)` pairs; `source` tags the records of `endpoint`
+    offset (int): index of the first record of each endpoint
+    limit (int): maximum number of records of each endpoint, or 0 for all of them
+    selection (Selection): if given, applied to each chunk as it is decoded
+    queue_size (int): maximum number of batches of records buffered
+
+    # Returns
+    AsyncIterator<tuple>: `(source, record)` pairs
+    """
+    query = records_query(offset, limit)
+    if queue_size <= 0:
+        raise ValueError("Queue size must be a positive value.")
+    return _MergedRecords(session, sources, query, selection, queue_size)
+
+
+class _MergedRecords:
+    # an async iterator rather than an async generator, which the event loop
+    # would also close, concurrently with the generator consuming it, if that
+    # generator is left unclosed when the loop shuts down
+
+    def __init__(self, session, sources, query, selection, queue_size):
+        self.session = session
+        self.sources = sources
+        self.query = query
+        self.selection = selection
+        self.queue_size = queue_size
+        self.batches = None
+        self.tasks = None
+        self.remaining = 0
+        self.source = None
+        self.rows = iter(())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.tasks is None:
+            # started on the first record, in the loop which reads them
+            self.batches = asyncio.Queue(maxsize=self.queue_size)
+            self.tasks = [asyncio.ensure_future(self._read(source, endpoint))
+                          for source, endpoint in self.sources]
+            self.remaining = len(self.tasks)
+        while True:
+            for row in self.rows:
+                return self.source, row
+            if not self.remaining:
+                await self.aclose()
+                raise StopAsyncIteration
+            source, values = await self.batches.get()
+            if values is None:
+                self.remaining -= 1
+            elif isinstance(values, Exception):
+                await self.aclose()
+                raise values
+            else:
+                self.source, self.rows = source, iter(values)
+
+    async def _read(self, source, endpoint):
+        stream = self.session.stream_batches(endpoint, query=self.query,
+                                             transform=self.selection)
+        try:
+            async for values in stream:
+                await self.batches.put((source, values))
+        except asyncio.CancelledError:
+            # an Exception before Python 3.8, but not a failure of the stream
+            raise
+        except Exception as e:
+            await self.batches.put((source, e))
+        else:
+            await self.batches.put((source, None))
+        finally:
+            # closed by this task as it is cancelled, not finalized by the loop
+            await stream.aclose()
+
+    async def aclose(self):
+        """
+        Stop every stream, and wait for them to close.
+        """
+        tasks, self.tasks = self.tasks or [], []
+        self.remaining = 0
+        self.rows = iter(())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# records decoded into each columnar batch
+DEFAULT_BATCH_SIZE = 65536
+
+# NumPy dtypes of Ascend schema types; other types are kept as Python objects
+NUMPY_TYPES = {
+    'boolean': 'bool',
+    'byte': 'int8',
+    'short': 'int16',
+    'int': 'int32',
+    'long': 'int64',
+    'float': 'float32',
+    'double': 'float64',
+    'date': 'datetime64[D]',
+    'timestamp': 'datetime64[us]',
+}
+
+# values standing in for nulls under the mask of a NumPy column
+NUMPY_FILL = {
+    'bool': False,
+    'datetime64[D]': 'NaT',
+    'datetime64[us]': 'NaT',
+}
+
+
+def schema_from_lineage(lineage, component_uuid):
+    """
+    The schema of a component as `(name, type)` pairs, read from the response
+    of its `lineage` endpoint, or an empty list if it is not there.
+    """
+    for node in (lineage.get('data') or {}).get('component_nodes') or ():
+        if node.get('uuid') == component_uuid:
+            return [tuple(column.split(' ', 1)) for column in node.get('schema') or ()]
+    return []
+
+
+def record_batches(rows, schema, batch_size=DEFAULT_BATCH_SIZE, arrow=None):
+    """
+    Decode records into columnar batches of up to `batch_size` records.
+
+    Without pyarrow, a batch is a dict of NumPy arrays keyed by column name.
+    Numeric, boolean and date columns holding nulls are masked arrays, with
+    nulls masked; strings and other types are object arrays holding `None`
+    for nulls. Timestamps are in UTC.
+
+    # Parameters
+    rows (Iterator<dict>): the records
+    schema (list):
+        `(name, type)` pairs giving the columns and their Ascend types; if
+        empty, the columns are the keys of the first record, and pyarrow
+        infers their types, or NumPy keeps them as Python objects
+    batch_size (int): maximum number of records in a batch
+    arrow (bool):
+        yield `pyarrow.RecordBatch` objects instead of dicts of NumPy arrays
+        (default is to use pyarrow if it is installed)
+
+    # Returns
+    Iterator<dict | pyarrow.RecordBatch>: the batches
+
+    # Raises
+    ValueError: on a non-positive batch size
+    """
+    if batch_size <= 0:
+        raise ValueError("Batch size must be a positive value.")
+    if arrow is None:
+        arrow = importlib.util.find_spec('pyarrow') is not None
+    convert = _arrow_batch if arrow else _numpy_batch
+    return _record_batches(iter(rows), list(schema or ()), batch_size, convert)
+
+
+def _record_batches(rows, schema, batch_size, convert):
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        if not schema:
+            schema = [(name, None) for name in batch[0]]
+        yield convert(schema, [[row.get(name) for row in batch] for name, _ in schema])
+
+
+def _strip_utc(values):
+    # NumPy datetimes are naive, and reject the 'Z' suffix of UTC
+    return [v[:-1] if v is not None and v.endswith('Z') else v for v in values]
+
+
+def _numpy_batch(schema, columns):
+    import numpy as np
+
+    batch = {}
+    for (name, typ), values in zip(schema, columns):
+        dtype = NUMPY_TYPES.get(typ, 'object')
+        if typ == 'timestamp':
+            values = _strip_utc(values)
+        if dtype == 'object' or None not in values:
+            batch[name] = np.array(values, dtype=dtype)
+            continue
+        mask = [v is None for v in values]
+        fill = NUMPY_FILL.get(dtype, 0)
+        data = np.array([fill if v is None else v for v in values], dtype=dtype)
+        batch[name] = np.ma.masked_array(data, mask=mask)
+    return batch
+
+
+def _arrow_type(typ):
+    import pyarrow as pa
+
+    return {
+        'boolean': pa.bool_(),
+        'byte': pa.int8(),
+        'short': pa.int16(),
+        'int': pa.int32(),
+        'long': pa.int64(),
+        'float': pa.float32(),
+        'double': pa.float64(),
+        'string': pa.string(),
+    }.get(typ)
+
+
+def _arrow_batch(schema, columns):
+    import pyarrow as pa
+
+    arrays = []
+    for (_, typ), values in zip(schema, columns):
+        if typ == 'timestamp':
+            arrays.append(pa.array(values, pa.string()).cast(pa.timestamp('us', tz='UTC')))
+        elif typ == 'date':
+            arrays.append(pa.array(values, pa.string()).cast(pa.date32()))
+        else:
+            arrays.append(pa.array(values, _arrow_type(typ)))
+    return pa.RecordBatch.from_arrays(arrays, names=[name for name, _ in schema])
+
+
+# output formats of `write_records`, and the file extensions implying each
+OUTPUT_FORMATS = {
+    'jsonl': ('.jsonl', '.ndjson', '.json'),
+    'csv': ('.csv',),
+    'parquet': ('.parquet', '.pq'),
+}
+
+# records encoded per write to a JSON lines or CSV file
+WRITE_BATCH_SIZE = 1000
+
+
+def output_format(path):
+    """
+    The output format and compression implied by the extension of `path`,
+    such as `('csv', True)` for `out.csv.gz`; the format is `None` if the
+    extension is not known.
+    """
+    name = path.lower()
+    compress = name.endswith('.gz')
+    if compress:
+        name = name[:-len('.gz')]
+    for fmt, extensions in OUTPUT_FORMATS.items():
+        if name.endswith(extensions):
+            return fmt, compress
+    return None, compress
+
+
+def write_records(rows, path, format='jsonl', compress=False, schema=None,
+                  batch_size=DEFAULT_BATCH_SIZE) -> int:
+    """
+    Write records to a file as they arrive, so memory use does not grow with
+    their number.
+
+    The file is written under a temporary name, and only renamed to `path`
+    once every record is written.
+
+    # Parameters
+    rows (Iterator<dict>): the records
+    path (str): the output file, or `-` for standard output
+    format (str): one of `jsonl`, `csv` or `parquet`
+    compress (bool):
+        gzip the output; for `parquet`, compress the columns with gzip instead
+        of snappy
+    schema (list):
+        `(name, type)` pairs giving the CSV and Parquet columns and the Parquet
+        types (default is the keys of the first record, and inferred types)
+    batch_size (int):
+        for `parquet`, the number of records in each row group
+
+    # Returns
+    int: the number of records written
+
+    # Raises
+    ValueError: on an unknown format, or `parquet` to standard output
+    """
+    if format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unknown output format {format}, expected one of '
+                         f'{", ".join(OUTPUT_FORMATS)}')
+    if path == '-':
+        if format == 'parquet':
+            raise ValueError('Parquet output must be written to a file.')
+        f = gzip.GzipFile('', 'wb', fileobj=sys.stdout.buffer) if compress else sys.stdout.buffer
+        try:
+            return _WRITERS[format](rows, f, schema, compress, batch_size)
+        finally:
+            f.flush()
+            if compress:
+                f.close()
+    temp = f'{path}.part'
+    try:
+        if format == 'parquet':
+            count = _write_parquet(rows, temp, schema, compress, batch_size)
+        else:
+            name = os.path.basename(path)
+            if name.lower().endswith('.gz'):
+                name = name[:-len('.gz')]
+            with open(temp, 'wb') as raw, \
+                    (gzip.GzipFile(name, 'wb', fileobj=raw) if compress else raw) as f:
+                count = _WRITERS[format](rows, f, schema, compress, batch_size)
+        os.replace(temp, path)
+        return count
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def _write_jsonl(rows, f, schema, compress, batch_size):
+    count = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, WRITE_BATCH_SIZE))
+        if not batch:
+            return count
+        f.write(b''.join(map(ndjson.encode_line, batch)))
+        count += len(batch)
+
+
+def _write_csv(rows, f, schema, compress, batch_size):
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='', write_through=True)
+    try:
+        writer = csv.writer(text)
+        rows = iter(rows)
+        names = [name for name, _ in schema or ()]
+        first = next(rows, None)
+        if not names and first is not None:
+            names = list(first)
+        writer.writerow(names)
+        if first is None:
+            return 0
+        count = 0
+        pending = [first]
+        while pending:
+            writer.writerows([[_csv_value(row.get(name)) for name in names] for row in pending])
+            count += len(pending)
+            pending = list(islice(rows, WRITE_BATCH_SIZE))
+        return count
+    finally:
+        # leave `f` open for its owner
+        text.detach()
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def _write_parquet(rows, path, schema, compress, batch_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    count = 0
+    try:
+        for batch in record_batches(rows, schema, batch_size, arrow=True):
+            if writer is None:
+                writer = pq.ParquetWriter(path, batch.schema,
+                                          compression='gzip' if compress else 'snappy')
+            writer.write_batch(batch)
+            count += batch.num_rows
+        if writer is None:
+            empty = _arrow_batch(schema or [], [[] for _ in schema or ()])
+            pq.write_table(pa.Table.from_batches([empty]), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+_WRITERS = {
+    'jsonl': _write_jsonl,
+    'csv': _write_csv,
+}
+
+
+# partitions the records of a diff are spilled into, and the size of the
+# records of one side of a partition above which it is split again
+DEFAULT_DIFF_PARTITIONS = 64
+DEFAULT_DIFF_PARTITION_BYTES = 64 * 1024 * 1024
+DIFF_SPLIT = 16
+# records read from or written to a spill file at a time
+DIFF_BUFFER_SIZE = 1024 * 1024
+
+DIFF_RESULTS = ('added', 'removed', 'changed')
+
+_MATCHED = object()
+
+
+def diff(a, b, key, columns=None, partitions=DEFAULT_DIFF_PARTITIONS, workers=None,
+         partition_bytes=DEFAULT_DIFF_PARTITION_BYTES, spill_dir=None,
+         parallel=1) -> 'RecordDiff':
+    """
+    Compare two sets of records matched by `key`, in bounded memory.
+
+    Both sets are streamed once, and spilled to temporary files partitioned by
+    a hash of the key, so matching records land in the same partition. The
+    partitions are then compared on `workers` processes: each loads the
+    records of `a` in one partition, and streams those of `b` past them. A
+    partition whose records of either side take more than `partition_bytes`
+    on disk is split again first, so memory use does not depend on the number
+    of records, only on `partition_bytes` and the number of workers.
+
+    ```python
+    with records.diff(old_transform, new_transform, key=["id"]) as result:
+        print(result.summary())
+        for change in result.changed_records():
+            print(change["key"], change["columns"])
+    ```
+
+    # Parameters
+    a (Component | str | Iterable<dict>):
+        the records before: a Component, the path of a JSON lines file, such as
+        one written by `write_records`, optionally gzipped, or the records
+    b (Component | str | Iterable<dict>): the records after, likewise
+    key (list): names of the columns identifying a record
+    columns (list):
+        names of the columns to compare, besides the key
+        (default is `None`, every column)
+    partitions (int): number of partitions spilled to disk
+    workers (int):
+        number of processes comparing partitions, or 1 to compare them in this
+        process
+        (default is the number of CPUs)
+    partition_bytes (int): size on disk above which a partition is split again
+    spill_dir (str):
+        directory in which to create the temporary files
+        (default is the system's temporary directory)
+    parallel (int): number of concurrent connections streaming a Component
+
+    # Returns
+    RecordDiff: the counts and the records of each kind of difference, kept on
+    disk until it is closed
+
+    # Raises
+    ValueError: on an empty key, invalid sizes, or a key matching several
+    records of `a` or of `b`
+    """
+    key = list(key or ())
+    if not key:
+        raise ValueError("Diff key must name at least one column.")
+    if partitions <= 0 or partition_bytes <= 0:
+        raise ValueError("Diff partitions and partition bytes must be positive values.")
+    workers = workers or os.cpu_count() or 1
+    if columns is not None:
+        columns = key + [c for c in columns if c not in key]
+    directory = tempfile.mkdtemp(prefix='ascend-diff-', dir=spill_dir)
+    try:
+        for side, source in (('a', a), ('b', b)):
+            _spill(_diff_source(source, columns, parallel), key, 0,
+                   [os.path.join(directory, f'{side}-{i}.jsonl') for i in range(partitions)])
+        tasks = [(directory, str(i), key, partition_bytes) for i in range(partitions)]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, partitions)) as pool:
+                counts = list(pool.map(_diff_partition, tasks))
+        else:
+            counts = [_diff_partition(task) for task in tasks]
+        return RecordDiff(directory, key, [str(i) for i in range(partitions)], counts)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+
+class RecordDiff:
+    """
+    The result of `diff`: counts of the records `added` to `b`, `removed` from
+    `a`, `changed` between them and `unchanged`, and iterators over each kind
+    of difference, read back from disk, in no particular order.
+
+    The files are removed by `close()`, or on leaving a `with` block.
+    """
+
+    def __init__(self, directory, key, partitions, counts):
+        self.directory = directory
+        self.key = key
+        self._partitions = partitions
+        totals = {kind: sum(c[kind] for c in counts) for kind in DIFF_RESULTS + ('unchanged',)}
+        self.added = totals['added']
+        self.removed = totals['removed']
+        self.changed = totals['changed']
+        self.unchanged = totals['unchanged']
+
+    def summary(self) -> dict:
+        return {'added': self.added, 'removed': self.removed, 'changed': self.changed,
+                'unchanged': self.unchanged}
+
+    def added_records(self) -> Iterator[dict]:
+        """
+        The records of `b` whose key is not in `a`.
+        """
+        return self._read('added')
+
+    def removed_records(self) -> Iterator[dict]:
+        """
+        The records of `a` whose key is not in `b`.
+        """
+        return self._read('removed')
+
+    def changed_records(self) -> Iterator[dict]:
+        """
+        The records whose key is in both, but which differ, as dicts of the
+        `key` values, the names of the `columns` which differ, and the records
+        `before` and `after`.
+        """
+        return self._read('changed')
+
+    def _read(self, kind):
+        if self.directory is None:
+            raise ValueError("Diff is closed.")
+        for partition in self._partitions:
+            yield from _read_jsonl(os.path.join(self.directory, f'{kind}-{partition}.jsonl'))
+
+    def close(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f'RecordDiff({self.summary()!r})'
+
+
+def _diff_source(source, columns, parallel):
+    if hasattr(source, 'get_records'):
+        return source.get_records(parallel=parallel, columns=columns)
+    if isinstance(source, (str, os.PathLike)):
+        rows = _read_jsonl(source)
+    else:
+        rows = iter(source)
+    if columns is not None:
+        return Selection(columns).apply(rows)
+    return rows
+
+
+def _diff_key(key):
+    # a function from a record to the tuple of its key values
+    if len(key) == 1:
+        name = key[0]
+        return lambda row: (row.get(name),)
+    return lambda row: tuple(map(row.get, key))
+
+
+def _encode_key(values) -> bytes:
+    # a canonical encoding of key values, which may be lists or objects, so
+    # they can be hashed and equal values match
+    return json.dumps(values, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _spill(rows, key, salt, paths):
+    # one file per partition; `salt` varies the hash when a partition is split
+    get_key = _diff_key(key)
+    buffers = [[] for _ in paths]
+    files = [open(path, 'ab') for path in paths]
+    try:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, WRITE_BATCH_SIZE))
+            if not batch:
+                break
+            partitions = [hash((salt, _encode_key(get_key(row)))) % len(paths)
+                          for row in batch]
+            for i, line in zip(partitions, map(ndjson.encode_line, batch)):
+                buffers[i].append(line)
+            for f, buffer in zip(files, buffers):
+                if len(buffer) >= WRITE_BATCH_SIZE:
+                    f.write(b''.join(buffer))
+                    buffer.clear()
+        for f, buffer in zip(files, buffers):
+            f.write(b''.join(buffer))
+    finally:
+        for f in files:
+            f.close()
+
+
+def _read_jsonl(path):
+    opener = gzip.open if str(path).lower().endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        yield from ndjson.decode_chunks(iter(lambda: f.read(DIFF_BUFFER_SIZE), b''))
+
+
+def _diff_partition(task) -> dict:
+    directory, partition, key, partition_bytes = task
+    counts = dict.fromkeys(DIFF_RESULTS + ('unchanged',), 0)
+    outputs = {kind: open(os.path.join(directory, f'{kind}-{partition}.jsonl'), 'wb')
+               for kind in DIFF_RESULTS}
+    try:
+        _compare_partition(directory, partition, key, partition_bytes, counts, outputs, 0)
+    finally:
+        for f in outputs.values():
+            f.close()
+    return counts
+
+
+def _compare_partition(directory, partition, key, partition_bytes, counts, outputs, depth):
+    a = os.path.join(directory, f'a-{partition}.jsonl')
+    b = os.path.join(directory, f'b-{partition}.jsonl')
+    if max(os.path.getsize(a), os.path.getsize(b)) > partition_bytes and depth < 8:
+        parts = [f'{partition}.{i}' for i in range(DIFF_SPLIT)]
+        for side, path in (('a', a), ('b', b)):
+            _spill(_read_jsonl(path), key, depth + 1,
+                   [os.path.join(directory, f'{side}-{p}.jsonl') for p in parts])
+            os.remove(path)
+        for p in parts:
+            _compare_partition(directory, p, key, partition_bytes, counts, outputs, depth + 1)
+        return
+    get_key = _diff_key(key)
+    # encoded key -> the record of a, or _MATCHED once a record of b has the key
+    before = {}
+    for row in _read_jsonl(a):
+        k = get_key(row)
+        encoded = _encode_key(k)
+        if encoded in before:
+            raise ValueError(f"Diff key {dict(zip(key, k))} matches several records of a")
+        before[encoded] = row
+    os.remove(a)
+    for row in _read_jsonl(b):
+        k = get_key(row)
+        encoded = _encode_key(k)
+        old = before.get(encoded)
+        if old is _MATCHED:
+            raise ValueError(f"Diff key {dict(zip(key, k))} matches several records of b")
+        before[encoded] = _MATCHED
+        if old is None:
+            counts['added'] += 1
+            outputs['added'].write(ndjson.encode_line(row))
+        elif old == row:
+            counts['unchanged'] += 1
+        else:
+            counts['changed'] += 1
+            names = list(old) + [name for name in row if name not in old]
+            outputs['changed'].write(ndjson.encode_line({
+                'key': dict(zip(key, k)),
+                'columns': [n for n in names if old.get(n) != row.get(n)],
+                'before': old,
+                'after': row,
+            }))
+    os.remove(b)
+    for row in before.values():
+        if row is _MATCHED:
+            continue
+        counts['removed'] += 1
+        outputs['removed'].write(ndjson.encode_line(row))
@@ -3,7 +3,9 @@ import ascend.cli.global_values as global_values
 from google.protobuf.message import Message
 from google.protobuf.json_format import ParseDict
 from ascend.protos.resource import resource_pb2
+from ascend import records
 from typing import List, TYPE_CHECKING
+import functools
 if TYPE_CHECKING:
     from ascend.resource_definitions import ResourceSession
 
@@ -50,30 +52,39 @@ class Resource:
     def get_rd_path(self):
         raise NotImplementedError(self)
 
-    def apply(self):
+    def apply(self, exists=None):
         """
         Upserts this Resource
 
+        # Parameters
+        exists (bool):
+            whether the Resource is already deployed, if the caller knows,
+            which saves a request to find out
+            (default is `None`, to check with the API)
+
         # Raises
         HTTPError: on API errors
         """
-        exists = False
-        try:
-            self.session.get(self.resource_path)
-            exists = True
-        except KeyError:
-            pass
-        except HTTPError as e:
-            if e.response and e.response.status_code == 404:
-                pass
-            else:
-                raise e
+        if exists is None:
+            exists = self.exists()
         try:
             if exists:
-                self.session.patch(self.resource_path, data=self.json_definition)
+                resp = self.session.patch(self.resource_path, data=self.json_definition, return_json=True)
+            else:
+                try:
+                    resp = self.session.post(self.base_api_path, data=self.json_definition)
+                except HTTPError as e:
+                    # created since the caller looked
+                    if e.response is None or e.response.status_code != 409:
+                        raise e
+                    resp = self.session.patch(self.resource_path, data=self.json_definition,
+                                              return_json=True)
+            data = resp.get('data') if isinstance(resp, dict) else None
+            if isinstance(data, dict) and data.get('uuid'):
+                self.json_definition = data
             else:
-                self.session.post(self.base_api_path, data=self.json_definition)
-            self.json_definition = self.session.get(self.resource_path)['data']
+                # the write did not echo the resource back
+                self.json_definition = self.session.get(self.resource_path)['data']
             self.uuid = self.json_definition['uuid']
         except HTTPError as e:
             details = f'unable to apply {self.resource_path}'
@@ -81,6 +92,26 @@ class Resource:
                 details = f'{details}: {e.response.content}'
             raise Exception(details) from e
 
+    def exists(self):
+        """
+        Checks whether this Resource is deployed
+
+        # Returns
+        bool: `True` if the Resource exists
+
+        # Raises
+        HTTPError: on API errors
+        """
+        try:
+            self.session.get(self.resource_path)
+            return True
+        except KeyError:
+            return False
+        except HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return False
+            raise e
+
     def delete(self):
         """
         Deletes this Resource
@@ -144,15 +175,56 @@ class Component(Resource):
         ParseDict(d, message, ignore_unknown_fields=True)
         return message
 
-    def get_records(self, offset=0, limit=0):
+    def get_records(self, offset=0, limit=0, parallel=1, ordered=True,
+                    window_size=records.DEFAULT_WINDOW_SIZE, retries=0, checkpoint=None,
+                    prefetch=0, columns=None, where=None):
         """
         Get the records of data from the Data Feed.
 
+        When the session has a `record_cache`, records are read from it while
+        the Component's definition is unchanged, and otherwise written to it
+        as they are streamed.
+
+        Records are selected as each chunk of the stream is decoded, so that
+        unused columns and records are dropped before they are buffered.
+
         # Parameters
         offset (int):
             index at which records will start streaming from
         limit (int):
             maximum number of records that should be returned
+        parallel (int):
+            number of concurrent connections; above 1, the records are fetched
+            in windows of `window_size` records, with at most `parallel` windows
+            in flight or buffered at a time
+            (default is `1`, a single stream)
+        ordered (bool):
+            with `parallel`, whether records must come back in order
+            (default is `True`)
+        window_size (int):
+            with `parallel`, the number of records fetched per request
+        retries (int):
+            reconnect up to `retries` times in a row when the stream drops,
+            resuming after the records already delivered, with exponential
+            backoff (see `records.ResumableRecords`)
+            (default is `0`, to raise the error)
+        checkpoint (str):
+            path of a file in which to keep the offset of the next record, so
+            that a later call with the same arguments resumes where this one
+            stopped
+        prefetch (int):
+            read and decode up to `prefetch` records ahead on a background
+            thread, while the caller works on earlier ones
+            (see `records.PrefetchedRecords`)
+            (default is `0`, to read on the caller's thread)
+        columns (list):
+            names of the columns to keep in each record
+            (default is `None`, all columns)
+        where (callable or str):
+            keep only the records for which this predicate is true, or this
+            expression, such as `"value > 10 and name is not None"`
+            (see `records.compile_where`)
+            (default is `None`, all records)
 
         # Returns
         Iterator<dict>:
@@ -163,16 +235,221 @@ class Component(Resource):
         ValueError: on invalid query parameter inputs
         HTTPError:  on API errors
         """
-        if offset < 0:
-            raise ValueError("Offset must be a non-negative value.")
-        if limit < 0:
-            raise ValueError("Limit must be a non-negative value.")
-        query_params = {}
-        if offset > 0:
-            query_params["offset"] = offset
-        if limit > 0:
-            query_params["limit"] = limit
-
-        return self.session.stream(self.resource_path + "/records-stream", query=query_params)
+        selection = records.selection(columns, where)
+        cache = getattr(self.session, 'record_cache', None)
+        if cache is not None and self.uuid and checkpoint is None:
+            # the cache holds every column of every record
+            rows = self._cached_records(cache, offset, limit, parallel, ordered, window_size,
+                                        retries)
+            if selection is not None:
+                rows = selection.apply(rows)
+        else:
+            rows = self._stream_records(offset, limit, parallel, ordered, window_size, retries,
+                                        checkpoint, selection)
+        if prefetch > 0:
+            return records.PrefetchedRecords(rows, prefetch)
+        return rows
+
+    def _cached_records(self, cache, offset, limit, parallel, ordered, window_size, retries):
+        records.records_query(offset, limit)
+        fingerprint = cache.fingerprint(self.json_definition)
+        rows = cache.get(self.uuid, fingerprint, offset, limit)
+        if rows is not None:
+            return rows
+        rows = self._stream_records(offset, limit, parallel, ordered, window_size, retries)
+        if not ordered:
+            # a range of records out of order cannot be sliced later
+            return rows
+        return cache.write_through(self.uuid, fingerprint, offset, limit, rows)
+
+    def _stream_records(self, offset, limit, parallel, ordered, window_size, retries,
+                        checkpoint=None, selection=None):
+        endpoint = self.resource_path + "/records-stream"
+        if retries > 0 or checkpoint is not None:
+            if not ordered:
+                raise ValueError("Only ordered records can be resumed.")
+            stream = functools.partial(
+                records.parallel_records, self.session, endpoint, parallel=parallel,
+                window_size=window_size) if parallel > 1 else None
+            rows = records.ResumableRecords(self.session, endpoint, offset, limit, retries,
+                                            checkpoint=checkpoint, stream=stream)
+            # resuming counts every record streamed, so select from them afterwards
+            return selection.apply(rows) if selection is not None else rows
+        if parallel > 1:
+            return records.parallel_records(self.session, endpoint, offset, limit, parallel,
+                                            window_size, ordered, selection)
+        return self.session.stream(endpoint, query=records.records_query(offset, limit),
+                                   transform=selection)
+
+    async def aiter_records(self, offset=0, limit=0, columns=None, where=None, session=None):
+        """
+        Get the records of data from the Data Feed, as an async iterator
+        streaming them on an asyncio session.
+
+        ```python
+        async for record in feed.aiter_records(columns=["id", "value"]):
+            ...
+        ```
+
+        Requires the optional `aiohttp` dependency.
+
+        # Parameters
+        offset (int):
+            index at which records will start streaming from
+        limit (int):
+            maximum number of records that should be returned
+        columns (list):
+            names of the columns to keep in each record, as for `get_records`
+        where (callable or str):
+            filter on the records, as for `get_records`
+        session (ascend.async_session.AsyncSession):
+            the session to stream with
+            (default is a session sharing the tokens of this Component's
+            session, closed once the records are read)
+
+        # Returns
+        AsyncIterator<dict>: An async iterator over the records.
+
+        # Raises
+        ValueError: on invalid query parameter inputs
+        aiohttp.ClientResponseError:  on API errors
+        """
+        selection = records.selection(columns, where)
+        endpoint = self.resource_path + "/records-stream"
+        async with records.mirror_session(self.session, session) as async_session:
+            rows = records.aiter_records(async_session, endpoint, offset, limit, selection)
+            try:
+                async for row in rows:
+                    yield row
+            finally:
+                # stop the stream before the session it reads from is closed
+                await rows.aclose()
+
+    def get_schema(self):
+        """
+        Get the schema of the records of this Component, from its lineage.
+
+        # Returns
+        list: `(name, type)` pairs, or an empty list if the schema is unknown
+
+        # Raises
+        KeyError: if the API has no lineage for this Component
+        HTTPError:  on API errors
+        """
+        return records.schema_from_lineage(self.session.get(self.resource_path + "/lineage"),
+                                           self.uuid)
+
+    def get_record_batches(self, batch_size=records.DEFAULT_BATCH_SIZE, offset=0, limit=0,
+                           parallel=1, schema=None, arrow=None, prefetch=0, columns=None,
+                           where=None):
+        """
+        Get the records of data from the Data Feed, decoded into columnar batches.
+
+        Each batch is a `pyarrow.RecordBatch` if pyarrow is installed, or else
+        a dict of NumPy arrays keyed by column name (see `records.record_batches`).
+        Column types come from the schema of the Component.
+
+        ```python
+        import pyarrow as pa
+        df = pa.Table.from_batches(feed.get_record_batches()).to_pandas()
+        ```
+
+        # Parameters
+        batch_size (int):
+            maximum number of records in a batch
+        offset (int):
+            index at which records will start streaming from
+        limit (int):
+            maximum number of records that should be returned
+        parallel (int):
+            number of concurrent connections, as for `get_records`
+        schema (list):
+            `(name, type)` pairs to decode the records with
+            (default is the schema from `get_schema`)
+        arrow (bool):
+            whether to yield pyarrow batches
+            (default is to use pyarrow if it is installed)
+        prefetch (int):
+            records read ahead while a batch is decoded, as for `get_records`
+        columns (list):
+            names of the columns to decode, as for `get_records`
+        where (callable or str):
+            filter on the records, as for `get_records`
+
+        # Returns
+        Iterator<pyarrow.RecordBatch | dict>: An iterator over the batches.
+
+        # Raises
+        ValueError: on invalid query parameter inputs
+        HTTPError:  on API errors
+        """
+        if schema is None:
+            schema = self.get_schema()
+        if columns is not None:
+            types = dict(schema)
+            schema = [(name, types.get(name)) for name in columns]
+        rows = self.get_records(offset, limit, parallel, prefetch=prefetch, columns=columns,
+                                where=where)
+        return records.record_batches(rows, schema, batch_size, arrow)
+
+    def profile(self, offset=0, limit=0, parallel=1, schema=None, columns=None, where=None,
+                batch_size=records.DEFAULT_BATCH_SIZE, quantiles=None, prefetch=0):
+        """
+        Profile the columns of the records of this Component, in one streaming
+        pass which holds one batch of records at a time.
+
+        Each column gets its null count, minimum and maximum, mean and variance
+        if numeric, an approximate distinct count, and approximate quantiles if
+        numeric or temporal (see `ascend.profile.ColumnProfile`). Requires the
+        optional `numpy` dependency.
+
+        ```python
+        for column in feed.profile(columns=["id", "value"]).values():
+            print(column.to_dict())
+        ```
+
+        # Parameters
+        offset (int):
+            index at which records will start streaming from
+        limit (int):
+            maximum number of records that should be profiled
+        parallel (int):
+            number of concurrent connections, as for `get_records`
+        schema (list):
+            `(name, type)` pairs of the columns
+            (default is the schema from `get_schema`, or else types guessed
+            from the first record)
+        columns (list):
+            names of the columns to profile
+            (default is `None`, all columns)
+        where (callable or str):
+            profile only the records matching this filter, as for `get_records`
+        batch_size (int):
+            number of records profiled at a time
+        quantiles (list):
+            quantiles to estimate, from 0 to 1
+            (default is `ascend.profile.DEFAULT_QUANTILES`)
+        prefetch (int):
+            records read ahead while a batch is profiled, as for `get_records`
+
+        # Returns
+        Dict<str, ascend.profile.ColumnProfile>: the profile of each column
+
+        # Raises
+        ValueError: on invalid query parameter inputs
+        HTTPError:  on API errors
+        """
+        from ascend import profile
+
+        if schema is None:
+            schema = self.get_schema()
+        if columns is not None and schema:
+            types = dict(schema)
+            schema = [(name, types.get(name)) for name in columns]
+        rows = self.get_records(offset, limit, parallel, prefetch=prefetch, columns=columns,
+                                where=where)
+        if quantiles is None:
+            quantiles = profile.DEFAULT_QUANTILES
+        return profile.profile_records(rows, schema, batch_size, quantiles)
 
 
@@ -1,7 +1,12 @@
 import abc
+import functools
+import hashlib
+import json
 import os
 import sys
+import threading
 from collections import defaultdict
+from types import SimpleNamespace
 from typing import List, Mapping, Optional, Tuple
 
 import jinja2
@@ -16,14 +21,38 @@ import ascend.jinja as jinja
 import ascend.model as model
 import ascend.transforms as transforms
 from ascend.credentials import Credential, CredentialEntry
+from ascend.index import ResourceIndex
 from ascend.resource import Resource, Component
-from ascend.util import coalesce, filter_none, flatten
+from ascend.util import coalesce, filter_none, flatten, parallel_map
 from ascend.protos.resource import resource_pb2
 
 ROOT_PATH = (None, None, None)
 
+PLAN_CREATE = 'create'
+PLAN_UPDATE = 'update'
+PLAN_DELETE = 'delete'
+PLAN_NOOP = 'no-op'
+
+# how remote resources are rendered to compare them with local definitions:
+# one resource at a time, since children are planned as resources of their own
+PLAN_OPTIONS = SimpleNamespace(recursive=False, directory=True)
+
+
+def synchronized(method):
+    """
+    Run a ResourceSession method while holding the session's lock
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class ResourceDefinition:
+    # keys of children which are applied as resources of their own
+    CHILD_KEYS = ('components', 'groups', 'dataflows', 'dataFeeds')
+
     def __init__(self, resource, resource_type, resource_id):
         self.resource = MessageToDict(resource)
         self.transforms = transforms.Transforms.from_rd(self.resource)
@@ -57,6 +86,26 @@ class ResourceDefinition:
     def dependencies(self):
         raise NotImplementedError(self)
 
+    def canonical(self) -> dict:
+        """
+        The parts of this definition which determine the deployed resource,
+        in a form that is the same for a local definition and for one
+        rendered from the remote resource.
+        """
+        rd = {
+            k: v for k, v in self.rd.items()
+            if k not in ('id', 'name', 'description') + self.CHILD_KEYS
+        }
+        return {'name': self.name, 'description': self.description or '', 'definition': rd}
+
+    def digest(self) -> str:
+        data = json.dumps(self.canonical(), sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def has_credentials(self) -> bool:
+        return any(isinstance(t, transforms.Creds) and t.has_credentials()
+                   for t in self.transforms)
+
     def delete_deps(self):
         return []
 
@@ -106,7 +155,7 @@ class ResourceDefinition:
 
     def apply(self, rs: 'ResourceSession') -> Resource:
         res = self.to_resource(rs)
-        res.apply()
+        res.apply(exists=rs.is_deployed(self.path))
         return res
 
     def delete(self):
@@ -314,8 +363,10 @@ class GroupDef(ResourceDefinition):
         try:
             old = rs.get_resource(*self.path)
             prev_uuids = [i['uuid'] for i in old.json_definition['content']]
+            exists = True
         except KeyError:
             prev_uuids = []
+            exists = False
         sh.debug(f'prev: {prev_uuids}')
         cur_rds = rs.group_path_to_content_path.get(self.path, [])
         cur_uuids = [rs.get_resource(*p).uuid for p in cur_rds]
@@ -328,7 +379,7 @@ class GroupDef(ResourceDefinition):
         json['content'] = [{'uuid': res.uuid, 'type': res.api_type} for res in ress]
         sh.debug(json)
         res = model.Group(self.data_service_id, self.dataflow_id, self.resource_id, json, rs.session)
-        res.apply()
+        res.apply(exists=exists)
         return res
 
     def dependencies(self):
@@ -370,7 +421,7 @@ class ComponentDef(ResourceDefinition):
 
     def apply(self, rs: 'ResourceSession') -> Resource:
         res = self.to_resource(rs)
-        res.apply()
+        res.apply(exists=rs.is_deployed(self.path))
         if self.rd.get('groupId') is not None:
             group_path = (self.data_service_id, self.dataflow_id, self.rd['groupId'])
         else:
@@ -393,21 +444,19 @@ class ComponentDef(ResourceDefinition):
         else:
             pub_ds, pub_id = input_id.split('.')
             pub = rs.get_resource(pub_ds, pub_id, None)
-            # need to either find a sub for the desired pub, or generate a new one
-            sub_uuid = next((v for k, v in rs.type_to_api_path_to_uuid['sub'].items()
-                             if k[1] == self.dataflow_id
-                             and k[0] == self.data_service_id
-                             and rs.uuid_to_resource[v].json_definition['pubUUID'] == pub.uuid),
-                            None)
-            if sub_uuid is None:
-                sub_id = f'sub_for_{pub_id}'
-                json = {'id': sub_id, 'name': sub_id,
-                        'description': 'Auto-generated sub', 'pubUUID': pub.uuid}
-                sub = model.DataFeedConnector(self.data_service_id, self.dataflow_id,
-                                              sub_id, json, rs.session)
-                sub.apply()
-            else:
-                sub = rs.uuid_to_resource[sub_uuid]
+            # held across lookup and creation so that components applied
+            # concurrently do not each generate a sub for the same pub
+            with rs.lock:
+                # need to either find a sub for the desired pub, or generate a new one
+                sub = rs.pub_uuid_to_dfc[pub.uuid].get((self.data_service_id, self.dataflow_id))
+                if sub is None:
+                    sub_id = f'sub_for_{pub_id}'
+                    json = {'id': sub_id, 'name': sub_id,
+                            'description': 'Auto-generated sub', 'pubUUID': pub.uuid}
+                    sub = model.DataFeedConnector(self.data_service_id, self.dataflow_id,
+                                                  sub_id, json, rs.session)
+                    sub.apply()
+                    rs.register(sub)
             return sub
 
     def dependencies(self):
@@ -515,7 +564,7 @@ class DataServiceDef(ResourceDefinition):
 
     def apply(self, rs: 'ResourceSession') -> Resource:
         res = self.to_resource(rs)
-        res.apply()
+        res.apply(exists=rs.is_deployed(self.path))
         rs.refresh_roles()
         return res
 
@@ -586,26 +635,21 @@ class ResourcePath:
 
     def children(self, rs: 'ResourceSession'):
         if self.rd_path == ROOT_PATH:
-            def ds_child(child_rd_path):
-                return child_rd_path[0] is not None and \
-                       child_rd_path[1] is None and \
-                       child_rd_path[2] is None
             rs.load_env()
-            source = list(filter(ds_child, rs.path_to_uuid.keys()))
+            source = [(ds_id, None, None) for ds_id in rs.index.data_service_ids()]
         elif isinstance(self.resource, model.DataService):
-            def df_child(child_rd_path):
-                return child_rd_path[0] == self.rd_path[0] and \
-                       child_rd_path[1] is not None and \
-                       child_rd_path[2] is None
             rs.load_data_service(self.resource)
-            source = list(filter(df_child, rs.path_to_uuid.keys()))
+            source = [
+                rs.uuid_to_resource[uuid].get_rd_path()
+                for uuid in rs.index.find('project', self.rd_path[0])
+            ]
         elif isinstance(self.resource, model.Dataflow):
-            def res_child(child_rd_path):
-                return child_rd_path[0] == self.rd_path[0] and \
-                       child_rd_path[1] is self.rd_path[1] and \
-                       child_rd_path[2] is not None
             rs.load_dataflow(self.resource)
-            source = list(filter(res_child, rs.path_to_uuid.keys()))
+            source = [
+                rs.uuid_to_resource[uuid].get_rd_path()
+                for api_type in ['source', 'view', 'sink']
+                for uuid in rs.index.find(api_type, self.rd_path[0], self.rd_path[1])
+            ]
         else:
             source = []
         return filter_none(
@@ -626,7 +670,7 @@ class ResourcePath:
 
 
 class ResourceSession:
-    def __init__(self, client, session):
+    def __init__(self, client, session, jobs=1):
         self.session = session
         self.client = client
         self.path_to_uuid = {}
@@ -638,9 +682,17 @@ class ResourceSession:
         self.loaded = set()
         self.uuid_to_resource = {}
         self.roles = None
-        self.pub_uuid_to_dfc = {}
+        # pub uuid -> (data service id, dataflow id) -> data feed connector
+        self.pub_uuid_to_dfc = defaultdict(dict)
+        self.index = ResourceIndex()
         self.list_only = False
+        # number of concurrent requests used when crawling the environment
+        # and resources applied at once
+        self.jobs = jobs
+        # guards the maps above when resources are applied concurrently
+        self.lock = threading.RLock()
 
+    @synchronized
     def update_group(self, group_path: Optional, content_path):
         old_group = self.content_path_to_group_path.get(content_path)
         if old_group == group_path:
@@ -719,6 +771,12 @@ class ResourceSession:
                 self.load_contained_defs(c)
 
     def apply(self, res_path_str, creds, options):
+        # what to create, update or leave unchanged is decided on the current
+        # remote state, never a cached snapshot of it
+        with self.session.uncached():
+            self._apply(res_path_str, creds, options)
+
+    def _apply(self, res_path_str, creds, options):
         # load resource defs from directory: path_to_def
         self.path_to_def = {}
         # need to handle case where there is no resource in api for path
@@ -743,33 +801,51 @@ class ResourceSession:
                 except Exception as e:
                     raise KeyError(f'Unable to load dependency {path}') from e
 
-        for path in reversed(list(nx.topological_sort(g))):
-            if path not in self.path_to_def:
-                continue
-            else:
+        plan = getattr(options, 'plan', False)
+        force = getattr(options, 'force', False)
+        planned = []
+        for level in dependency_levels(g):
+            level_defs = []
+            for path in sorted(level, key=path_sort_key):
+                if path not in self.path_to_def:
+                    continue
                 res_def = self.path_to_def[path]
                 if isinstance(res_def, GroupDef):
                     # groups need to go last
                     groups.add(res_def)
                     continue
+                action = self.plan_action(res_def)
+                if action == PLAN_NOOP and force:
+                    action = PLAN_UPDATE
+                planned.append((action, res_def.path))
+                if action == PLAN_NOOP:
+                    if not plan:
+                        sh.info(f'UNCHANGED: {res_def.path}')
+                    continue
+                if plan:
+                    if isinstance(res_def, (ComponentDef, DataFeedDef)):
+                        # applying may move it between groups, which dirties them
+                        self.update_group(next(iter(res_def.dependees()), None), res_def.path)
+                    continue
                 for transform in res_def.transforms:
                     transform.to_api(creds=creds)
                 sh.info(f'APPLY: {res_def.path}')
                 sh.debug(res_def.resource)
-                if not options.dry_run:
-                    res = res_def.apply(self)
-                    self.path_to_uuid[path] = res.uuid
-                    self.uuid_to_resource[res.uuid] = res
-                else:
+                level_defs.append(res_def)
+            if not options.dry_run:
+                # nothing within a level depends on anything else in it
+                applied = parallel_map(lambda rd: rd.apply(self), level_defs, self.jobs)
+                for res in applied:
+                    self.register(res)
+            else:
+                for res_def in level_defs:
                     try:
-                        res = self.get_resource(*res_def.path)
-                        self.path_to_uuid[path] = res.uuid
-                        self.uuid_to_resource[res.uuid] = res
+                        self.register(self.get_resource(*res_def.path))
                     except KeyError:
                         sh.info(f'Unable to get {res_def.path} during dry run')
 
         group_paths = self.dirty_groups | {g.path for g in groups}
-        for group_path in group_paths:
+        for group_path in sorted(group_paths, key=path_sort_key):
             group_def = self.path_to_def.get(group_path)
             if group_def is None:
                 # Not creating, must already exist
@@ -780,6 +856,19 @@ class ResourceSession:
                 group_def = ResourceDefinition.from_resource_proto(
                     group_res.to_resource_proto(self, options),
                     (group_res.data_service_id, group_res.dataflow_id, group_res.resource_id))
+                action = PLAN_UPDATE
+            else:
+                action = self.plan_action(group_def)
+            if action == PLAN_NOOP and (force or group_path in self.dirty_groups):
+                # membership is not part of the definition, so a dirty group always changes
+                action = PLAN_UPDATE
+            planned.append((action, group_path))
+            if action == PLAN_NOOP:
+                if not plan:
+                    sh.info(f'UNCHANGED: {group_def.path}')
+                continue
+            if plan:
+                continue
 
             sh.info(f'APPLY: {group_def.path}')
             if not options.dry_run:
@@ -788,7 +877,51 @@ class ResourceSession:
         if options.delete and options.recursive:
             for child in ResourcePath.from_arg(res_path_str, self).children(self):
                 if child.exportable and child.rd_path not in marked_paths:
-                    self._delete(child, options)
+                    planned.append((PLAN_DELETE, child.rd_path))
+                    if not plan:
+                        self._delete(child, options)
+
+        if plan:
+            print_plan(planned)
+
+    def is_deployed(self, path) -> bool:
+        try:
+            self.get_resource(*path)
+            return True
+        except KeyError:
+            return False
+
+    def plan_action(self, res_def: ResourceDefinition) -> str:
+        """
+        Decide whether applying res_def would create or update a resource, or
+        leave it unchanged, by comparing it with the already loaded remote state.
+
+        The remote resource is rendered as `get` would write it, so that
+        transforms which change a definition on export compare equal. The
+        values of credentials are never returned by the API, so a resource
+        which refers to credentials is always updated.
+        """
+        try:
+            res = self.get_resource(*res_def.path)
+        except KeyError:
+            return PLAN_CREATE
+        if res_def.has_credentials():
+            sh.debug(f'{res_def.path} refers to credentials, which cannot be compared')
+            return PLAN_UPDATE
+        try:
+            remote_def = ResourceDefinition.from_resource_proto(
+                res.to_resource_proto(self, PLAN_OPTIONS), res_def.path)
+            for transform in remote_def.transforms:
+                # without a directory, no transform writes files
+                transform.from_api(directory=False, parent_directory=None, res_def=remote_def)
+        except Exception as e:
+            sh.debug(f'Unable to compare {res_def.path} with {res}: {e}')
+            return PLAN_UPDATE
+        if remote_def.digest() == res_def.digest():
+            return PLAN_NOOP
+        sh.debug(f'remote: {remote_def.canonical()}')
+        sh.debug(f'local: {res_def.canonical()}')
+        return PLAN_UPDATE
 
     def list(self, path_str, recursive):
         self.list_only = True
@@ -796,6 +929,8 @@ class ResourceSession:
         return self._list(res_path, res_path, recursive, 0 - (res_path != ROOT_PATH))
 
     def _list(self, origin, res_path: ResourcePath, recursive, depth):
+        if recursive and origin.rd_path == res_path.rd_path:
+            self.prefetch(res_path)
         res_path.dump(origin, depth)
         if origin.rd_path == res_path.rd_path or recursive:
             for child_path in res_path.children(self):
@@ -814,6 +949,8 @@ class ResourceSession:
     def _get(self, origin, res_path: ResourcePath, options, creds_snippet):
         # load resources for path
         if options.recursive:
+            if origin.rd_path == res_path.rd_path:
+                self.prefetch(res_path)
             for child_path in res_path.children(self):
                 self._get(origin, child_path, options, creds_snippet)
         if res_path.exportable:
@@ -831,6 +968,11 @@ class ResourceSession:
                     res_def.dump(origin, options)
 
     def delete(self, res_path_str, options):
+        # what to delete is listed from the current remote state, as in `apply`
+        with self.session.uncached():
+            self._delete_path(res_path_str, options)
+
+    def _delete_path(self, res_path_str, options):
         res_path = ResourcePath.from_arg(res_path_str, self)
         if not res_path:
             raise ValueError(f'{res_path_str} is not deletable!')
@@ -845,11 +987,8 @@ class ResourceSession:
                              f'recursive flag, contains children')
         if isinstance(res_path.resource, model.Dataflow):
             self.load_dataflow(res_path.resource)
-            df_uuids = [
-                v for k, v in self.type_to_api_path_to_uuid['pub'].items()
-                if k[0] == res_path.resource.data_service_id
-                   and k[1] == res_path.resource.dataflow_id
-            ]
+            df_uuids = self.index.find('pub', res_path.resource.data_service_id,
+                                       res_path.resource.dataflow_id)
             if len(df_uuids) > 0:
                 dfs = list(map(self.uuid_to_resource.get, df_uuids))
                 raise ValueError(f'Cannot delete dataflow which contains data feeds: {dfs}')
@@ -857,17 +996,31 @@ class ResourceSession:
         if not options.dry_run:
             res_path.resource.delete()
 
+    @synchronized
+    def register(self, res: Resource):
+        api_path = res.get_api_path()
+        self.uuid_to_resource[res.uuid] = res
+        self.type_to_api_path_to_uuid[res.api_type][api_path] = res.uuid
+        self.index.add(res.api_type, api_path, res.uuid)
+        if isinstance(res, model.DataFeedConnector):
+            self.pub_uuid_to_dfc[res.json_definition['pubUUID']].setdefault(api_path[:2], res)
+        try:
+            self.path_to_uuid[res.get_rd_path()] = res.uuid
+        except NotImplementedError:
+            # subs do not have rd paths
+            pass
+
+    @synchronized
     def load_env(self):
         if ROOT_PATH not in self.loaded:
             dss = self.client.list_data_services()
             for ds in dss:
-                self.uuid_to_resource[ds.uuid] = ds
-                self.path_to_uuid[ds.get_rd_path()] = ds.uuid
-                self.type_to_api_path_to_uuid['organization'][ds.get_api_path()] = ds.uuid
+                self.register(ds)
             if not self.list_only:
                 self.refresh_roles()
             self.loaded.add(ROOT_PATH)
 
+    @synchronized
     def refresh_roles(self):
         roles = self.client.list_roles()
         self.roles = roles
@@ -888,70 +1041,101 @@ class ResourceSession:
         return self.client.create_credential_entry(data_service_id, entry)
 
     def load_data_service(self, ds):
-        path = ds.get_api_path()
-        if path not in self.loaded:
-            dfs = ds.list_dataflows()
-            # cannot use list_data_feeds because we won't get the full json
+        self.load_data_services([ds])
+
+    @synchronized
+    def load_data_services(self, dss):
+        pending = [ds for ds in dss if ds.get_api_path() not in self.loaded]
+        # cannot use list_data_feeds because we won't get the full json
+        listings = parallel_map(lambda ds: ds.list_dataflows(), pending, self.jobs)
+        dataflows = []
+        for ds, dfs in zip(pending, listings):
             for df in dfs:
                 try:
-                    self.uuid_to_resource[df.uuid] = df
-                    self.path_to_uuid[df.get_rd_path()] = df.uuid
-                    self.type_to_api_path_to_uuid[df.api_type][df.get_api_path()] = df.uuid
+                    self.register(df)
                 except Exception as e:
                     raise ValueError(f'Unable to extract from {df}') from e
-                if not self.list_only:
-                    self.load_dataflow(df)
-            self.loaded.add(path)
+            dataflows.extend(dfs)
+        if not self.list_only:
+            self.load_dataflows(dataflows)
+        for ds in pending:
+            self.loaded.add(ds.get_api_path())
 
     def load_dataflow(self, dataflow):
-        path = dataflow.get_api_path()
-        if path not in self.loaded:
-            resources = dataflow.list_components()
-            if not self.list_only:
-                groups = dataflow.list_groups()
-                resources.extend(groups)
-            for res in resources:
-                if isinstance(res, model.ReadConnector) and not self.list_only:
+        self.load_dataflows([dataflow])
+
+    @synchronized
+    def load_dataflows(self, dataflows):
+        # fetch concurrently, but merge on this thread so the maps are only
+        # ever written by one thread, in a deterministic order
+        pending = [df for df in dataflows if df.get_api_path() not in self.loaded]
+        fetched = parallel_map(self._fetch_dataflow, pending, self.jobs)
+        for dataflow, (resources, groups) in zip(pending, fetched):
+            self._merge_dataflow(dataflow, resources, groups)
+
+    def _fetch_dataflow(self, dataflow):
+        resources = dataflow.list_components()
+        groups = []
+        if not self.list_only:
+            groups = dataflow.list_groups()
+            for i, res in enumerate(resources):
+                if isinstance(res, model.ReadConnector):
                     # Direct load for blob sources
                     cont = res.json_definition['source'].get('container', {})
                     if cont.get('immediate') is not None:
                         payload = self.session.get(res.resource_path)['data']
-                        res = model.ReadConnector(res.data_service_id, res.dataflow_id,
-                                                  res.component_id, payload, res.session)
-                elif isinstance(res, model.DataFeedConnector):
-                    self.pub_uuid_to_dfc[res.json_definition['pubUUID']] = res
-                self.uuid_to_resource[res.uuid] = res
-                self.type_to_api_path_to_uuid[res.api_type][res.get_api_path()] = res.uuid
+                        resources[i] = model.ReadConnector(res.data_service_id, res.dataflow_id,
+                                                           res.component_id, payload, res.session)
+        return resources, groups
+
+    def _merge_dataflow(self, dataflow, resources, groups):
+        path = dataflow.get_api_path()
+        if path in self.loaded:
+            return
+        for res in resources + groups:
+            self.register(res)
+        for group in groups:
+            for item in group.json_definition['content']:
+                res = self.uuid_to_resource[item['uuid']]
                 try:
-                    k = res.get_rd_path()
-                    self.path_to_uuid[k] = res.uuid
+                    res_path = res.get_rd_path()
+                    group_path = group.get_api_path()
+                    self.content_path_to_group_path[res_path] = group_path
+                    prev_cont = self.group_path_to_content_path.get(group_path, set())
+                    self.group_path_to_content_path[group_path] = prev_cont | {res_path}
                 except NotImplementedError:
-                    # groups and subs do not have rd paths
+                    # subs do not have rd paths
                     continue
-            if not self.list_only:
-                for group in groups:
-                    for item in group.json_definition['content']:
-                        res = self.uuid_to_resource[item['uuid']]
-                        try:
-                            res_path = res.get_rd_path()
-                            group_path = group.get_api_path()
-                            self.content_path_to_group_path[res_path] = group_path
-                            prev_cont = self.group_path_to_content_path.get(group_path, set())
-                            self.group_path_to_content_path[group_path] = prev_cont | {res_path}
-                        except NotImplementedError:
-                            # subs do not have rd paths
-                            continue
-            self.loaded.add(path)
+        self.loaded.add(path)
+
+    def prefetch(self, res_path: 'ResourcePath'):
+        """
+        Load everything below res_path up front, so that a recursive walk
+        does not fetch one dataflow at a time.
+        """
+        if self.jobs <= 1:
+            return
+        if res_path.rd_path == ROOT_PATH:
+            self.load_env()
+            dss = [self.get_ds(ds_id) for ds_id in self.index.data_service_ids()]
+        elif isinstance(res_path.resource, model.DataService):
+            dss = [res_path.resource]
+        else:
+            return
+        self.load_data_services(dss)
+        self.load_dataflows([
+            self.uuid_to_resource[uuid]
+            for ds in dss for uuid in self.index.find('project', ds.data_service_id)
+        ])
 
+    @synchronized
     def get_ds(self, data_service_id) -> 'model.DataService':
         k = (data_service_id, None, None)
         if k not in self.path_to_uuid:
-            ds = self.client.get_data_service(data_service_id)
-            self.uuid_to_resource[ds.uuid] = ds
-            self.path_to_uuid[ds.get_rd_path()] = ds.uuid
-            self.type_to_api_path_to_uuid[ds.get_api_path()] = ds.uuid
+            self.register(self.client.get_data_service(data_service_id))
         return self.uuid_to_resource[self.path_to_uuid[k]]
 
+    @synchronized
     def get_df(self, data_service_id, df_id):
         keygen = lambda _df_id: (data_service_id, _df_id, None)
         k = keygen(df_id)
@@ -960,6 +1144,7 @@ class ResourceSession:
             self.load_data_service(ds)
         return self.uuid_to_resource[self.path_to_uuid[k]]
 
+    @synchronized
     def get_resource(self, data_service_id, df_id: Optional[str],
                      resource_id: Optional[str]) -> Resource:
         if data_service_id is None:
@@ -976,6 +1161,35 @@ class ResourceSession:
         return self.uuid_to_resource[self.path_to_uuid[k]]
 
 
+def print_plan(planned):
+    for action, path in planned:
+        print(f'{action:>7}: {".".join(filter_none(path))}')
+    counts = {action: 0 for action in (PLAN_CREATE, PLAN_UPDATE, PLAN_DELETE, PLAN_NOOP)}
+    for action, _ in planned:
+        counts[action] += 1
+    print(f'Plan: {counts[PLAN_CREATE]} to create, {counts[PLAN_UPDATE]} to update, '
+          f'{counts[PLAN_DELETE]} to delete, {counts[PLAN_NOOP]} unchanged')
+
+
+def path_sort_key(path):
+    return tuple(p or '' for p in path)
+
+
+def dependency_levels(g: nx.DiGraph) -> List[List[tuple]]:
+    """
+    Split a graph whose edges point from a path to its dependencies into
+    levels: every path comes after all of its dependencies, and nothing
+    within a level depends on anything else in that level.
+    """
+    depth = {}
+    for path in reversed(list(nx.topological_sort(g))):
+        depth[path] = 1 + max((depth[dep] for dep in g.successors(path)), default=-1)
+    levels = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+    for path, d in depth.items():
+        levels[d].append(path)
+    return levels
+
+
 def resolve_path(arg_path, base_path, res_path) -> str:
     '''
     e.g.
@@ -2,15 +2,163 @@
 Ascend Session module
 
 The Session module encapsulates an HTTP session, and adds authentication.
-All API requests pass through the Session.
+All API requests pass through the Session, which retries those which fail
+transiently according to its `RetryPolicy`.
 """
 
-from ascend.auth import AwsV4Auth, BearerAuth, RefreshAuth
+from ascend import ndjson
+from ascend.auth import AwsV4Auth, BearerAuth, RefreshAuth, token_expiry
+from ascend.pool import DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, \
+    PoolAdapter
+from typing import Optional
 import ascend.cli.sh as sh
 
+import contextlib
+import email.utils
 import json
+import random
 import requests
+import threading
+import time
 import urllib3
+import weakref
+
+# methods which may be sent again without changing the result: GET, and the
+# record streams, which are GETs
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+# statuses of responses to requests which may succeed if sent again
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# errors on which a request may succeed if sent again
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+# seconds before the expiry of the access token at which it is refreshed in
+# the background, at most a fifth of its lifetime; within the margin of its
+# expiry, at most a tenth of its lifetime, requests wait for a new token instead
+TOKEN_REFRESH_AHEAD = 300.0
+TOKEN_EXPIRY_MARGIN = 5.0
+# seconds before a failed background refresh is tried again
+TOKEN_REFRESH_RETRY = 10.0
+
+# marker for exchange_tokens: exchange regardless of the current token
+_ANY_TOKEN = object()
+
+
+class DeadlineExceeded(requests.Timeout):
+    """
+    Raised when a request cannot be sent, or sent again, before its deadline.
+    """
+
+
+class RetryPolicy:
+    """
+    When and how often the Session sends a request again.
+
+    A request is retried after a connection error or timeout, or a response
+    with one of `statuses`, up to `retries` times. The wait before retry `n`
+    is drawn uniformly from 0 to `backoff * 2^n`, capped at `max_backoff`, so
+    that concurrent clients spread out; a `Retry-After` header, in seconds or
+    as a date, sets the least wait, up to `max_retry_after`.
+
+    Only requests with an idempotent method are retried, unless the call says
+    its request is idempotent, such as a POST carrying an idempotency key.
+    Requests of any method are retried when they are known not to have been
+    processed: on a 429 response, or a connection which could not be made.
+
+    # Parameters
+    retries (int):
+        maximum number of retries of a request
+        (default is `5`; `0` disables retries)
+    backoff (float):
+        seconds of the first backoff, doubled on each retry
+        (default is `0.5`)
+    max_backoff (float):
+        maximum seconds of a backoff
+        (default is `30`)
+    max_retry_after (float):
+        maximum seconds to wait for a `Retry-After`; a response asking for
+        longer is returned as it is
+        (default is `120`)
+    statuses (Iterable<int>):
+        statuses of responses to retry
+        (default is `RETRY_STATUSES`)
+    methods (Iterable<str>):
+        methods retried without the call saying the request is idempotent
+        (default is `IDEMPOTENT_METHODS`)
+    timeout (float or tuple):
+        seconds to wait for each attempt to connect and for each read, as for
+        `requests`, cut short by the deadline
+        (default is `None`, the Session's timeouts)
+    deadline (float):
+        seconds in which a call must complete, retries included; no retry
+        starts if its backoff would go past it
+        (default is `None`, no limit)
+    """
+
+    def __init__(self, retries=5, backoff=0.5, max_backoff=30.0, max_retry_after=120.0,
+                 statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS, timeout=None,
+                 deadline=None):
+        if retries < 0:
+            raise ValueError("Retries must be a non-negative value.")
+        if backoff < 0 or max_backoff < 0:
+            raise ValueError("Backoff must be a non-negative value.")
+        if deadline is not None and deadline <= 0:
+            raise ValueError("Deadline must be a positive value.")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+        self.timeout = timeout
+        self.deadline = deadline
+
+    def idempotent(self, method) -> bool:
+        return method.upper() in self.methods
+
+    def wait(self, attempt, response=None) -> Optional[float]:
+        """
+        Seconds to wait before retry `attempt`, counting from 0, or `None` if
+        `response` asks for a longer wait than `max_retry_after`.
+        """
+        wait = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                wait = max(wait, retry_after)
+        return wait
+
+
+NO_RETRY = RetryPolicy(retries=0)
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """
+    Seconds to wait given by a `Retry-After` header, either a number of
+    seconds or an HTTP date, or `None` if it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _not_sent(error) -> bool:
+    # the connection could not be made, so the server never saw the request
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
 
 
 class Session:
@@ -18,6 +166,17 @@ class Session:
     Session implements an authenticated HTTP session to an Ascend host,
     including handling token exchange.
 
+    Constructing a Session makes no request: the token exchange is deferred
+    until the first request, or a call to `authenticate()`, so code which
+    never calls the API, such as a dry run, never waits for it. Meanwhile a
+    connection to the host is opened in the background, so that the first
+    request does not wait for the TLS handshake either.
+
+    The access token is refreshed in the background shortly before it
+    expires, so requests do not fail with 401 and need replaying. A token
+    whose expiry cannot be read is refreshed on its first 401 instead. Either
+    way, concurrent threads share a single exchange.
+
     # Parameters
     environment_hostname (str):
         hostname on which the Ascend environment you wish connect to is deployed
@@ -28,9 +187,50 @@ class Session:
     verify (bool):
         verify the server's SSL certificate
         (default is `True`)
+    cache (ascend.cache.SnapshotCache):
+        if given, GET responses are served from and stored in this cache,
+        and writes invalidate the entries they affect
+        (default is `None`)
+    record_cache (ascend.cache.RecordCache):
+        if given, `Component.get_records` serves records from and stores them
+        in this cache
+        (default is `None`)
+    base_uri (str):
+        URL to send requests to instead of `https://<environment_hostname>:443/`,
+        such as a local `ascend.fake_api.FakeAscendServer`. Requests are still
+        signed for `environment_hostname`.
+        (default is `None`)
+    retry (RetryPolicy):
+        when and how often to send requests again after transient failures
+        (default is `RetryPolicy()`; `NO_RETRY` disables retries)
+    token_cache (ascend.cache.TokenCache):
+        if given, tokens are shared through this cache with other Sessions
+        and processes using the same access key, which reuse a valid access
+        or refresh token rather than exchange the access keys again
+        (default is `None`)
+    prewarm (bool):
+        open a connection to the host in the background on construction
+        (default is `True`)
+    pool_size (int):
+        connections to the host kept open for reuse, shared by the token
+        exchanges and API requests; more concurrent requests than this open
+        connections which are closed afterwards, as `pool_stats()` reports
+        (default is `ascend.pool.DEFAULT_POOL_SIZE`)
+    keep_alive (bool):
+        keep connections open between requests
+        (default is `True`)
+    connect_timeout (float):
+        seconds to wait for a connection to the host, or `None` for no limit
+        (default is `ascend.pool.DEFAULT_CONNECT_TIMEOUT`)
+    read_timeout (float):
+        seconds to wait for each read of a response, or `None` for no limit
+        (default is `ascend.pool.DEFAULT_READ_TIMEOUT`)
     """
 
-    def __init__(self, environment_hostname, access_key, secret_key, verify=True):
+    def __init__(self, environment_hostname, access_key, secret_key, verify=True, cache=None,
+                 base_uri=None, record_cache=None, retry=None, token_cache=None,
+                 prewarm=True, pool_size=DEFAULT_POOL_SIZE, keep_alive=True,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
         if not access_key:
             raise ValueError("Missing api access key")
         if not secret_key:
@@ -42,45 +242,283 @@ class Session:
                 category=urllib3.exceptions.InsecureRequestWarning)
 
         self.verify = verify
-        self.base_uri = "https://{}:443/".format(environment_hostname)
+        self.cache = cache
+        # blocks in which GETs go to the server rather than the cache
+        self._uncached = 0
+        self._uncached_lock = threading.Lock()
+        self.retry = retry if retry is not None else RetryPolicy()
+        self._deadlines = []
+        self._deadlines_lock = threading.Lock()
+        self.record_cache = record_cache
+        self.base_uri = base_uri or "https://{}:443/".format(environment_hostname)
+        self.timeout = (connect_timeout, read_timeout)
         self.signed_session = requests.session()
         self.signed_session.auth = AwsV4Auth(access_key, secret_key, environment_hostname, "POST")
-
-        self.init_token_exchange()
-
         self.bearer_session = requests.session()
         self.bearer_session.headers["Ascend-Service-Name"] = "sdk"
-        self.bearer_session.auth = BearerAuth(self.access_token)
-
         self.refresh_session = requests.session()
-        self.refresh_session.auth = RefreshAuth(self.refresh_token)
+        # one pool, so a connection opened for any of them serves all of them
+        self.pool = PoolAdapter(pool_size, keep_alive)
+        for http in (self.signed_session, self.bearer_session, self.refresh_session):
+            http.mount('https://', self.pool)
+            http.mount('http://', self.pool)
+
+        # one token exchange at a time, which every thread waiting on it shares
+        self._token_lock = threading.Lock()
+        self._refreshing = False
+        self._token_refresh_at = None
+        self._token_stale_at = None
+        self.token_cache = token_cache
+        self._token_cache_key = (environment_hostname, access_key)
+        self.access_token = self.refresh_token = None
+        # the token exchange goes first, and the connection it is sent on
+        self._prewarm = threading.Thread(
+            target=_prewarm, args=(self.signed_session, self.base_uri + "authn/tokenExchange",
+                                   verify, connect_timeout),
+            name='ascend-prewarm', daemon=True) if prewarm else None
+        self._prewarm_until = None
+        if self._prewarm is not None:
+            self._prewarm.start()
+            if connect_timeout is not None:
+                self._prewarm_until = time.monotonic() + connect_timeout
+
+    def authenticate(self):
+        """
+        Exchange the access keys for tokens now, rather than on the first
+        request, unless that has already happened.
+        """
+        if self.access_token is None:
+            self.exchange_tokens(stale_token=None)
 
     def init_token_exchange(self):
-        resp = self.signed_session.post(self.base_uri + "authn/tokenExchange", verify=self.verify)
+        # a token exchange changes nothing but the tokens, so it may be sent again
+        resp = self.send(self.signed_session, 'POST', self.base_uri + "authn/tokenExchange",
+                         idempotent=True, verify=self.verify)
         resp.raise_for_status()
-        respJson = resp.json()
-        self.access_token, self.refresh_token = respJson["data"]["access_token"], respJson["data"]["refresh_token"]
+        self._set_tokens(resp.json()["data"])
 
     def refresh_token_exchange(self):
-        resp = self.refresh_session.post(self.base_uri + "authn/tokenExchange", verify=self.verify)
+        resp = self.send(self.refresh_session, 'POST', self.base_uri + "authn/tokenExchange",
+                         idempotent=True, verify=self.verify)
         resp.raise_for_status()
-        respJson = resp.json()
-        self.access_token, self.refresh_token = respJson["data"]["access_token"], respJson["data"]["refresh_token"]
-        self.bearer_session.auth = BearerAuth(self.access_token)
-        self.refresh_session.auth = RefreshAuth(self.refresh_token)
-
-    def exchange_tokens(self):
-        if self.refresh_token:
-            self.refresh_token_exchange()
+        self._set_tokens(resp.json()["data"])
+
+    def _set_tokens(self, data):
+        access_token, refresh_token = data["access_token"], data["refresh_token"]
+        # `access_token` goes last: a thread which sees it set, without taking
+        # the lock, finds the auth and times which go with it already set
+        self.bearer_session.auth = BearerAuth(access_token)
+        self.refresh_session.auth = RefreshAuth(refresh_token)
+        expiry = token_expiry(access_token)
+        if expiry is None:
+            # refreshed on the first 401 instead
+            self._token_refresh_at = self._token_stale_at = None
         else:
-            self.init_token_exchange()
+            lifetime = max(0.0, expiry - time.time())
+            expires_at = time.monotonic() + lifetime
+            self._token_stale_at = expires_at - min(TOKEN_EXPIRY_MARGIN, lifetime / 10)
+            self._token_refresh_at = expires_at - min(TOKEN_REFRESH_AHEAD, lifetime / 5)
+        self.refresh_token = refresh_token
+        self.access_token = access_token
+
+    def exchange_tokens(self, stale_token=_ANY_TOKEN):
+        """
+        Exchange tokens, unless another thread already replaced `stale_token`
+        while this one was waiting for the lock, so that any number of threads
+        finding the token stale cause one exchange.
+        """
+        with self._token_lock:
+            if stale_token is not _ANY_TOKEN and self.access_token != stale_token:
+                return
+            if self.token_cache is None:
+                self._exchange_tokens()
+                return
+            # other processes wait for this one's tokens rather than exchange their own
+            with self.token_cache.lock(*self._token_cache_key):
+                if self._use_cached_tokens():
+                    return
+                self._exchange_tokens()
+                self.token_cache.put(*self._token_cache_key, self.access_token, self.refresh_token)
+
+    def _exchange_tokens(self):
+        if self.refresh_token:
+            try:
+                self.refresh_token_exchange()
+                return
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 401:
+                    raise
+                sh.debug('refresh token rejected; exchanging the access keys again')
+        self.init_token_exchange()
+
+    def _use_cached_tokens(self) -> bool:
+        # adopt tokens from the cache, unless they are the ones being replaced;
+        # a stale access token still leaves its refresh token to start with
+        cached = self.token_cache.get(*self._token_cache_key)
+        if cached is None or cached['access_token'] == self.access_token:
+            return False
+        expiry = token_expiry(cached['access_token'])
+        if expiry is not None and expiry - time.time() <= TOKEN_EXPIRY_MARGIN:
+            if self.refresh_token is None and cached.get('refresh_token'):
+                self.refresh_token = cached['refresh_token']
+                self.refresh_session.auth = RefreshAuth(self.refresh_token)
+            return False
+        sh.debug('using cached tokens')
+        self._set_tokens(cached)
+        return True
+
+    def _fresh_auth(self) -> BearerAuth:
+        # the bearer auth to send a request with, refreshed ahead of its expiry
+        self.authenticate()
+        auth = self.bearer_session.auth
+        refresh_at, stale_at = self._token_refresh_at, self._token_stale_at
+        if refresh_at is not None and stale_at is not None:
+            now = time.monotonic()
+            if now >= stale_at:
+                # every caller waits for the one exchange
+                self.exchange_tokens(stale_token=auth.access_token)
+                auth = self.bearer_session.auth
+            elif now >= refresh_at:
+                self._refresh_in_background(auth.access_token)
+        return auth
+
+    def _refresh_in_background(self, token):
+        with self._token_lock:
+            if self._refreshing or self.access_token != token:
+                return
+            self._refreshing = True
+        # callers go on with the current token, valid for a while still
+        threading.Thread(target=_background_refresh, args=(weakref.ref(self), token),
+                         name='ascend-token-refresh', daemon=True).start()
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """
+        Bound the time of every call made through this Session, from any
+        thread, while in the block, so that a whole crawl or `apply` gives up
+        after `seconds` rather than retrying past it.
+
+        ```python
+        with session.deadline(600):
+            rs.apply(...)
+        ```
+        """
+        end = time.monotonic() + seconds
+        with self._deadlines_lock:
+            self._deadlines.append(end)
+        try:
+            yield
+        finally:
+            with self._deadlines_lock:
+                self._deadlines.remove(end)
+
+    @contextlib.contextmanager
+    def uncached(self):
+        """
+        Send every GET made through this Session, from any thread, while in
+        the block to the server rather than serving it from `cache`, so that
+        decisions such as what `apply` creates or leaves unchanged are made on
+        current state. The responses still refresh the cache.
+        """
+        with self._uncached_lock:
+            self._uncached += 1
+        try:
+            yield
+        finally:
+            with self._uncached_lock:
+                self._uncached -= 1
+
+    def _deadline(self, start):
+        deadlines = list(self._deadlines)
+        if self.retry.deadline is not None:
+            deadlines.append(start + self.retry.deadline)
+        return min(deadlines) if deadlines else None
+
+    def pool_stats(self) -> dict:
+        """
+        Counters of the use of the connection pool, to tell whether it is
+        large enough for the concurrency in use: requests which found every
+        connection in use are `saturated`, and the connections they opened
+        are `discarded` afterwards.
+
+        # Returns
+        dict: the counters, as described by `ascend.pool.PoolStats`
+        """
+        return self.pool.stats.to_dict()
 
-    def request_with_bearer(self, *args, **kwargs):
-        sh.debug(" ".join(args))
-        response = self.bearer_session.request(*args, **kwargs)
+    def send(self, http, method, url, idempotent=None, deadline=None, **kwargs):
+        """
+        Send a request with `http`, a `requests.Session`, retrying it as the
+        Session's `RetryPolicy` allows.
+
+        # Parameters
+        http (requests.Session): the session sending the request
+        method (str): the HTTP method
+        url (str): the URL
+        idempotent (bool):
+            whether the request may be sent again safely
+            (default is to go by the method)
+        deadline (float):
+            `time.monotonic()` by which the call must complete
+            (default is the Session's and the policy's deadlines)
+
+        # Returns
+        requests.Response: the last response
+
+        # Raises
+        DeadlineExceeded: if the deadline passes before a request can be sent
+        requests.RequestException: the last error, once retries run out
+        """
+        policy = self.retry
+        if idempotent is None:
+            idempotent = policy.idempotent(method)
+        if deadline is None:
+            deadline = self._deadline(time.monotonic())
+        timeout = kwargs.pop('timeout', policy.timeout if policy.timeout is not None
+                             else self.timeout)
+        prewarm = self._prewarm
+        if prewarm is not None:
+            # rather than open a second connection while the first is opening;
+            # past its connect timeout or the deadline, open one regardless
+            ends = [t for t in (self._prewarm_until, deadline) if t is not None]
+            prewarm.join(max(0.0, min(ends) - time.monotonic()) if ends else None)
+            self._prewarm = None
+        attempt = 0
+        while True:
+            try:
+                response = http.request(method, url, timeout=_remaining(timeout, deadline),
+                                        **kwargs)
+            except RETRY_ERRORS as e:
+                if isinstance(e, DeadlineExceeded) or not (idempotent or _not_sent(e)):
+                    raise
+                wait = policy.wait(attempt)
+                if not _retry(policy, attempt, wait, deadline):
+                    raise
+                sh.debug(f'retrying {method} {url} in {wait:.2f}s after {e!r}')
+            else:
+                if response.status_code not in policy.statuses or \
+                        not (idempotent or response.status_code == 429):
+                    return response
+                wait = policy.wait(attempt, response)
+                if not _retry(policy, attempt, wait, deadline):
+                    return response
+                sh.debug(f'retrying {method} {url} in {wait:.2f}s after {response.status_code}')
+                response.close()
+            time.sleep(wait)
+            attempt += 1
+
+    def request_with_bearer(self, method, url, idempotent=None, **kwargs):
+        sh.debug(f'{method} {url}')
+        deadline = self._deadline(time.monotonic())
+        auth = self._fresh_auth()
+        response = self.send(self.bearer_session, method, url, idempotent, deadline, auth=auth,
+                             **kwargs)
         if response.status_code == 401:
-            self.exchange_tokens()
-            return self.bearer_session.request(*args, **kwargs)
+            response.close()
+            # a token revoked early, or with no readable expiry
+            self.exchange_tokens(stale_token=auth.access_token)
+            return self.send(self.bearer_session, method, url, idempotent, deadline,
+                             auth=self.bearer_session.auth, **kwargs)
         return response
 
     def delete(self, endpoint, service='api'):
@@ -95,11 +533,15 @@ class Session:
         int: the HTTP response code status
         """
         def delete_with_bearer():
-            resp = self.bearer_session.delete(self.make_url(endpoint, service), verify=self.verify)
+            resp = self.request_with_bearer('DELETE', self.make_url(endpoint, service),
+                                            verify=self.verify)
             resp.raise_for_status()
             return resp.status_code
 
-        return delete_with_bearer()
+        try:
+            return delete_with_bearer()
+        finally:
+            self.invalidate(endpoint, service)
 
     def get(self, endpoint, query=None, service='api'):
         """
@@ -123,9 +565,15 @@ class Session:
                 resp.raise_for_status()
                 return resp.json()
 
-        return get_with_bearer()
+        if self.cache is None:
+            return get_with_bearer()
+        data = self.cache.get(service, endpoint, query) if not self._uncached else None
+        if data is None:
+            data = get_with_bearer()
+            self.cache.put(service, endpoint, query, data)
+        return data
 
-    def patch(self, endpoint, data=None, service='api'):
+    def patch(self, endpoint, data=None, service='api', return_json=False):
         """
         Make a PATCH request.
 
@@ -134,20 +582,29 @@ class Session:
             the partial URL of the request (does not include hostname or API prefix)
         data (dict):
             JSON to send in the request body
+        return_json (bool):
+            return the parsed JSON response instead of the status code
+            (default is `False`)
 
         # Returns
-        int: the HTTP response status code
+        int: the HTTP response status code, or
+        dict: the parsed JSON response (empty if there is no body), with `return_json`
         """
         def patch_with_bearer():
             resp = self.request_with_bearer(
                 'PATCH', self.make_url(endpoint, service),
                 data=json.dumps(data), verify=self.verify)
             resp.raise_for_status()
+            if return_json:
+                return resp.json() if resp.content else {}
             return resp.status_code
 
-        return patch_with_bearer()
+        try:
+            return patch_with_bearer()
+        finally:
+            self.invalidate(endpoint, service)
 
-    def post(self, endpoint, data=None, service='api'):
+    def post(self, endpoint, data=None, service='api', idempotent=False):
         """
         Make a POST request.
 
@@ -156,22 +613,38 @@ class Session:
             the partial URL of the request (does not include hostname or API prefix)
         data (dict):
             JSON to send in the request body
+        idempotent (bool):
+            whether sending the request twice has the same effect as once, so
+            that it may be retried after any transient failure
+            (default is `False`)
 
         # Returns
-        int: the HTTP response status code
+        dict: the parsed JSON response
         """
         def post_with_bearer():
             resp = self.request_with_bearer(
-                'POST', self.make_url(endpoint, service), data=json.dumps(data), verify=self.verify)
+                'POST', self.make_url(endpoint, service), idempotent=idempotent,
+                data=json.dumps(data), verify=self.verify)
             resp.raise_for_status()
             return resp.json()
 
-        return post_with_bearer()
+        try:
+            return post_with_bearer()
+        finally:
+            self.invalidate(endpoint, service)
+
+    def invalidate(self, endpoint, service='api'):
+        """
+        Drop cached responses which a write to `endpoint` may have changed.
+        A no-op when the Session has no cache.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(service, endpoint)
 
     def make_url(self, endpoint, service):
         return f'{self.base_uri}{service}/v1/{endpoint}'
 
-    def stream(self, endpoint, query=None, service='api'):
+    def stream(self, endpoint, query=None, service='api', transform=None):
         """
         Make a GET request and process the results as a stream of JSON lines
 
@@ -180,6 +653,9 @@ class Session:
             the partial URL of the request (does not include hostname or API prefix)
         query (dict):
             query parameters to send with the request
+        transform (callable):
+            if given, called with each list of lines decoded together, to return
+            those to yield instead (see `ascend.ndjson.decode_chunks`)
 
         # Returns
         Iterator<dict>: an iterator over the parsed JSON lines
@@ -189,7 +665,70 @@ class Session:
             with self.request_with_bearer(
                     'GET', self.make_url(endpoint, service), params=query, verify=self.verify, stream=True) as resp:
                 resp.raise_for_status()
-                for row in resp.iter_lines():
-                    yield json.loads(row)
+                yield from ndjson.decode_chunks(resp.iter_content(ndjson.DEFAULT_CHUNK_SIZE),
+                                                transform=transform)
 
         return stream_with_bearer()
+
+
+def _background_refresh(session_ref, token):
+    # holds the session weakly, so an abandoned session is not kept alive
+    session = session_ref()
+    if session is None:
+        return
+    try:
+        session.exchange_tokens(stale_token=token)
+    except Exception as e:
+        sh.debug(f'background token refresh failed: {e!r}')
+        # try again later; callers refresh themselves near the expiry
+        session._token_refresh_at = time.monotonic() + TOKEN_REFRESH_RETRY
+    finally:
+        session._refreshing = False
+
+
+def _prewarm(http, url, verify, timeout):
+    # open a connection to the host of `url`, within `timeout` seconds, and
+    # leave it in the pool of `http` which a request to `url` would use, for
+    # that request to reuse
+    try:
+        settings = http.merge_environment_settings(url, {}, None, verify, None)
+        adapter = http.get_adapter(url)
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            pool = adapter.get_connection_with_tls_context(
+                requests.Request('POST', url).prepare(), settings['verify'],
+                settings['proxies'], settings['cert'])
+        else:
+            pool = adapter.get_connection(url, settings['proxies'])
+        connection = pool._get_conn()
+        try:
+            # the TLS handshake included
+            connection.timeout = timeout
+            connection.connect()
+        except BaseException:
+            connection.close()
+            raise
+        finally:
+            pool._put_conn(connection)
+    except Exception as e:
+        # the first request connects itself
+        sh.debug(f'unable to open a connection to {url}: {e!r}')
+
+
+def _remaining(timeout, deadline):
+    # the attempt's timeout, cut short by the deadline
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Deadline passed before the request could be sent")
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+def _retry(policy, attempt, wait, deadline):
+    if attempt >= policy.retries or wait is None:
+        return False
+    return deadline is None or time.monotonic() + wait < deadline
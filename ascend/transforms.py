@@ -179,6 +179,10 @@ class Creds(Transform):
     def set_creds(self, rd, creds):
         raise NotImplementedError(self)
 
+    # whether the container refers to credentials, which to_api fills in
+    def has_credentials(self) -> bool:
+        return self.rd[self.k].get('credentialId') is not None
+
     def to_api(self, *args, **kwargs):
         creds = kwargs['creds']
         self.set_creds(self.rd[self.k], creds)
@@ -259,6 +263,9 @@ class RedshiftCreds(BasicCreds):
 
 
 class FunctionCreds(Creds):
+    def has_credentials(self):
+        return self.rd[self.k].get('credentialsConfiguration') is not None
+
     def snippet(self):
         result = {}
         config = self.rd[self.k].get('credentialsConfiguration')
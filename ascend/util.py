@@ -4,6 +4,8 @@ Ascend Util module
 Some frequently-used Helper functions
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import hashlib
 import hmac
 
@@ -51,3 +53,15 @@ def compose(f, g):
 
 def coalesce(*l):
     return next(filter(lambda e: e is not None, l), None)
+
+
+def parallel_map(fn, items, jobs=1):
+    """
+    Like `map`, but runs `fn` on up to `jobs` threads.
+    Results are returned as a list, in the order of `items`.
+    """
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return list(map(fn, items))
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        return list(pool.map(fn, items))
@@ -0,0 +1,46 @@
+"""
+Run the SDK benchmarks and write the results as JSON.
+
+    python -m benchmarks [NAME ...] [--quick] [--sizes 100,10000] [--jobs N] [--output FILE]
+
+NAME selects benchmarks by prefix, e.g. `e2e` or `definitions.do_dump`.
+"""
+
+from benchmarks import harness
+
+import argparse
+import dataclasses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Run the SDK benchmarks')
+    parser.add_argument('names', nargs='*', help='only run benchmarks starting with these names')
+    parser.add_argument('--quick', action='store_true',
+                        help='use small inputs, to check that the benchmarks run')
+    parser.add_argument('--sizes', default=None,
+                        help='comma separated component counts for environment benchmarks')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='concurrent API requests used by ResourceSession')
+    parser.add_argument('--output', '-o', default='benchmark-results.json',
+                        help='file to write the results to')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in sorted(harness.load_all()):
+            print(name)
+        return
+
+    scale = harness.QUICK if args.quick else harness.FULL
+    scale = dataclasses.replace(scale, jobs=args.jobs)
+    if args.sizes:
+        scale = dataclasses.replace(scale, sizes=[int(s) for s in args.sizes.split(',')])
+    results = harness.run(args.names, scale,
+                          report=lambda r: print(harness.format_result(r), flush=True))
+    harness.write_results(args.output, results, scale)
+    print(f'wrote {len(results)} results to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
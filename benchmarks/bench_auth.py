@@ -0,0 +1,98 @@
+"""
+Benchmark SigV4 request signing, concurrent requests across the expiry
+of access tokens, recording the token exchanges and the requests refused
+with 401 and sent again, and the start of a session, as on each CLI
+invocation: constructing a Client alone, and making a first request with
+and without the token cache.
+"""
+
+from ascend.auth import AwsV4Auth
+from ascend.cache import TokenCache
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from benchmarks.harness import benchmark, measure
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import tempfile
+import time
+
+# seconds an access token lives, in `auth.expiry`
+TOKEN_TTL = 2.0
+# seconds the fake API takes to answer, in `auth.startup`
+STARTUP_LATENCY = 0.05
+
+
+@benchmark('auth.sign')
+def bench_sign(scale):
+    count = scale.pick(200, 20000)
+    auth = AwsV4Auth('ACCESSKEYID', 'secret-access-key', 'bench.ascend.io', 'POST')
+    request = requests.Request(
+        'POST', 'https://bench.ascend.io:443/authn/tokenExchange?b=2&a=1').prepare()
+
+    def sign():
+        for _ in range(count):
+            auth.add_request_auth_headers(request)
+
+    return [measure('auth.sign', sign, items=count, repeat=scale.pick(2, 5))]
+
+
+@benchmark('auth.expiry')
+def bench_expiry(scale):
+    threads = 16
+    seconds = scale.pick(2.5, 10.0)
+    with FakeAscendServer(FakeEnvironment.synthetic(), token_ttl=TOKEN_TTL) as server:
+        session = server.session()
+        counts = []
+
+        def work():
+            end = time.monotonic() + seconds
+            count = 0
+            while time.monotonic() < end:
+                session.get('organizations')
+                count += 1
+            return count
+
+        def run():
+            server.reset_stats()
+            with ThreadPoolExecutor(threads) as pool:
+                counts.append(sum(pool.map(lambda _: work(), range(threads))))
+
+        result = measure('auth.expiry', run, repeat=1,
+                         params={'threads': threads, 'token_ttl': TOKEN_TTL})
+        calls = counts[-1]
+        result['items'] = calls
+        result['latency'] = result['seconds']['median'] / calls
+        result['throughput'] = calls / result['seconds']['median']
+        result['token_exchanges'] = server.token_exchanges
+        result['replays'] = server.requests[('GET', '/api/v1/organizations')] - calls
+        return [result]
+
+
+@benchmark('auth.startup')
+def bench_startup(scale):
+    count = scale.pick(5, 50)
+    results = []
+    with FakeAscendServer(FakeEnvironment.synthetic(), latency=STARTUP_LATENCY) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        # constructing a Client makes no request until the API is called
+        server.reset_stats()
+        result = measure('auth.construct', lambda: [server.client() for _ in range(count)],
+                         items=count, repeat=1, params={'latency': STARTUP_LATENCY})
+        result['token_exchanges'] = server.token_exchanges
+        results.append(result)
+        for cached in (False, True):
+            token_cache = TokenCache(directory) if cached else None
+            if cached:
+                # the first invocation fills the cache
+                server.session(token_cache=token_cache)
+
+            def start():
+                for _ in range(count):
+                    server.session(token_cache=token_cache).get('organizations')
+
+            server.reset_stats()
+            result = measure('auth.startup', start, items=count, repeat=1,
+                             params={'token_cache': cached, 'latency': STARTUP_LATENCY})
+            result['token_exchanges'] = server.token_exchanges
+            results.append(result)
+    return results
@@ -0,0 +1,124 @@
+"""
+Benchmark building, dumping and loading resource definitions:
+
+- `ResourceDefinition` construction from protos, and `Transforms.from_rd`
+- `do_dump` YAML emission
+- Jinja rendering in `ResourceSession.load_defs_recur`
+- `construct_immediate_container`
+"""
+
+from ascend import jinja
+from ascend.cli import global_values
+from ascend.protos.resource import resource_pb2
+from ascend.resource_definitions import ResourceDefinition, ResourceSession
+from ascend.transforms import Transforms
+from benchmarks.harness import benchmark, measure
+from google.protobuf.json_format import MessageToDict, ParseDict
+from types import SimpleNamespace
+
+import os
+import tempfile
+
+DATA_SERVICE_ID = 'ds'
+DATAFLOW_ID = 'df'
+
+
+def component_id(i):
+    return 'read_0' if i == 0 else f'transform_{i}'
+
+
+def component_proto(i) -> resource_pb2.Resource:
+    if i == 0:
+        component = {'readConnector': {
+            'container': {'s3': {'bucket': 'bench', 'prefix': 'input/'}},
+            'records': {'schema': {'field': [
+                {'name': 'id', 'schema': {'long': {}}},
+                {'name': 'name', 'schema': {'string': {}}},
+            ]}},
+        }}
+    else:
+        component = {'transform': {
+            'inputIds': [component_id(i // 2)],
+            'operator': {'sqlQuery': {'sql': f'SELECT * FROM {{{{input}}}} WHERE id > {i}'}},
+        }}
+    proto = resource_pb2.Resource()
+    ParseDict({'version': global_values.API_VERSION, 'id': component_id(i),
+               'name': component_id(i), 'component': component}, proto)
+    return proto
+
+
+def make_defs(protos):
+    return [
+        ResourceDefinition.from_resource_proto(proto, (DATA_SERVICE_ID, DATAFLOW_ID, proto.id))
+        for proto in protos
+    ]
+
+
+def dump_defs(defs, directory):
+    for res_def in defs:
+        res_def.do_dump(os.path.join(directory, f'{res_def.resource_id}.yaml'), True)
+
+
+@benchmark('definitions.construct')
+def bench_construct(scale):
+    count = scale.pick(100, 10000)
+    protos = [component_proto(i) for i in range(count)]
+    return [measure('definitions.construct', lambda: make_defs(protos), items=count,
+                    repeat=scale.pick(2, 5))]
+
+
+@benchmark('definitions.transforms_from_rd')
+def bench_transforms_from_rd(scale):
+    count = scale.pick(100, 10000)
+    rds = [MessageToDict(component_proto(i)) for i in range(count)]
+
+    def from_rd():
+        for rd in rds:
+            Transforms.from_rd(rd)
+
+    return [measure('definitions.transforms_from_rd', from_rd, items=count,
+                    repeat=scale.pick(2, 5))]
+
+
+@benchmark('definitions.do_dump')
+def bench_do_dump(scale):
+    count = scale.pick(100, 10000)
+    protos = [component_proto(i) for i in range(count)]
+    with tempfile.TemporaryDirectory() as directory:
+        # dumping rewrites a definition in place, so each run needs fresh ones
+        return [measure('definitions.do_dump', lambda defs: dump_defs(defs, directory),
+                        items=count, repeat=scale.pick(2, 5), setup=lambda: make_defs(protos))]
+
+
+@benchmark('definitions.jinja_load')
+def bench_jinja_load(scale):
+    count = scale.pick(100, 10000)
+    with tempfile.TemporaryDirectory() as directory:
+        dump_defs(make_defs([component_proto(i) for i in range(count)]), directory)
+        paths = [os.path.join(directory, f'{component_id(i)}.yaml') for i in range(count)]
+        options = SimpleNamespace(config={}, recursive=False)
+
+        def load():
+            rs = ResourceSession(None, None)
+            rs.path_to_def = {}
+            for i, path in enumerate(paths):
+                rs.load_defs_recur(path, path, (DATA_SERVICE_ID, DATAFLOW_ID, component_id(i)),
+                                   options)
+
+        return [measure('definitions.jinja_load', load, items=count, repeat=scale.pick(2, 5))]
+
+
+@benchmark('jinja.immediate_container')
+def bench_immediate_container(scale):
+    file_count = scale.pick(4, 100)
+    file_size = scale.pick(1024, 64 * 1024)
+    with tempfile.TemporaryDirectory() as directory:
+        files = []
+        for i in range(file_count):
+            files.append(f'part_{i}.csv')
+            with open(os.path.join(directory, files[-1]), 'wb') as f:
+                f.write(os.urandom(file_size))
+        return [measure('jinja.immediate_container',
+                        lambda: jinja.construct_immediate_container(directory, files),
+                        items=file_count * file_size, repeat=scale.pick(2, 5),
+                        params={'files': file_count, 'file_bytes': file_size})]
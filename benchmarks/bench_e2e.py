@@ -0,0 +1,86 @@
+"""
+Benchmark the `list`, `get` and `apply` commands end to end, against the fake
+API serving synthetic environments of each size in `Scale.sizes`.
+
+`get` exports every data service as a directory, `apply` deploys that export
+to an empty environment, and `reapply` applies it again, when every resource
+is unchanged.
+"""
+
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from ascend.resource_definitions import ResourceSession
+from benchmarks.harness import benchmark, measure
+from types import SimpleNamespace
+
+import contextlib
+import math
+import os
+import tempfile
+
+COMPONENTS_PER_DATAFLOW = 100
+DATAFLOWS_PER_DATA_SERVICE = 100
+
+
+def environment_shape(size):
+    components = min(size, COMPONENTS_PER_DATAFLOW)
+    dataflows = math.ceil(size / components)
+    data_services = math.ceil(dataflows / DATAFLOWS_PER_DATA_SERVICE)
+    return data_services, math.ceil(dataflows / data_services), components
+
+
+@contextlib.contextmanager
+def quiet():
+    # every command reports each resource it touches
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+
+def resource_session(server, jobs):
+    client = server.client()
+    return ResourceSession(client, client.get_session(), jobs=jobs)
+
+
+def measure_command(name, server, fn, size, shape, jobs):
+    server.reset_stats()
+    with quiet():
+        result = measure(name, fn, items=size, repeat=1,
+                         setup=lambda: resource_session(server, jobs),
+                         params={'components': size, 'shape': 'x'.join(map(str, shape)),
+                                 'jobs': jobs})
+    result['requests'] = sum(server.requests.values())
+    return result
+
+
+@benchmark('e2e')
+def bench_e2e(scale):
+    results = []
+    for size in scale.sizes:
+        shape = environment_shape(size)
+        data_service_ids = [f'ds_{i}' for i in range(shape[0])]
+        env = FakeEnvironment.synthetic(*shape)
+        size = env.component_count()
+        with tempfile.TemporaryDirectory() as directory:
+            get_options = SimpleNamespace(recursive=True, directory=True,
+                                          output=directory + os.sep)
+
+            def get(rs):
+                for ds_id in data_service_ids:
+                    rs.get(ds_id, get_options)
+
+            def apply(rs):
+                for ds_id in data_service_ids:
+                    rs.apply(ds_id, {}, SimpleNamespace(
+                        input=os.path.join(directory, ds_id), recursive=True, config={},
+                        delete=False, dry_run=False, plan=False, force=False))
+
+            with FakeAscendServer(env) as server:
+                results.append(measure_command('e2e.list', server, lambda rs: rs.list('.', True),
+                                               size, shape, scale.jobs))
+                results.append(measure_command('e2e.get', server, get, size, shape, scale.jobs))
+            with FakeAscendServer(FakeEnvironment()) as server:
+                results.append(measure_command('e2e.apply', server, apply, size, shape,
+                                               scale.jobs))
+                results.append(measure_command('e2e.reapply', server, apply, size, shape,
+                                               scale.jobs))
+    return results
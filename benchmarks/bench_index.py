@@ -0,0 +1,100 @@
+"""
+Benchmark walking a synthetic environment of 50k components with the
+hierarchical `ResourceIndex`, against the linear scans it replaced.
+
+    python -m benchmarks.bench_index [--data-services N] [--dataflows N] [--components N]
+"""
+
+import argparse
+import time
+
+import ascend.model as model
+from ascend.resource_definitions import ROOT_PATH, ResourcePath, ResourceSession
+from benchmarks.harness import benchmark, measure
+
+# resources are built from their json definitions and never touch the session
+OFFLINE_SESSION = object()
+
+
+def build_session(data_services, dataflows, components) -> ResourceSession:
+    rs = ResourceSession(client=None, session=OFFLINE_SESSION)
+    rs.list_only = True
+    rs.loaded.add(ROOT_PATH)
+    for i in range(data_services):
+        ds_id = f'ds_{i}'
+        ds = model.DataService(ds_id, {'uuid': f'{ds_id}-uuid'}, OFFLINE_SESSION)
+        rs.register(ds)
+        rs.loaded.add(ds.get_api_path())
+        for j in range(dataflows):
+            df_id = f'df_{j}'
+            df = model.Dataflow(ds_id, df_id, {'uuid': f'{ds_id}.{df_id}-uuid', 'name': df_id},
+                                OFFLINE_SESSION)
+            rs.register(df)
+            rs.loaded.add(df.get_api_path())
+            for k in range(components):
+                comp_id = f'comp_{k}'
+                rs.register(model.Transform(ds_id, df_id, comp_id,
+                                            {'uuid': f'{ds_id}.{df_id}.{comp_id}-uuid'},
+                                            OFFLINE_SESSION))
+    return rs
+
+
+def walk_indexed(rs: ResourceSession):
+    count = 0
+    for ds_path in ResourcePath(rd_path=ROOT_PATH).children(rs):
+        for df_path in ds_path.children(rs):
+            count += len(df_path.children(rs))
+    return count
+
+
+def walk_linear(rs: ResourceSession):
+    # the children lookups as they were before the index: a scan over every
+    # known path at each level of the walk
+    paths = list(rs.path_to_uuid.keys())
+    count = 0
+    for ds_path in [p for p in paths if p[0] is not None and p[1] is None and p[2] is None]:
+        for df_path in [p for p in paths if p[0] == ds_path[0] and p[1] is not None and p[2] is None]:
+            count += len([p for p in paths
+                          if p[0] == df_path[0] and p[1] == df_path[1] and p[2] is not None])
+    return count
+
+
+@benchmark('index.walk')
+def bench_walk(scale):
+    shape = scale.pick((2, 5, 10), (10, 50, 100))
+    rs = build_session(*shape)
+    count = walk_indexed(rs)
+    params = {'components': count, 'shape': 'x'.join(map(str, shape))}
+    return [
+        measure('index.walk', lambda: walk_indexed(rs), items=count, repeat=scale.pick(1, 3),
+                params=params),
+        measure('index.walk_linear', lambda: walk_linear(rs), items=count,
+                repeat=scale.pick(1, 3), params=params),
+    ]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--data-services', type=int, default=10)
+    parser.add_argument('--dataflows', type=int, default=50)
+    parser.add_argument('--components', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    rs, build_s = timed(build_session, args.data_services, args.dataflows, args.components)
+    indexed, indexed_s = timed(walk_indexed, rs)
+    linear, linear_s = timed(walk_linear, rs)
+    assert indexed == linear, (indexed, linear)
+    print(f'{indexed} components in {args.data_services * args.dataflows} dataflows '
+          f'(built in {build_s:.2f}s)')
+    print(f'indexed walk: {indexed_s:.3f}s')
+    print(f'linear walk:  {linear_s:.3f}s ({linear_s / indexed_s:.0f}x slower)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+Benchmark building a `LineageGraph` for every component of a dataflow served
+by the fake API.
+"""
+
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from ascend.lineage import LineageGraph
+from ascend.model import Dataflow
+from benchmarks.harness import benchmark, measure
+
+
+@benchmark('lineage.graph')
+def bench_lineage(scale):
+    count = scale.pick(20, 500)
+    env = FakeEnvironment.synthetic(components=count)
+    with FakeAscendServer(env) as server:
+        session = server.session()
+        components = Dataflow('ds_0', 'df_0', session=session).list_components()
+
+        def build():
+            graph = LineageGraph(session)
+            for component in components:
+                graph.predecessors(component)
+
+        return [measure('lineage.graph', build, items=count, repeat=scale.pick(1, 3),
+                        params={'components': count})]
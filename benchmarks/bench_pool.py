@@ -0,0 +1,34 @@
+"""
+Benchmark concurrent requests through connection pools smaller than, and as
+large as, the number of threads, recording how often each was saturated and
+how many connections were opened.
+"""
+
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from benchmarks.harness import benchmark, measure
+from concurrent.futures import ThreadPoolExecutor
+
+# seconds the fake API takes to answer
+LATENCY = 0.01
+
+
+@benchmark('pool.saturation')
+def bench_saturation(scale):
+    threads = 32
+    calls = scale.pick(200, 5000)
+    results = []
+    with FakeAscendServer(FakeEnvironment.synthetic(), latency=LATENCY) as server:
+        for pool_size in (10, threads):
+            session = server.session(pool_size=pool_size)
+            session.authenticate()
+
+            def run():
+                with ThreadPoolExecutor(threads) as pool:
+                    list(pool.map(lambda _: session.get('organizations'), range(calls)))
+
+            result = measure('pool.saturation', run, items=calls, repeat=1,
+                             params={'threads': threads, 'pool_size': pool_size,
+                                     'latency': LATENCY})
+            result.update(session.pool_stats())
+            results.append(result)
+    return results
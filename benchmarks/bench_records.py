@@ -0,0 +1,207 @@
+"""
+Benchmark reading the records of a component served by the fake API, as
+dicts with `get_records`, and as columnar batches with `get_record_batches`,
+decoded into NumPy arrays or, when it is installed, a pyarrow Table.
+
+`records.select` reads 5 of the 80 columns of a wide component, and keeps a
+tenth of its records, with and without `columns` and `where`.
+
+`records.prefetch` reads records for a consumer which spends time waiting
+on I/O, such as writes to a database, with and without prefetching.
+
+`records.profile` profiles every column of a component in one pass, after
+reading it as dicts for comparison.
+
+`records.diff` compares two components of which a tenth of the records
+differ, comparing partitions in this process and on every CPU.
+
+`records.fan_in` reads several data feeds from a server with some latency,
+one after the other with `get_records`, and concurrently with
+`Client.read_data_feeds`.
+"""
+
+from ascend.fake_api import (EncodedRecords, FakeAscendServer, FakeEnvironment, ListRecords,
+                             SyntheticRecords)
+from benchmarks.harness import benchmark, measure
+
+import asyncio
+import importlib.util
+import os
+import time
+
+WIDE_COLUMNS = 80
+SELECTED_COLUMNS = ['col_0', 'col_1', 'col_2', 'col_3', 'col_4']
+
+# seconds the fake API waits before answering each request
+FAN_IN_LATENCY = 0.05
+
+# a consumer waits this many seconds after every `IO_BATCH` records
+IO_WAIT = 0.002
+IO_BATCH = 1000
+
+
+def _installed(module) -> bool:
+    # only optional dependencies which are installed are benchmarked
+    return importlib.util.find_spec(module) is not None
+
+
+@benchmark('records.batches')
+def bench_record_batches(scale):
+    count = scale.pick(5000, 1000000)
+    env = FakeEnvironment.synthetic(components=1)
+    comp = env.components[('ds_0', 'df_0')]['read_0']
+    env.set_records(comp['uuid'], EncodedRecords(SyntheticRecords(count)))
+    repeat = scale.pick(1, 3)
+    params = {'records': count}
+    with FakeAscendServer(env) as server:
+        component = server.client().get_component('ds_0', 'df_0', 'read_0')
+        schema = component.get_schema()
+        results = [measure('records.rows', lambda: list(component.get_records()), items=count,
+                           repeat=repeat, params=params)]
+        if _installed('numpy'):
+            results.append(measure(
+                'records.batches.numpy',
+                lambda: list(component.get_record_batches(schema=schema, arrow=False)),
+                items=count, repeat=repeat, params=params))
+        try:
+            import pyarrow as pa
+            results.append(measure(
+                'records.batches.arrow',
+                lambda: pa.Table.from_batches(component.get_record_batches(schema=schema,
+                                                                           arrow=True)),
+                items=count, repeat=repeat, params=params))
+        except ImportError:
+            pass
+        return results
+
+
+@benchmark('records.prefetch')
+def bench_prefetch(scale):
+    count = scale.pick(5000, 500000)
+    env = FakeEnvironment.synthetic(components=1)
+    comp = env.components[('ds_0', 'df_0')]['read_0']
+    env.set_records(comp['uuid'], EncodedRecords(SyntheticRecords(count)))
+    with FakeAscendServer(env) as server:
+        component = server.client().get_component('ds_0', 'df_0', 'read_0')
+        results = []
+        for prefetch in (0, 20000):
+            def consume():
+                for i, _ in enumerate(component.get_records(prefetch=prefetch)):
+                    if i % IO_BATCH == 0:
+                        time.sleep(IO_WAIT)
+
+            results.append(measure('records.prefetch', consume, items=count,
+                                   repeat=scale.pick(1, 3),
+                                   params={'records': count, 'prefetch': prefetch}))
+        return results
+
+
+@benchmark('records.select')
+def bench_select(scale):
+    count = scale.pick(2000, 100000)
+    schema = [(f'col_{i}', 'double' if i % 2 else 'long') for i in range(WIDE_COLUMNS)]
+    env = FakeEnvironment.synthetic(components=1)
+    comp = env.components[('ds_0', 'df_0')]['read_0']
+    env.set_records(comp['uuid'], EncodedRecords(SyntheticRecords(count, schema)))
+    with FakeAscendServer(env) as server:
+        component = server.client().get_component('ds_0', 'df_0', 'read_0')
+
+        def read_all():
+            rows = [row for row in component.get_records() if row['col_0'] % 10 == 0]
+            return [{c: row[c] for c in SELECTED_COLUMNS} for row in rows]
+
+        def read_selected():
+            return list(component.get_records(columns=SELECTED_COLUMNS,
+                                              where='col_0 % 10 == 0'))
+
+        params = {'records': count, 'columns': f'{len(SELECTED_COLUMNS)}/{WIDE_COLUMNS}'}
+        return [measure('records.select.all', read_all, items=count, repeat=scale.pick(1, 3),
+                        params=params),
+                measure('records.select', read_selected, items=count, repeat=scale.pick(1, 3),
+                        params=params)]
+
+
+@benchmark('records.fan_in')
+def bench_fan_in(scale):
+    if not _installed('aiohttp'):
+        return []
+    feeds, count = scale.pick((4, 2000), (16, 100000))
+    env = FakeEnvironment()
+    env.add_data_service('ds_0')
+    env.add_dataflow('ds_0', 'df_0')
+    spec = EncodedRecords(SyntheticRecords(count))
+    for i in range(feeds):
+        env.add_component('ds_0', 'df_0', 'pub', f'feed_{i}', {'inputUUID': f'feed_{i}'},
+                          records=spec)
+    repeat = scale.pick(1, 3)
+    params = {'feeds': feeds, 'records': count, 'latency': FAN_IN_LATENCY}
+    with FakeAscendServer(env, latency=FAN_IN_LATENCY) as server:
+        client = server.client()
+        data_feeds = client.list_data_feeds()
+
+        def sequential():
+            for feed in data_feeds:
+                for _ in feed.get_records():
+                    pass
+
+        async def merged():
+            async for _ in client.read_data_feeds(data_feeds):
+                pass
+
+        return [
+            measure('records.fan_in.sequential', sequential, items=feeds * count,
+                    repeat=repeat, params=params),
+            measure('records.fan_in.async', lambda: asyncio.run(merged()), items=feeds * count,
+                    repeat=repeat, params=params),
+        ]
+
+
+@benchmark('records.profile')
+def bench_profile(scale):
+    if not _installed('numpy'):
+        return []
+    count = scale.pick(5000, 1000000)
+    env = FakeEnvironment.synthetic(components=1)
+    comp = env.components[('ds_0', 'df_0')]['read_0']
+    env.set_records(comp['uuid'], EncodedRecords(SyntheticRecords(count)))
+    repeat = scale.pick(1, 3)
+    params = {'records': count}
+    with FakeAscendServer(env) as server:
+        component = server.client().get_component('ds_0', 'df_0', 'read_0')
+        schema = component.get_schema()
+
+        def read():
+            for _ in component.get_records():
+                pass
+
+        return [measure('records.profile.read', read, items=count, repeat=repeat,
+                        params=params),
+                measure('records.profile', lambda: component.profile(schema=schema),
+                        items=count, repeat=repeat, params=params)]
+
+
+@benchmark('records.diff')
+def bench_diff(scale):
+    from ascend import records
+
+    count = scale.pick(5000, 1000000)
+    env = FakeEnvironment.synthetic(components=2)
+    before, after = (c['uuid'] for c in env.components[('ds_0', 'df_0')].values())
+    env.set_records(before, EncodedRecords(SyntheticRecords(count)))
+    env.set_records(after, EncodedRecords(ListRecords(
+        [dict(row, value=-1.0) if row['id'] % 10 == 0 else row
+         for row in SyntheticRecords(count).rows(0, None)])))
+    repeat = scale.pick(1, 3)
+    with FakeAscendServer(env) as server:
+        client = server.client()
+        a = client.get_component('ds_0', 'df_0', 'read_0')
+        b = client.get_component('ds_0', 'df_0', 'transform_1')
+        results = []
+        for workers in sorted({1, os.cpu_count() or 1}):
+            def compare():
+                with records.diff(a, b, key=['id'], workers=workers):
+                    pass
+
+            results.append(measure('records.diff', compare, items=2 * count, repeat=repeat,
+                                   params={'records': count, 'workers': workers}))
+        return results
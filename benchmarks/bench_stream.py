@@ -0,0 +1,73 @@
+"""
+Benchmark decoding NDJSON records, in memory and through `Session.stream`
+from the fake API.
+
+The records are encoded up front, so the time is spent in the client. The
+`.lines` results decode one line per `json.loads` call, as `Session.stream`
+did before `ascend.ndjson`, for comparison.
+"""
+
+from ascend import ndjson
+from ascend.fake_api import EncodedRecords, FakeAscendServer, FakeEnvironment, SyntheticRecords
+from benchmarks.harness import benchmark, measure
+
+import json
+
+
+def backends():
+    yield 'json', json.loads
+    if ndjson.orjson is not None:
+        yield 'orjson', ndjson.orjson.loads
+
+
+@benchmark('ndjson.decode')
+def bench_decode(scale):
+    count = scale.pick(5000, 1000000)
+    data = EncodedRecords(SyntheticRecords(count)).data
+    chunks = [data[i:i + ndjson.DEFAULT_CHUNK_SIZE]
+              for i in range(0, len(data), ndjson.DEFAULT_CHUNK_SIZE)]
+    results = []
+    for backend, loads in backends():
+        params = {'records': count, 'backend': backend}
+
+        def lines():
+            n = sum(1 for line in data.splitlines() if loads(line) is not None)
+            assert n == count, n
+
+        def chunked():
+            n = sum(1 for _ in ndjson.decode_chunks(chunks, loads))
+            assert n == count, n
+
+        results.append(measure('ndjson.decode.lines', lines, items=count,
+                               repeat=scale.pick(1, 3), params=params))
+        results.append(measure('ndjson.decode', chunked, items=count,
+                               repeat=scale.pick(1, 3), params=params))
+    return results
+
+
+@benchmark('session.stream')
+def bench_stream(scale):
+    count = scale.pick(5000, 1000000)
+    env = FakeEnvironment.synthetic(components=1)
+    comp = env.components[('ds_0', 'df_0')]['read_0']
+    env.set_records(comp['uuid'], EncodedRecords(SyntheticRecords(count)))
+    endpoint = 'organizations/ds_0/projects/df_0/sources/read_0/records-stream'
+    with FakeAscendServer(env) as server:
+        session = server.session()
+
+        def stream_lines():
+            with session.request_with_bearer('GET', session.make_url(endpoint, 'api'),
+                                             stream=True) as resp:
+                resp.raise_for_status()
+                n = sum(1 for line in resp.iter_lines() if json.loads(line) is not None)
+            assert n == count, n
+
+        def stream():
+            n = sum(1 for _ in session.stream(endpoint))
+            assert n == count, n
+
+        params = {'records': count}
+        return [measure('session.stream.lines', stream_lines, items=count,
+                        repeat=scale.pick(1, 3), params=params),
+                measure('session.stream', stream, items=count, repeat=scale.pick(1, 3),
+                        params=dict(params, backend='orjson' if ndjson.orjson else 'json'))]
@@ -0,0 +1,166 @@
+"""
+Benchmark harness
+
+Benchmarks are functions registered with `@benchmark`. Each takes a `Scale`
+and returns a list of results made with `measure`. `run` executes them, and
+`write_results` stores the results as JSON together with enough about the
+environment to compare runs across SDK versions.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    'benchmarks.bench_auth',
+    'benchmarks.bench_pool',
+    'benchmarks.bench_stream',
+    'benchmarks.bench_records',
+    'benchmarks.bench_definitions',
+    'benchmarks.bench_lineage',
+    'benchmarks.bench_index',
+    'benchmarks.bench_e2e',
+]
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+@dataclass
+class Scale:
+    name: str
+    # small inputs and few repeats, to check benchmarks still run
+    quick: bool
+    # numbers of components in environment-sized benchmarks
+    sizes: List[int] = field(default_factory=list)
+    # concurrent requests used by ResourceSession
+    jobs: int = 1
+
+    def pick(self, quick, full):
+        return quick if self.quick else full
+
+
+QUICK = Scale('quick', quick=True, sizes=[20])
+FULL = Scale('full', quick=False, sizes=[100, 10000, 100000])
+
+
+def benchmark(name):
+    """
+    Register a benchmark function under `name`.
+    """
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def load_all():
+    for module in MODULES:
+        importlib.import_module(module)
+    return BENCHMARKS
+
+
+def measure(name, fn, items=1, repeat=5, setup=None, params=None) -> dict:
+    """
+    Time `fn` `repeat` times.
+
+    # Parameters
+    name (str): name of the result
+    fn (callable): the code to time, called with the value returned by `setup`, if given
+    items (int): how many items one call to `fn` processes
+    repeat (int): number of timed calls
+    setup (callable): untimed preparation before each call
+    params (dict): parameters to record with the result
+
+    # Returns
+    dict: the result, with `latency` in seconds per item and `throughput` in
+    items per second, both from the median call
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            arg = setup()
+            start = time.perf_counter()
+            fn(arg)
+        else:
+            start = time.perf_counter()
+            fn()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        'name': name,
+        'params': params or {},
+        'items': items,
+        'repeat': repeat,
+        'seconds': {
+            'min': min(times),
+            'median': median,
+            'mean': statistics.mean(times),
+            'max': max(times),
+        },
+        'latency': median / items if items else None,
+        'throughput': items / median if median > 0 else None,
+    }
+
+
+def run(names: Optional[List[str]] = None, scale: Scale = FULL, report=None) -> List[dict]:
+    """
+    Run the benchmarks whose names start with any of `names` (all if empty),
+    calling `report` with each result as it is produced.
+    """
+    results = []
+    for name, fn in sorted(load_all().items()):
+        if names and not any(name.startswith(n) for n in names):
+            continue
+        for result in fn(scale):
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def format_result(result) -> str:
+    params = ' '.join(f'{k}={v}' for k, v in result['params'].items())
+    throughput = result['throughput']
+    # neither is known for a measurement of no items
+    latency = f"{result['latency'] * 1e6:>12.2f}" if result['latency'] is not None else f"{'-':>12}"
+    throughput = f"{throughput:>14,.0f}" if throughput is not None else f"{'-':>14}"
+    return (f"{result['name']:<32} {params:<36} "
+            f"{result['seconds']['median']:>10.4f}s "
+            f"{latency}us/item {throughput} items/s")
+
+
+def metadata(scale: Scale) -> dict:
+    try:
+        from importlib.metadata import version
+        sdk_version = version('ascend-python-sdk')
+    except Exception:
+        sdk_version = 'unknown'
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        'sdk_version': sdk_version,
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'scale': scale.name,
+        'sizes': scale.sizes,
+        'jobs': scale.jobs,
+    }
+
+
+def write_results(path, results, scale: Scale):
+    with open(path, 'w') as f:
+        json.dump({'metadata': metadata(scale), 'results': results}, f, indent=2)
@@ -0,0 +1,33 @@
+"""
+Runs every benchmark under pytest, at the quick scale by default so the suite
+stays fast. Set `ASCEND_BENCHMARK_SCALE=full` for the real measurements and
+`ASCEND_BENCHMARK_OUTPUT` to a file to keep the results.
+"""
+
+import json
+import os
+import unittest
+
+from benchmarks import harness
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_benchmarks(self):
+        scale = harness.FULL if os.getenv('ASCEND_BENCHMARK_SCALE') == 'full' else harness.QUICK
+        results = []
+        for name, fn in sorted(harness.load_all().items()):
+            with self.subTest(benchmark=name):
+                for result in fn(scale):
+                    self.assertTrue(result['name'].startswith(name.split('.')[0]))
+                    self.assertGreater(result['seconds']['median'], 0)
+                    results.append(result)
+        # results must serialize, since they are tracked as JSON
+        json.dumps(results)
+        output = os.getenv('ASCEND_BENCHMARK_OUTPUT')
+        if output:
+            harness.write_results(output, results, scale)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,7 +8,7 @@ setup(
     author='Ascend R&D Team',
     author_email='andy@ascend.io',
     license='Apache License 2.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*', 'tests']),
     include_package_data=True,
     scripts=['bin/ascend'],
     install_requires=[
@@ -20,6 +20,12 @@ setup(
         'requests>=2.22.0',
         'urllib3',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.7'],
+        'numpy': ['numpy>=1.17'],
+        'arrow': ['pyarrow>=4.0'],
+        'orjson': ['orjson>=3.0'],
+    },
     python_requires='>=3.6',
     zip_safe=False,
 )
@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+
+try:
+    import aiohttp
+    from ascend.async_session import AsyncSession, _query_params
+except ImportError:
+    aiohttp = None
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestAsyncSession(unittest.TestCase):
+
+    def setUp(self):
+        self.env = FakeEnvironment.synthetic(data_services=2, dataflows=2, components=5,
+                                             records=25)
+        self.server = FakeAscendServer(self.env).start()
+        self.addCleanup(self.server.stop)
+
+    def session(self, **kwargs):
+        return AsyncSession(self.server.hostname, self.server.access_key, self.server.secret_key,
+                            base_uri=self.server.base_uri, **kwargs)
+
+    def run_with(self, fn, session=None):
+        async def run():
+            async with session or self.session() as s:
+                return await fn(s)
+        return asyncio.run(run())
+
+    def test_get(self):
+        async def get(session):
+            orgs = await session.get('organizations')
+            flows = await asyncio.gather(*[
+                session.get(f'organizations/ds_{i}/projects') for i in range(2)])
+            with self.assertRaises(KeyError):
+                await session.get('organizations/ds_9/projects/df_0')
+            return orgs, flows
+
+        orgs, flows = self.run_with(get)
+        self.assertEqual(len(orgs['data']), 2)
+        self.assertEqual([len(f['data']) for f in flows], [2, 2])
+        # concurrent first requests share the exchange
+        self.assertEqual(self.server.token_exchanges, 1)
+
+    def test_writes(self):
+        async def write(session):
+            await session.post('organizations/ds_0/projects', {'id': 'new_df', 'name': 'New'})
+            await session.patch('organizations/ds_0/projects/new_df',
+                                {'id': 'new_df', 'name': 'Renamed'})
+            renamed = await session.get('organizations/ds_0/projects/new_df')
+            await session.delete('organizations/ds_0/projects/new_df')
+            return renamed
+
+        self.assertEqual(self.run_with(write)['data']['name'], 'Renamed')
+        self.assertNotIn(('ds_0', 'new_df'), self.env.dataflows)
+
+    def test_expired_token(self):
+        async def get_twice(session):
+            await session.get('organizations')
+            self.server.expire_tokens()
+            return await session.get('organizations')
+
+        self.assertEqual(len(self.run_with(get_twice)['data']), 2)
+        self.assertEqual(self.server.token_exchanges, 2)
+
+    def test_from_session(self):
+        blocking = self.server.session(read_timeout=60)
+        blocking.authenticate()
+        session = AsyncSession.from_session(blocking)
+        self.assertEqual(session.timeout, blocking.timeout)
+        self.run_with(lambda s: s.get('organizations'), session)
+        self.assertEqual(self.server.token_exchanges, 1)
+
+    def test_from_session_refreshed(self):
+        blocking = self.server.session()
+        blocking.authenticate()
+        session = AsyncSession.from_session(blocking)
+        # the blocking session spends the refresh token both were given
+        self.server.expire_tokens()
+        blocking.get('organizations')
+
+        async def get(session):
+            return await session.get('organizations')
+
+        self.assertEqual(len(self.run_with(get, session)['data']), 2)
+        # the access keys exchanged again once the spent refresh token is rejected
+        self.assertEqual(self.server.token_exchanges, 3)
+
+    def test_stream(self):
+        component = self.server.client().get_component('ds_0', 'df_0', 'transform_1')
+        endpoint = component.resource_path + '/records-stream'
+
+        async def stream(session):
+            # a parameter without a value is left out, as the blocking session does
+            query = {'offset': 20, 'limit': None}
+            return [row async for row in session.stream(endpoint, query)]
+
+        self.assertEqual([r['id'] for r in self.run_with(stream)], list(range(20, 25)))
+
+    def test_timeouts(self):
+        async def timeout(session):
+            session._get_client()
+            return session._client.timeout
+
+        timeout = self.run_with(timeout, self.session(connect_timeout=5, read_timeout=0.2))
+        # no limit on whole requests, so long streams are not cut short
+        self.assertIsNone(timeout.total)
+        self.assertEqual((timeout.sock_connect, timeout.sock_read), (5, 0.2))
+
+        async def slow(session):
+            await session.get('organizations')
+            self.server.latency = 0.5
+            await session.get('organizations')
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_with(slow, self.session(read_timeout=0.2))
+
+    def test_query_params(self):
+        self.assertIsNone(_query_params({}))
+        self.assertEqual(_query_params({'offset': 0, 'limit': None, 'deep': True}),
+                         {'offset': '0', 'deep': 'True'})
+
+
+if __name__ == '__main__':
+    unittest.main()
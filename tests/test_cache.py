@@ -0,0 +1,234 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from ascend.cache import RecordCache, SnapshotCache, TokenCache
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from ascend.model import Dataflow
+
+
+class TestSnapshotCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = SnapshotCache('trial.ascend.io', ttl=60, cache_dir=self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        self.cache.put('api', 'organizations/ds/projects/df/components?deep=true', None, {'data': [1]})
+        self.assertEqual(self.cache.get('api', 'organizations/ds/projects/df/components?deep=true'),
+                         {'data': [1]})
+        # the query may be part of the endpoint or passed separately
+        self.assertEqual(self.cache.get('api', 'organizations/ds/projects/df/components',
+                                        {'deep': 'true'}), {'data': [1]})
+        self.assertIsNone(self.cache.get('api', 'organizations/ds/projects/df/components'))
+        self.assertIsNone(self.cache.get('authz', 'organizations/ds/projects/df/components?deep=true'))
+
+    def test_expiry(self):
+        self.cache.put('api', 'organizations', None, {'data': []})
+        path = self.cache._file('api', 'organizations', None)
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        self.assertIsNone(self.cache.get('api', 'organizations'))
+
+    def test_invalidate(self):
+        entries = [
+            ('api', 'organizations'),
+            ('api', 'organizations/ds'),
+            ('api', 'organizations/ds/projects'),
+            ('api', 'organizations/ds/projects/df/components?deep=true'),
+            ('api', 'organizations/ds/projects/df/groups'),
+            ('api', 'organizations/ds/projects/other/groups'),
+            ('api', 'organizations/other/projects'),
+            ('api', 'data-feeds'),
+            ('authz', 'org_roles'),
+        ]
+        for service, endpoint in entries:
+            self.cache.put(service, endpoint, None, {'data': endpoint})
+        self.cache.invalidate('api', 'organizations/ds/projects/df/views/comp')
+        remaining = [
+            endpoint for service, endpoint in entries
+            if self.cache.get(service, endpoint) is not None
+        ]
+        self.assertEqual(remaining, ['organizations/ds/projects/other/groups',
+                                     'organizations/other/projects'])
+
+
+class TestRecordCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env = FakeEnvironment.synthetic(components=2, records=500)
+        cls.server = FakeAscendServer(cls.env).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = RecordCache('fake.ascend.io', 10 * 1024 * 1024, cache_dir=self.dir)
+        self.session = self.server.session(record_cache=self.cache)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def component(self, component_id='read_0'):
+        return Dataflow('ds_0', 'df_0', session=self.session).get_component(component_id)
+
+    def stream_requests(self):
+        return sum(n for (_, path), n in self.server.requests.items()
+                   if path.endswith('/records-stream'))
+
+    def test_write_through_then_hit(self):
+        component = self.component()
+        expected = list(component.get_records())
+        self.assertEqual(len(expected), 500)
+        self.assertEqual(self.stream_requests(), 1)
+        self.assertEqual(list(component.get_records()), expected)
+        self.assertEqual(list(component.get_records(parallel=3, window_size=100)), expected)
+        # ranges are sliced from the full entry
+        self.assertEqual(list(component.get_records(offset=10, limit=5)), expected[10:15])
+        self.assertEqual(list(component.get_records(offset=490)), expected[490:])
+        self.assertEqual(self.stream_requests(), 1)
+
+    def test_ranges(self):
+        component = self.component()
+        self.assertEqual([r['id'] for r in component.get_records(offset=20, limit=10)],
+                         list(range(20, 30)))
+        self.assertEqual([r['id'] for r in component.get_records(offset=20, limit=10)],
+                         list(range(20, 30)))
+        self.assertEqual(self.stream_requests(), 1)
+        # a different range is not cached yet
+        list(component.get_records(offset=20, limit=11))
+        self.assertEqual(self.stream_requests(), 2)
+
+    def test_partial_read_is_not_cached(self):
+        component = self.component()
+        rows = component.get_records()
+        next(rows)
+        rows.close()
+        list(component.get_records())
+        self.assertEqual(self.stream_requests(), 2)
+        self.assertEqual([name for name in os.listdir(self.dir)], ['fake.ascend.io'])
+
+    def test_definition_change(self):
+        component = self.component('transform_1')
+        list(component.get_records())
+        component.json_definition['description'] = 'changed'
+        list(component.get_records())
+        self.assertEqual(self.stream_requests(), 2)
+        # the entry for the old definition is gone
+        self.assertEqual(len(os.listdir(os.path.join(self.cache.root, component.uuid))), 1)
+
+    def test_eviction(self):
+        list(self.component('read_0').get_records())
+        size = self.cache.size()
+        self.cache.max_bytes = size + size // 2
+        first = self.cache._file(self.component('read_0').uuid,
+                                 RecordCache.fingerprint(self.component('read_0').json_definition),
+                                 0, 0)
+        old = time.time() - 60
+        os.utime(first, (old, old))
+        list(self.component('transform_1').get_records())
+        self.assertFalse(os.path.exists(first))
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+        list(self.component('transform_1').get_records())
+        self.assertEqual(self.stream_requests(), 2)
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.cache = TokenCache(os.path.join(self.dir, 'tokens'))
+        self.server = FakeAscendServer(FakeEnvironment.synthetic()).start()
+        self.addCleanup(self.server.stop)
+
+    def session(self):
+        session = self.server.session(token_cache=self.cache)
+        session.authenticate()
+        return session
+
+    def entry(self):
+        return self.cache._file(self.server.hostname, self.server.access_key)
+
+    def test_reuse(self):
+        first = self.session()
+        second = self.session()
+        self.assertEqual(second.access_token, first.access_token)
+        self.assertEqual(self.server.token_exchanges, 1)
+        self.assertEqual(len(second.get('organizations')['data']), 1)
+        self.assertEqual(os.stat(self.entry()).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(self.cache.root).st_mode & 0o777, 0o700)
+        # another host or access key has its own entry
+        self.assertIsNone(self.cache.get('other.ascend.io', self.server.access_key))
+        self.assertIsNone(self.cache.get(self.server.hostname, 'other'))
+
+    def test_concurrent_sessions(self):
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(self.session()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({s.access_token for s in sessions}), 1)
+        self.assertEqual(self.server.token_exchanges, 1)
+
+    def test_refresh_shared(self):
+        first = self.session()
+        second = self.session()
+        second.exchange_tokens()
+        # the refresh token both held is spent; the first adopts the new tokens
+        first.exchange_tokens(stale_token=first.access_token)
+        self.assertEqual(first.access_token, second.access_token)
+        self.assertEqual(self.server.token_exchanges, 2)
+        self.assertEqual(len(first.get('organizations')['data']), 1)
+
+    def test_stale_access_token(self):
+        # tokens which expire within the margin are not reused, but their
+        # refresh token is
+        self.server.token_ttl = 2
+        first = self.session()
+        refresh_token = first.refresh_token
+        second = self.session()
+        self.assertNotEqual(second.access_token, first.access_token)
+        self.assertNotIn(refresh_token, self.server.refresh_tokens)
+        self.assertEqual(self.server.token_exchanges, 2)
+        self.assertEqual(self.cache.get(self.server.hostname, self.server.access_key)
+                         ['access_token'], second.access_token)
+
+    def test_revoked_tokens(self):
+        self.session()
+        self.server.expire_tokens()
+        self.server.refresh_tokens.clear()
+        session = self.session()
+        self.assertEqual(len(session.get('organizations')['data']), 1)
+        self.assertEqual(self.server.token_exchanges, 2)
+        self.assertEqual(self.cache.get(self.server.hostname, self.server.access_key)
+                         ['access_token'], session.access_token)
+
+    def test_permissions(self):
+        self.session()
+        os.chmod(self.entry(), 0o644)
+        with mock.patch('ascend.cli.sh.warn') as warn:
+            self.session()
+        warn.assert_called_once()
+        self.assertEqual(self.server.token_exchanges, 2)
+        # the entry is replaced, readable by its owner only
+        self.assertEqual(os.stat(self.entry()).st_mode & 0o777, 0o600)
+
+    def test_unreadable_entry(self):
+        self.session()
+        with open(self.entry(), 'w') as f:
+            f.write('{"access_')
+        self.session()
+        self.assertEqual(self.server.token_exchanges, 2)
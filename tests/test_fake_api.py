@@ -0,0 +1,83 @@
+import unittest
+
+from requests import HTTPError
+
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from ascend.lineage import LineageGraph
+from ascend.resource_definitions import ROOT_PATH, ResourcePath, ResourceSession
+from ascend.session import NO_RETRY, Session
+
+
+class TestFakeApi(unittest.TestCase):
+
+    def setUp(self):
+        self.env = FakeEnvironment.synthetic(data_services=2, dataflows=2, components=5, records=25)
+        self.server = FakeAscendServer(self.env).start()
+        self.addCleanup(self.server.stop)
+
+    def test_token_exchange(self):
+        session = self.server.session()
+        # deferred until the first request
+        self.assertEqual(self.server.token_exchanges, 0)
+        session.authenticate()
+        self.assertEqual(self.server.token_exchanges, 1)
+        self.server.expire_tokens()
+        self.assertEqual(len(session.get('organizations')['data']), 2)
+        # the expired access token was refreshed with the refresh token
+        self.assertEqual(self.server.token_exchanges, 2)
+
+    def test_bad_signature(self):
+        session = Session(self.server.hostname, self.server.access_key, 'wrong-secret',
+                          base_uri=self.server.base_uri)
+        with self.assertRaises(HTTPError):
+            session.get('organizations')
+
+    def test_crawl(self):
+        client = self.server.client()
+        rs = ResourceSession(client, client.get_session())
+        root = ResourcePath(rd_path=ROOT_PATH)
+        dss = root.children(rs)
+        self.assertEqual(sorted(p.rd_path for p in dss), [('ds_0', None, None), ('ds_1', None, None)])
+        dfs = dss[0].children(rs)
+        self.assertEqual(len(dfs), 2)
+        self.assertEqual(len(dfs[0].children(rs)), 5)
+
+    def test_apply_and_delete(self):
+        session = self.server.session()
+        session.post('organizations/ds_0/projects', {'id': 'new_df', 'name': 'New'})
+        self.assertIn(('ds_0', 'new_df'), self.env.dataflows)
+        with self.assertRaises(HTTPError) as cm:
+            session.post('organizations/ds_0/projects', {'id': 'new_df', 'name': 'New'})
+        self.assertEqual(cm.exception.response.status_code, 409)
+        session.delete('organizations/ds_0/projects/new_df')
+        with self.assertRaises(KeyError):
+            session.get('organizations/ds_0/projects/new_df')
+
+    def test_records(self):
+        comp = self.server.client().get_component('ds_0', 'df_0', 'transform_1')
+        records = list(comp.get_records())
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records[3]['id'], 3)
+        self.assertEqual([r['id'] for r in comp.get_records(offset=20, limit=3)], [20, 21, 22])
+
+    def test_lineage(self):
+        session = self.server.session()
+        client = self.server.client()
+        comp = client.get_component('ds_0', 'df_0', 'transform_4')
+        graph = LineageGraph(session)
+        upstream = graph.predecessors(comp)
+        self.assertTrue(upstream)
+        self.assertTrue(all(c.dataflow_id == 'df_0' for c in upstream))
+
+    def test_error_injection(self):
+        session = self.server.session(retry=NO_RETRY)
+        self.server.inject_errors(count=1, status=503, retry_after=2)
+        with self.assertRaises(HTTPError) as cm:
+            session.get('organizations')
+        self.assertEqual(cm.exception.response.status_code, 503)
+        self.assertEqual(cm.exception.response.headers['Retry-After'], '2')
+        self.assertEqual(len(session.get('organizations')['data']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
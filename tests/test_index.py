@@ -0,0 +1,39 @@
+import unittest
+from ascend.index import ResourceIndex
+
+
+class TestResourceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ResourceIndex()
+        self.index.add('organization', ('ds', None, None), 'ds-uuid')
+        self.index.add('project', ('ds', 'df', None), 'df-uuid')
+        self.index.add('project', ('ds', 'other', None), 'other-uuid')
+        self.index.add('view', ('ds', 'df', 'a'), 'a-uuid')
+        self.index.add('view', ('ds', 'other', 'b'), 'b-uuid')
+        self.index.add('pub', ('ds', 'df', 'feed'), 'feed-uuid')
+        # a dataflow loaded before its data service
+        self.index.add('project', ('lone', 'df', None), 'lone-df-uuid')
+
+    def test_data_service_ids(self):
+        self.assertEqual(self.index.data_service_ids(), ['ds'])
+
+    def test_find(self):
+        self.assertEqual(sorted(self.index.find('project', 'ds')), ['df-uuid', 'other-uuid'])
+        self.assertEqual(self.index.find('view', 'ds', 'df'), ['a-uuid'])
+        self.assertEqual(sorted(self.index.find('view', 'ds')), ['a-uuid', 'b-uuid'])
+        self.assertEqual(self.index.find('pub', 'ds'), ['feed-uuid'])
+        self.assertEqual(self.index.find('view', 'missing'), [])
+        self.assertEqual(self.index.find('view', 'ds', 'missing'), [])
+
+    def test_get(self):
+        self.assertEqual(self.index.get('project', ('ds', 'df', None)), 'df-uuid')
+        self.assertEqual(self.index.get('view', ('ds', 'other', 'b')), 'b-uuid')
+        self.assertIsNone(self.index.get('view', ('ds', 'df', 'b')))
+        # lookups must not create entries
+        self.assertEqual(self.index.find('view', 'nowhere'), [])
+        self.assertNotIn('nowhere', self.index.data_service_ids())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from collections import Counter
+
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from ascend.model import Dataflow
+
+DATAFLOWS = '/api/v1/organizations/ds_0/projects'
+
+
+class TestApply(unittest.TestCase):
+
+    def setUp(self):
+        self.env = FakeEnvironment.synthetic(data_services=1, dataflows=1, components=1)
+        self.server = FakeAscendServer(self.env).start()
+        self.addCleanup(self.server.stop)
+        self.session = self.server.session()
+        self.session.authenticate()
+
+    def dataflow(self, dataflow_id, name='Applied'):
+        return Dataflow('ds_0', dataflow_id, {'name': name}, session=self.session)
+
+    def apply(self, dataflow, **kwargs):
+        self.server.reset_stats()
+        dataflow.apply(**kwargs)
+        return Counter({k: v for k, v in self.server.requests.items() if v})
+
+    def test_create(self):
+        df = self.dataflow('new_df')
+        requests = self.apply(df, exists=False)
+        # the created resource is echoed back, so is not fetched again
+        self.assertEqual(requests, {('POST', DATAFLOWS): 1})
+        self.assertEqual(df.uuid, self.env.dataflows[('ds_0', 'new_df')]['uuid'])
+
+    def test_update(self):
+        df = self.dataflow('df_0')
+        requests = self.apply(df, exists=True)
+        self.assertEqual(requests, {('PATCH', DATAFLOWS + '/df_0'): 1})
+        self.assertEqual(df.uuid, self.env.dataflows[('ds_0', 'df_0')]['uuid'])
+        self.assertEqual(self.env.dataflows[('ds_0', 'df_0')]['name'], 'Applied')
+
+    def test_exists_unknown(self):
+        requests = self.apply(self.dataflow('new_df'))
+        self.assertEqual(requests, {('GET', DATAFLOWS + '/new_df'): 1, ('POST', DATAFLOWS): 1})
+        requests = self.apply(self.dataflow('df_0'))
+        self.assertEqual(requests, {('GET', DATAFLOWS + '/df_0'): 1,
+                                    ('PATCH', DATAFLOWS + '/df_0'): 1})
+
+    def test_created_since(self):
+        # the caller saw no resource, which was created before the POST
+        df = self.dataflow('df_0')
+        requests = self.apply(df, exists=False)
+        self.assertEqual(requests, {('POST', DATAFLOWS): 1, ('PATCH', DATAFLOWS + '/df_0'): 1})
+        self.assertEqual(df.uuid, self.env.dataflows[('ds_0', 'df_0')]['uuid'])
+        self.assertEqual(self.env.dataflows[('ds_0', 'df_0')]['name'], 'Applied')
+
+    def test_not_echoed(self):
+        post = self.session.post
+        # a write which does not return the resource
+        self.session.post = lambda *args, **kwargs: post(*args, **kwargs) and {}
+        df = self.dataflow('new_df')
+        requests = self.apply(df, exists=False)
+        self.assertEqual(requests, {('POST', DATAFLOWS): 1, ('GET', DATAFLOWS + '/new_df'): 1})
+        self.assertEqual(df.uuid, self.env.dataflows[('ds_0', 'new_df')]['uuid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
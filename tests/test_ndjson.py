@@ -0,0 +1,50 @@
+import json
+import unittest
+
+from ascend import ndjson
+
+
+class TestNDJSONDecoder(unittest.TestCase):
+
+    def backends(self):
+        yield json.loads
+        if ndjson.orjson is not None:
+            yield ndjson.orjson.loads
+
+    def decode(self, chunks, loads=None):
+        return list(ndjson.decode_chunks(chunks, loads))
+
+    def test_chunk_boundaries(self):
+        rows = [{'id': i, 'name': f'name_{i}', 'tags': ['a', 'b'] * (i % 3)} for i in range(200)]
+        data = b''.join(json.dumps(row).encode() + b'\n' for row in rows)
+        for loads in self.backends():
+            for size in (1, 7, 64, 1000, len(data)):
+                with self.subTest(loads=loads, size=size):
+                    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+                    self.assertEqual(self.decode(chunks, loads), rows)
+
+    def test_blank_lines_and_no_trailing_newline(self):
+        chunks = [b'{"a": 1}\n\n', b'  \n{"b":', b' 2}\r\n[1, 2]\n', b'3']
+        for loads in self.backends():
+            self.assertEqual(self.decode(chunks, loads), [{'a': 1}, {'b': 2}, [1, 2], 3])
+
+    def test_empty(self):
+        self.assertEqual(self.decode([]), [])
+        self.assertEqual(self.decode([b'', b'\n', b' ']), [])
+
+    def test_invalid_line(self):
+        for loads in self.backends():
+            with self.assertRaises(ValueError):
+                self.decode([b'{"a": 1}\n{bad}\n'], loads)
+            # valid once joined into an array, but not as a line of its own
+            with self.assertRaises(ValueError):
+                self.decode([b'1, 2\n3\n'], loads)
+
+    def test_non_standard_values(self):
+        # orjson rejects NaN, which json.loads accepts
+        value, = self.decode([b'{"x": NaN}\n'])
+        self.assertNotEqual(value['x'], value['x'])
+
+
+if __name__ == '__main__':
+    unittest.main()
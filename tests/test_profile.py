@@ -0,0 +1,121 @@
+import math
+import statistics
+import unittest
+
+from ascend.fake_api import DEFAULT_SCHEMA, FakeAscendServer, FakeEnvironment, SyntheticRecords
+
+try:
+    import numpy as np
+    from ascend import profile
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestSketches(unittest.TestCase):
+
+    def test_hyperloglog(self):
+        for n in (0, 1, 100, 10000, 200000):
+            sketch = profile.HyperLogLog()
+            # duplicates, in several batches
+            for batch in np.array_split(np.arange(n).repeat(2), 7):
+                sketch.add(batch)
+            self.assertLessEqual(abs(sketch.estimate() - n), max(1, 0.03 * n), n)
+
+    def test_hyperloglog_merge(self):
+        a, b = profile.HyperLogLog(), profile.HyperLogLog()
+        a.add(np.arange(0, 60000))
+        b.add(np.arange(40000, 100000))
+        a.merge(b)
+        self.assertLess(abs(a.estimate() - 100000), 3000)
+        with self.assertRaises(ValueError):
+            a.merge(profile.HyperLogLog(precision=10))
+
+    def test_hash_values(self):
+        self.assertEqual(profile.hash_values(np.array([0.0]))[0],
+                         profile.hash_values(np.array([-0.0]))[0])
+        strings = profile.hash_values(np.array(['a', 'b', 'a'], dtype=object))
+        self.assertEqual(strings[0], strings[2])
+        self.assertNotEqual(strings[0], strings[1])
+        nested = profile.hash_values(np.array([[1], {'a': 1}, [1]], dtype=object))
+        self.assertEqual(nested[0], nested[2])
+
+    def test_quantiles(self):
+        values = np.random.default_rng(0).permutation(100000)
+        sketch = profile.QuantileSketch(seed=0)
+        for batch in np.array_split(values, 13):
+            sketch.add(batch)
+        self.assertEqual(sketch.count, 100000)
+        self.assertLess(sum(len(level) for level in sketch.levels), 1000)
+        qs = [0, 0.1, 0.5, 0.9, 1]
+        for q, value in zip(qs, sketch.quantiles(qs)):
+            self.assertLess(abs(value - q * 100000), 2000, q)
+        self.assertEqual(profile.QuantileSketch().quantiles([0.5]), [None])
+
+    def test_quantiles_merge(self):
+        a, b = profile.QuantileSketch(seed=0), profile.QuantileSketch(seed=1)
+        a.add(np.arange(0, 50000))
+        b.add(np.arange(50000, 100000))
+        a.merge(b)
+        self.assertEqual(a.count, 100000)
+        self.assertLess(abs(a.quantiles([0.5])[0] - 50000), 2000)
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestProfile(unittest.TestCase):
+    COUNT = 3000
+
+    @classmethod
+    def setUpClass(cls):
+        env = FakeEnvironment.synthetic(components=1, records=cls.COUNT)
+        cls.server = FakeAscendServer(env).start()
+        cls.component = cls.server.client().get_component('ds_0', 'df_0', 'read_0')
+        cls.rows = list(SyntheticRecords(cls.COUNT).rows(0, None))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_profile(self):
+        profiles = self.component.profile(batch_size=700)
+        self.assertEqual(list(profiles), [name for name, _ in DEFAULT_SCHEMA])
+        for name, column in profiles.items():
+            values = [row[name] for row in self.rows if row[name] is not None]
+            self.assertEqual(column.count, self.COUNT)
+            self.assertEqual(column.nulls, self.COUNT - len(values))
+            self.assertEqual((column.min, column.max), (min(values), max(values)), name)
+            self.assertLessEqual(abs(column.distinct - len(set(values))),
+                                 0.03 * len(set(values)), name)
+
+        value = profiles['value']
+        values = [row['value'] for row in self.rows]
+        self.assertTrue(math.isclose(value.mean, statistics.mean(values)))
+        self.assertTrue(math.isclose(value.variance, statistics.variance(values)))
+        self.assertEqual(set(value.quantiles), set(profile.DEFAULT_QUANTILES))
+        self.assertEqual(profiles['flag'].mean, 0.5)
+        self.assertIsNone(profiles['name'].mean)
+        self.assertIsNone(profiles['name'].quantiles)
+        self.assertTrue(profiles['ts'].quantiles[0.5].endswith('Z'))
+        self.assertEqual(profiles['id'].to_dict()['quantiles'].keys(),
+                         {str(q) for q in profile.DEFAULT_QUANTILES})
+
+    def test_profile_selection(self):
+        profiles = self.component.profile(columns=['id', 'name'], where='id >= 1000',
+                                          quantiles=[0.5])
+        self.assertEqual(list(profiles), ['id', 'name'])
+        self.assertEqual(profiles['id'].count, self.COUNT - 1000)
+        self.assertEqual(profiles['id'].min, 1000)
+        self.assertLess(abs(profiles['id'].quantiles[0.5] - 2000), 60)
+
+    def test_profile_inferred_schema(self):
+        profiles = profile.profile_records(iter(self.rows[:10]))
+        self.assertEqual([(c.name, c.type) for c in profiles.values()],
+                         [('id', 'long'), ('name', 'string'), ('value', 'double'),
+                          ('flag', 'boolean'), ('ts', 'string')])
+        self.assertEqual(profile.profile_records(iter(())), {})
+        with self.assertRaises(ValueError):
+            profile.profile_records(iter(self.rows), quantiles=[1.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
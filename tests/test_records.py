@@ -0,0 +1,541 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+import requests
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ascend import records
+from ascend.fake_api import DEFAULT_SCHEMA, FakeAscendServer, FakeEnvironment
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class TestRecords(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        env = FakeEnvironment.synthetic(components=1, records=1050)
+        cls.server = FakeAscendServer(env).start()
+        cls.component = cls.server.client().get_component('ds_0', 'df_0', 'read_0')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_windows(self):
+        self.assertEqual(list(records.windows(5, 25, 10)), [(5, 10), (15, 10), (25, 5)])
+        unbounded = records.windows(0, 0, 10)
+        self.assertEqual([next(unbounded) for _ in range(3)], [(0, 10), (10, 10), (20, 10)])
+
+    def test_parallel_ordered(self):
+        ids = [r['id'] for r in self.component.get_records(parallel=4, window_size=100)]
+        self.assertEqual(ids, list(range(1050)))
+
+    def test_parallel_unordered(self):
+        ids = [r['id'] for r in self.component.get_records(parallel=4, window_size=100,
+                                                            ordered=False)]
+        self.assertEqual(sorted(ids), list(range(1050)))
+
+    def test_parallel_offset_limit(self):
+        ids = [r['id'] for r in self.component.get_records(offset=10, limit=255, parallel=3,
+                                                            window_size=50)]
+        self.assertEqual(ids, list(range(10, 265)))
+        ids = [r['id'] for r in self.component.get_records(offset=1000, limit=500, parallel=3,
+                                                            window_size=20)]
+        self.assertEqual(ids, list(range(1000, 1050)))
+
+    def test_parallel_early_stop(self):
+        it = self.component.get_records(parallel=4, window_size=100)
+        self.assertEqual([next(it)['id'] for _ in range(3)], [0, 1, 2])
+        it.close()
+
+    def test_schema(self):
+        self.assertEqual(self.component.get_schema(), DEFAULT_SCHEMA)
+
+    @unittest.skipIf(np is None, 'requires numpy')
+    def test_record_batches_numpy(self):
+        batches = list(self.component.get_record_batches(batch_size=400, arrow=False))
+        self.assertEqual([len(b['id']) for b in batches], [400, 400, 250])
+        batch = batches[0]
+        self.assertEqual(batch['id'].dtype, np.int64)
+        self.assertEqual(batch['value'].dtype, np.float64)
+        self.assertEqual(batch['flag'].dtype, np.bool_)
+        self.assertEqual(batch['ts'][5], np.datetime64('2021-01-01T00:00:05'))
+        self.assertEqual(batch['name'][0], 'name_0')
+        self.assertIsNone(batch['name'][9])
+        self.assertEqual(np.concatenate([b['id'] for b in batches]).tolist(), list(range(1050)))
+
+    @unittest.skipIf(np is None, 'requires numpy')
+    def test_record_batches_numpy_nulls(self):
+        rows = [{'a': 1, 'b': '2021-01-02'}, {'a': None, 'b': None}]
+        batch, = records.record_batches(rows, [('a', 'int'), ('b', 'date')], arrow=False)
+        self.assertIsInstance(batch['a'], np.ma.MaskedArray)
+        self.assertEqual(batch['a'].dtype, np.int32)
+        self.assertEqual(batch['a'].mask.tolist(), [False, True])
+        self.assertEqual(batch['b'][0], np.datetime64('2021-01-02'))
+        self.assertIs(batch['b'][1], np.ma.masked)
+
+    @unittest.skipIf(pa is None, 'requires pyarrow')
+    def test_record_batches_arrow(self):
+        batches = list(self.component.get_record_batches(batch_size=500, offset=100,
+                                                         parallel=2, arrow=True))
+        self.assertEqual([b.num_rows for b in batches], [500, 450])
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.schema.field('id').type, pa.int64())
+        self.assertEqual(table.schema.field('ts').type, pa.timestamp('us', tz='UTC'))
+        self.assertEqual(table.column('id').to_pylist(), list(range(100, 1050)))
+        self.assertEqual(table.column('name').null_count, 95)
+
+    @unittest.skipIf(np is None, 'requires numpy')
+    def test_record_batches_untyped(self):
+        batch, = records.record_batches([{'a': 1}, {'a': 'x'}], [], arrow=False)
+        self.assertEqual(batch['a'].tolist(), [1, 'x'])
+
+    def resumable(self, **kwargs):
+        return records.ResumableRecords(self.component.session,
+                                        self.component.resource_path + '/records-stream',
+                                        backoff=0.01, **kwargs)
+
+    def test_resume_after_drop(self):
+        self.server.drop_streams(2, after=300)
+        rows = self.resumable()
+        self.assertEqual([r['id'] for r in rows], list(range(1050)))
+        self.assertEqual(rows.delivered, 1050)
+
+    def test_resume_gives_up(self):
+        self.server.drop_streams(3, after=0)
+        try:
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                list(self.resumable(retries=2))
+        finally:
+            self.server.stream_drops.clear()
+
+    def test_resume_parallel(self):
+        self.server.drop_streams(1, after=10)
+        ids = [r['id'] for r in self.component.get_records(offset=20, limit=900, parallel=3,
+                                                            window_size=100, retries=1)]
+        self.assertEqual(ids, list(range(20, 920)))
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            self.server.drop_streams(1, after=500)
+            rows = self.resumable(offset=10, retries=0, checkpoint=path, checkpoint_interval=100)
+            delivered = []
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                for row in rows:
+                    delivered.append(row['id'])
+            self.assertEqual(len(delivered), 500)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['offset'], 510)
+
+            rows = self.resumable(offset=10, checkpoint=path)
+            self.assertEqual(rows.delivered, 500)
+            self.assertEqual([r['id'] for r in rows], list(range(510, 1050)))
+            self.assertFalse(os.path.exists(path))
+
+            rows = self.resumable(limit=20, checkpoint=path, checkpoint_interval=0)
+            self.assertEqual([next(rows)['id'] for _ in range(5)], list(range(5)))
+            rows.close()
+            with self.assertRaises(ValueError):
+                self.resumable(offset=1, checkpoint=path)
+            self.assertEqual([r['id'] for r in self.component.get_records(limit=20,
+                                                                          checkpoint=path)],
+                             list(range(5, 20)))
+
+    def test_prefetch(self):
+        rows = self.component.get_records(offset=5, prefetch=100)
+        self.assertIsInstance(rows, records.PrefetchedRecords)
+        self.assertEqual([r['id'] for r in rows], list(range(5, 1050)))
+        self.assertEqual(list(rows), [])
+        ids = [r['id'] for r in self.component.get_records(parallel=3, window_size=100,
+                                                            prefetch=1)]
+        self.assertEqual(ids, list(range(1050)))
+
+    def test_prefetch_error(self):
+        self.server.drop_streams(1, after=250)
+        rows = self.component.get_records(prefetch=2000)
+        ids = []
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            for row in rows:
+                ids.append(row['id'])
+        # the records read before the error are all delivered
+        self.assertEqual(ids, list(range(250)))
+        with self.assertRaises(StopIteration):
+            next(rows)
+
+    def test_prefetch_bounded_and_closed(self):
+        produced = []
+        closed = threading.Event()
+
+        def source():
+            try:
+                for i in range(100000):
+                    produced.append(i)
+                    yield {'id': i}
+            finally:
+                closed.set()
+
+        with records.PrefetchedRecords(source(), 10) as rows:
+            self.assertEqual(next(rows)['id'], 0)
+            time.sleep(0.05)
+            # the queue and the batch being filled bound the records read ahead
+            self.assertLessEqual(len(produced), 40)
+        self.assertTrue(closed.wait(1))
+        self.assertEqual(list(rows), [])
+
+        rows = records.PrefetchedRecords(source(), 10)
+        next(rows)
+        closed.clear()
+        del rows
+        self.assertTrue(closed.wait(1))
+
+    def test_where_expression(self):
+        where = records.compile_where('value > 10 and name is not None or id in (1, 2)')
+        self.assertTrue(where({'value': 11, 'name': 'a'}))
+        # a comparison with a null is false, without failing the expression
+        self.assertTrue(where({'value': None, 'id': 1}))
+        self.assertFalse(where({'value': None}))
+        self.assertFalse(where({'value': 'x', 'name': 'a'}))
+        self.assertTrue(records.compile_where('-x * 2 + 1 < 0 and not flag')({'x': 3}))
+        for expression in ("__import__('os')", 'a.b', 'x[0]', 'lambda: 1', '(',
+                           'x if y else z'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                records.compile_where(expression)
+
+    def test_where_literals(self):
+        # every kind of literal, which Python 3.7 parses as its own node type
+        self.assertTrue(records.compile_where('id % 2 == 0')({'id': 4}))
+        where = records.compile_where("name == 'a' and data == b'x' and flag is True "
+                                      "and x is None and value in (1.5, -2)")
+        self.assertTrue(where({'name': 'a', 'data': b'x', 'flag': True, 'value': -2}))
+        self.assertFalse(where({'name': 'a', 'data': b'x', 'flag': False, 'value': -2}))
+
+    def test_columns_and_where(self):
+        expected = [{'id': i, 'value': i * 0.5} for i in range(1050) if i % 10 == 9 and i > 500]
+        for kwargs in ({}, {'parallel': 3, 'window_size': 100}, {'retries': 1},
+                       {'prefetch': 100}):
+            with self.subTest(**kwargs):
+                rows = self.component.get_records(columns=['id', 'value'],
+                                                  where='name is None and id > 500', **kwargs)
+                self.assertEqual(list(rows), expected)
+        rows = self.component.get_records(offset=100, limit=10, columns=['flag', 'missing'],
+                                          where=lambda r: r['id'] % 2 == 0)
+        self.assertEqual(list(rows), [{'flag': True, 'missing': None}] * 5)
+
+    @unittest.skipIf(np is None, 'requires numpy')
+    def test_record_batches_columns(self):
+        batch, = self.component.get_record_batches(columns=['value', 'id'], where='id < 3',
+                                                   arrow=False)
+        self.assertEqual(list(batch), ['value', 'id'])
+        self.assertEqual(batch['id'].dtype, np.int64)
+        self.assertEqual(batch['value'].tolist(), [0.0, 0.5, 1.0])
+
+    def test_output_format(self):
+        self.assertEqual(records.output_format('out.jsonl'), ('jsonl', False))
+        self.assertEqual(records.output_format('/tmp/OUT.CSV.GZ'), ('csv', True))
+        self.assertEqual(records.output_format('out.parquet'), ('parquet', False))
+        self.assertEqual(records.output_format('out.txt'), (None, False))
+
+    def test_write_jsonl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, opener in (('out.jsonl', open), ('out.jsonl.gz', gzip.open)):
+                path = os.path.join(directory, name)
+                count = records.write_records(self.component.get_records(parallel=2,
+                                                                         window_size=300),
+                                              path, 'jsonl', name.endswith('.gz'))
+                self.assertEqual(count, 1050)
+                with opener(path, 'rb') as f:
+                    rows = [json.loads(line) for line in f]
+                self.assertEqual(rows, list(self.component.get_records()))
+                self.assertFalse(os.path.exists(path + '.part'))
+
+    def test_write_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.csv.gz')
+            count = records.write_records(self.component.get_records(limit=20), path, 'csv',
+                                          True, self.component.get_schema())
+            self.assertEqual(count, 20)
+            with gzip.open(path, 'rt', newline='') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], [name for name, _ in DEFAULT_SCHEMA])
+            self.assertEqual(rows[1], ['0', 'name_0', '0.0', 'true', '2021-01-01T00:00:00Z'])
+            self.assertEqual(rows[10][1], '')
+            self.assertEqual(len(rows), 21)
+
+    @unittest.skipIf(pa is None, 'requires pyarrow')
+    def test_write_parquet(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.parquet')
+            count = records.write_records(self.component.get_records(offset=50), path,
+                                          'parquet', schema=self.component.get_schema(),
+                                          batch_size=400)
+            self.assertEqual(count, 1000)
+            parquet = pq.ParquetFile(path)
+            self.assertEqual(parquet.metadata.num_row_groups, 3)
+            table = parquet.read()
+            self.assertEqual(table.column('id').to_pylist(), list(range(50, 1050)))
+            self.assertEqual(table.schema.field('ts').type, pa.timestamp('us', tz='UTC'))
+
+            empty = records.write_records(iter(()), path, 'parquet',
+                                          schema=[('id', 'long')])
+            self.assertEqual(empty, 0)
+            self.assertEqual(pq.read_table(path).schema.field('id').type, pa.int64())
+
+    def test_write_failure_keeps_no_file(self):
+        def failing():
+            yield {'id': 1}
+            raise RuntimeError('dropped')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.jsonl')
+            with self.assertRaises(RuntimeError):
+                records.write_records(failing(), path)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.component.get_records(offset=-1, parallel=2)
+        with self.assertRaises(ValueError):
+            self.component.get_records(parallel=2, ordered=False, retries=1)
+        with self.assertRaises(ValueError):
+            records.record_batches([], [], batch_size=0)
+        with self.assertRaises(ValueError):
+            records.PrefetchedRecords([], 0)
+
+
+class TestDiff(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        before = [{'id': i, 'group': i % 3, 'value': i * 2, 'note': 'x'} for i in range(500)]
+        after = [dict(row, value=row['value'] + (row['id'] % 7 == 0),
+                      note='y' if row['id'] == 4 else 'x')
+                 for row in before if row['id'] % 50]
+        after += [{'id': i, 'group': 0, 'value': 0, 'note': 'new'} for i in range(500, 520)]
+        cls.before, cls.after = before, after
+        env = FakeEnvironment()
+        env.add_data_service('ds_0')
+        env.add_dataflow('ds_0', 'df_0')
+        env.add_component('ds_0', 'df_0', 'view', 'old', records=before)
+        env.add_component('ds_0', 'df_0', 'view', 'new', records=after)
+        cls.server = FakeAscendServer(env).start()
+        client = cls.server.client()
+        cls.old = client.get_component('ds_0', 'df_0', 'old')
+        cls.new = client.get_component('ds_0', 'df_0', 'new')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def check(self, result, changed=None):
+        removed = sorted(r['id'] for r in result.removed_records())
+        added = sorted(r['id'] for r in result.added_records())
+        changes = {c['key']['id']: c for c in result.changed_records()}
+        self.assertEqual(removed, list(range(0, 500, 50)))
+        self.assertEqual(added, list(range(500, 520)))
+        expected = {i for i in range(500) if i % 50 and (i % 7 == 0 or i == 4)}
+        if changed is not None:
+            expected = changed
+        self.assertEqual(set(changes), expected)
+        self.assertEqual(result.summary(), {'added': 20, 'removed': 10, 'changed': len(expected),
+                                            'unchanged': 490 - len(expected)})
+        return changes
+
+    def test_diff_components(self):
+        with records.diff(self.old, self.new, key=['id'], partitions=8, workers=1) as result:
+            changes = self.check(result)
+            self.assertEqual(changes[7]['columns'], ['value'])
+            self.assertEqual(changes[4]['columns'], ['note'])
+            self.assertEqual((changes[7]['before']['value'], changes[7]['after']['value']),
+                             (14, 15))
+            directory = result.directory
+        self.assertFalse(os.path.exists(directory))
+        with self.assertRaises(ValueError):
+            list(result.added_records())
+
+    def test_diff_processes_and_splits(self):
+        # partitions past a few bytes are split again, on two processes
+        with records.diff(iter(self.before), iter(self.after), key=['group', 'id'],
+                          partitions=2, partition_bytes=2000, workers=2) as result:
+            changes = self.check(result)
+            self.assertEqual(changes[7]['key'], {'group': 1, 'id': 7})
+
+    def test_diff_columns_and_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'before.jsonl.gz')
+            records.write_records(iter(self.before), path, compress=True)
+            with records.diff(path, self.new, key=['id'], columns=['note'], workers=1,
+                              spill_dir=directory) as result:
+                changes = self.check(result, changed={4})
+                self.assertEqual(changes[4]['before'], {'id': 4, 'note': 'x'})
+                self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(os.listdir(directory), ['before.jsonl.gz'])
+
+    def test_diff_invalid(self):
+        with self.assertRaises(ValueError):
+            records.diff([], [], key=[])
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                records.diff([{'id': 1}, {'id': 1}], [], key=['id'], workers=1,
+                             spill_dir=directory)
+            # nothing is left behind
+            self.assertEqual(os.listdir(directory), [])
+        with self.assertRaises(ValueError):
+            records.diff([], [{'id': [1, 2]}, {'id': [1, 2]}], key=['id'], workers=1)
+
+    def test_diff_split_on_b(self):
+        # a partition whose records of b alone are large is split too
+        with mock.patch('ascend.records._spill', wraps=records._spill) as spill:
+            with records.diff([], iter(self.after), key=['id'], partitions=1,
+                              partition_bytes=2000, workers=1) as result:
+                self.assertEqual(result.summary(), {'added': len(self.after), 'removed': 0,
+                                                    'changed': 0, 'unchanged': 0})
+        self.assertGreater(spill.call_count, 2)
+
+    def test_diff_unhashable_keys(self):
+        # key values may be lists or objects, which match whatever their order of fields
+        before = [{'id': [i, {'a': i, 'b': 0}], 'value': i} for i in range(20)]
+        after = [{'id': [i, {'b': 0, 'a': i}], 'value': i + (i == 3)} for i in range(1, 21)]
+        with records.diff(before, after, key=['id'], partitions=4, workers=1) as result:
+            self.assertEqual(result.summary(), {'added': 1, 'removed': 1, 'changed': 1,
+                                                'unchanged': 18})
+            self.assertEqual([c['key'] for c in result.changed_records()],
+                             [{'id': [3, {'b': 0, 'a': 3}]}])
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestAsyncRecords(unittest.TestCase):
+    SIZES = {'feed_a': 1050, 'feed_b': 300, 'feed_c': 0}
+
+    @classmethod
+    def setUpClass(cls):
+        env = FakeEnvironment()
+        for i, (feed_id, size) in enumerate(cls.SIZES.items()):
+            env.add_data_service(f'ds_{i}')
+            env.add_dataflow(f'ds_{i}', 'df_0')
+            env.add_component(f'ds_{i}', 'df_0', 'pub', feed_id, {'inputUUID': feed_id},
+                              records=[{'id': n, 'feed': feed_id} for n in range(size)])
+        cls.server = FakeAscendServer(env).start()
+        cls.client = cls.server.client()
+        cls.feeds = cls.client.list_data_feeds()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def collect(self, iterator, stop=None, close=True):
+        self.loop_errors = []
+
+        async def run():
+            # errors the loop would otherwise log, such as of generators it finalizes
+            asyncio.get_event_loop().set_exception_handler(
+                lambda loop, context: self.loop_errors.append(context))
+            rows = []
+            try:
+                async for row in iterator:
+                    rows.append(row)
+                    if stop is not None and len(rows) >= stop:
+                        break
+            finally:
+                if close:
+                    await iterator.aclose()
+            return rows
+        return asyncio.run(run())
+
+    def test_aiter_records(self):
+        feed = self.client.get_data_feed('ds_0', 'feed_a')
+        self.assertEqual([r['id'] for r in self.collect(feed.aiter_records())],
+                         list(range(1050)))
+        rows = self.collect(feed.aiter_records(offset=10, limit=5, columns=['id'],
+                                               where='id % 2 == 0'))
+        self.assertEqual(rows, [{'id': 10}, {'id': 12}, {'id': 14}])
+
+    def test_read_data_feeds(self):
+        pairs = self.collect(self.client.read_data_feeds(self.feeds))
+        by_feed = {}
+        for feed, row in pairs:
+            self.assertEqual(row['feed'], feed.data_feed_id)
+            by_feed.setdefault(feed.data_feed_id, []).append(row['id'])
+        # each feed in order, feeds without records absent
+        self.assertEqual(by_feed, {'feed_a': list(range(1050)), 'feed_b': list(range(300))})
+
+    def test_read_data_feeds_selection(self):
+        pairs = self.collect(self.client.read_data_feeds(self.feeds, limit=100, columns=['id'],
+                                                         where='id < 3'))
+        self.assertEqual(sorted((f.data_feed_id, r['id']) for f, r in pairs),
+                         [(f, n) for f in ('feed_a', 'feed_b') for n in range(3)])
+
+    def test_read_data_feeds_long_feed(self):
+        # one feed of many batches outlasts another of a single batch, read by
+        # a consumer slower than the stream, for longer than the read timeout
+        env = FakeEnvironment()
+        env.add_data_service('ds_0')
+        env.add_dataflow('ds_0', 'df_0')
+        for feed_id, size in (('long', 20000), ('short', 10)):
+            env.add_component('ds_0', 'df_0', 'pub', feed_id, {'inputUUID': feed_id},
+                              records=[{'id': n} for n in range(size)])
+        with FakeAscendServer(env) as server:
+            client = server.client()
+            client.session.timeout = (10.0, 0.5)
+
+            async def run():
+                order = []
+                async for feed, row in client.read_data_feeds(client.list_data_feeds(),
+                                                              queue_size=1):
+                    order.append((feed.data_feed_id, row['id']))
+                    if len(order) % 1000 == 0:
+                        await asyncio.sleep(0.05)
+                return order
+
+            start = time.monotonic()
+            order = asyncio.run(run())
+        self.assertGreater(time.monotonic() - start, 0.5)
+        last_short = max(i for i, (feed_id, _) in enumerate(order) if feed_id == 'short')
+        self.assertGreater(len(order) - last_short, 1000)
+        self.assertEqual([n for feed_id, n in order if feed_id == 'long'], list(range(20000)))
+
+    def test_read_data_feeds_early_stop(self):
+        pairs = self.collect(self.client.read_data_feeds(self.feeds, queue_size=1), stop=5)
+        self.assertEqual(len(pairs), 5)
+        # each stream is closed by what reads it, in order
+        self.assertEqual(self.loop_errors, [])
+        feed = self.client.get_data_feed('ds_0', 'feed_a')
+        self.assertEqual(len(self.collect(feed.aiter_records(), stop=5)), 5)
+        self.assertEqual(self.loop_errors, [])
+        # or, if the consumer does not close them, as the loop shuts down
+        pairs = self.collect(self.client.read_data_feeds(self.feeds, queue_size=1), stop=5,
+                             close=False)
+        self.assertEqual(len(pairs), 5)
+        self.assertEqual(self.loop_errors, [])
+        self.assertEqual(len(self.collect(feed.aiter_records(), stop=5, close=False)), 5)
+        self.assertEqual(self.loop_errors, [])
+
+    def test_read_data_feeds_error(self):
+        feed_b = next(f for f in self.feeds if f.data_feed_id == 'feed_b')
+        self.server.inject_errors(path=feed_b.resource_path, status=500)
+        with self.assertRaises(aiohttp.ClientResponseError):
+            self.collect(self.client.read_data_feeds(self.feeds))
+
+
+if __name__ == '__main__':
+    unittest.main()
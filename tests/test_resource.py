@@ -1,5 +1,16 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
 import unittest
 import ascend.resource_definitions as resource
+import networkx as nx
+from ascend.cache import SnapshotCache
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from types import SimpleNamespace
+from ascend.protos.resource import resource_pb2
+from google.protobuf.json_format import ParseDict
 
 
 class TestResource(unittest.TestCase):
@@ -17,3 +28,225 @@ class TestResource(unittest.TestCase):
         self.assertEqual(resource.resolve_path(base, ds, df), 'base_path/df')
         self.assertEqual(resource.resolve_path(base, ds, comp), 'base_path/df/comp')
         self.assertEqual(resource.resolve_path(base, df, comp), 'base_path/comp')
+
+    def test_dependency_levels(self):
+        ds = ('ds', None, None)
+        df = ('ds', 'df', None)
+        a = ('ds', 'df', 'a')
+        b = ('ds', 'df', 'b')
+        c = ('ds', 'df', 'c')
+        group = ('ds', 'df', 'group')
+        g = nx.DiGraph()
+        # edges point from a path to its dependencies
+        g.add_edges_from([(df, ds), (a, df), (b, df), (c, a), (c, b), (group, a), (group, c)])
+        levels = [sorted(level, key=resource.path_sort_key)
+                  for level in resource.dependency_levels(g)]
+        self.assertEqual(levels, [[ds], [df], [a, b], [c], [group]])
+        self.assertEqual(resource.dependency_levels(nx.DiGraph()), [])
+
+    def test_digest(self):
+        def dataflow_def(**overrides):
+            d = {
+                'version': 6,
+                'id': 'df',
+                'name': 'My Dataflow',
+                'dataflow': {'description': 'a dataflow', **overrides},
+            }
+            m = resource_pb2.Resource()
+            ParseDict(d, m)
+            return resource.ResourceDefinition.from_resource_proto(m, ('ds', None, None))
+
+        base = dataflow_def()
+        # children are planned as resources of their own, so do not count
+        with_groups = dataflow_def(groups=[{'id': 'g', 'name': 'g'}])
+        self.assertEqual(base.digest(), with_groups.digest())
+        self.assertNotEqual(base.digest(), dataflow_def(description='changed').digest())
+
+
+class TestCrawl(unittest.TestCase):
+
+    def setUp(self):
+        self.env = FakeEnvironment.synthetic(data_services=3, dataflows=3, components=6)
+        components = self.env.components[('ds_1', 'df_2')]
+        self.env.add_group('ds_1', 'df_2', 'grouped',
+                           [components['transform_2']['uuid'], components['transform_3']['uuid']])
+        self.server = FakeAscendServer(self.env).start()
+        self.addCleanup(self.server.stop)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def crawl(self, jobs):
+        client = self.server.client()
+        client.get_session().authenticate()
+        rs = resource.ResourceSession(client, client.get_session(), jobs=jobs)
+        output = os.path.join(self.dir, str(jobs))
+        self.server.reset_stats()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ds_id in sorted(self.env.data_services):
+                rs.get(ds_id, SimpleNamespace(recursive=True, directory=True,
+                                              output=output + os.sep))
+        requests = sum(self.server.requests.values())
+        # the dependency graph which applying the export would follow
+        loader = resource.ResourceSession(client, client.get_session())
+        loader.path_to_def = {}
+        for ds_id in sorted(self.env.data_services):
+            loader.load_defs((ds_id, None, None), SimpleNamespace(
+                input=os.path.join(output, ds_id), recursive=True, config={}))
+        graph = nx.DiGraph()
+        for path, res_def in loader.path_to_def.items():
+            graph.add_node(path)
+            graph.add_edges_from((path, dep) for dep in res_def.dependencies())
+            graph.add_edges_from((dep, path) for dep in res_def.dependees())
+        return dict(rs.path_to_uuid), graph, requests
+
+    def test_jobs(self):
+        resources, graph, requests = self.crawl(jobs=1)
+        # data services, dataflows, components and the group
+        self.assertEqual(len(resources), 3 + 3 * 3 + 3 * 3 * 6 + 1)
+        self.assertEqual(graph.number_of_nodes(), len(resources))
+        # at least an input per transform
+        self.assertGreater(graph.number_of_edges(), 3 * 3 * 5)
+        concurrent_resources, concurrent_graph, concurrent_requests = self.crawl(jobs=8)
+        self.assertEqual(concurrent_resources, resources)
+        self.assertEqual(set(concurrent_graph.edges), set(graph.edges))
+        self.assertEqual(set(concurrent_graph.nodes), set(graph.nodes))
+        self.assertEqual(concurrent_requests, requests)
+
+
+class TestApply(unittest.TestCase):
+
+    def setUp(self):
+        source = FakeEnvironment.synthetic(dataflows=2, components=8, seed=1)
+        components = source.components[('ds_0', 'df_1')]
+        source.add_group('ds_0', 'df_1', 'grouped',
+                         [components['transform_4']['uuid'], components['transform_5']['uuid']])
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        with FakeAscendServer(source) as server, contextlib.redirect_stdout(io.StringIO()):
+            client = server.client()
+            resource.ResourceSession(client, client.get_session()).get('ds_0', SimpleNamespace(
+                recursive=True, directory=True, output=self.dir + os.sep))
+        self.source = source
+        self.env = FakeEnvironment()
+        self.created = []
+        add_component = self.env.add_component
+
+        def record(data_service_id, dataflow_id, api_type, component_id, *args, **kwargs):
+            comp = add_component(data_service_id, dataflow_id, api_type, component_id,
+                                 *args, **kwargs)
+            self.created.append(comp['uuid'])
+            return comp
+        self.env.add_component = record
+        self.server = FakeAscendServer(self.env).start()
+        self.addCleanup(self.server.stop)
+
+    def apply(self, jobs):
+        client = self.server.client()
+        with contextlib.redirect_stderr(io.StringIO()):
+            resource.ResourceSession(client, client.get_session(), jobs=jobs).apply(
+                'ds_0', {}, SimpleNamespace(
+                    input=os.path.join(self.dir, 'ds_0'), recursive=True, config={},
+                    delete=False, dry_run=False, plan=False, force=False))
+
+    def test_concurrent(self):
+        self.apply(jobs=4)
+        self.assertEqual(self.env.component_count(), self.source.component_count())
+        for components in self.env.components.values():
+            for comp in components.values():
+                for upstream in comp.get('inputs', []):
+                    # every input was created, and before the component reading it
+                    self.assertLess(self.created.index(upstream['uuid']),
+                                    self.created.index(comp['uuid']))
+        group = self.env.groups[('ds_0', 'df_1')]['grouped']
+        components = self.env.components[('ds_0', 'df_1')]
+        self.assertEqual({c['uuid'] for c in group['content']},
+                         {components['transform_4']['uuid'], components['transform_5']['uuid']})
+
+        self.server.reset_stats()
+        self.apply(jobs=4)
+        # nothing is written again
+        writes = {(method, path) for (method, path), count in self.server.requests.items()
+                  if count and method != 'GET' and path.startswith('/api/')}
+        self.assertEqual(writes, set())
+
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.env = FakeEnvironment.synthetic(dataflows=2, components=5)
+        self.env.add_component('ds_0', 'df_0', 'source', 'secure_read', {'source': {
+            'container': {'s3': {'bucket': 'fake', 'prefix': 'secure/',
+                                 'credentialId': {'value': 'fake_creds'}}},
+            'records': {'schema': {'field': [{'name': 'id', 'schema': {'long': {}}}]}},
+        }})
+        self.server = FakeAscendServer(self.env).start()
+        self.addCleanup(self.server.stop)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def resource_session(self, client=None, **kwargs):
+        client = client or self.server.client()
+        return resource.ResourceSession(client, client.get_session(), **kwargs)
+
+    def get(self, client=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.resource_session(client).get('ds_0', SimpleNamespace(
+                recursive=True, directory=True, output=self.dir + os.sep))
+
+    def plan(self, client=None):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()) as err:
+            self.resource_session(client).apply('ds_0', {}, SimpleNamespace(
+                input=os.path.join(self.dir, 'ds_0'), recursive=True, config={}, delete=False,
+                dry_run=False, plan=True, force=False))
+        # the plan alone, without a line per unchanged resource
+        self.assertNotIn('UNCHANGED', err.getvalue())
+        lines = out.getvalue().splitlines()
+        return lines[-1], {line.split(': ')[1] for line in lines[:-1]
+                           if line.strip().startswith(resource.PLAN_UPDATE)}
+
+    def test_round_trip(self):
+        self.get()
+        summary, updates = self.plan()
+        # definitions changed on export, such as read connectors given a default
+        # update period, compare equal; credentials cannot be compared
+        self.assertEqual(updates, {'ds_0.df_0.secure_read'})
+        self.assertEqual(summary, 'Plan: 0 to create, 1 to update, 0 to delete, 13 unchanged')
+
+    def test_changed(self):
+        self.get()
+        path = os.path.join(self.dir, 'ds_0', 'df_1', 'read_0.yaml')
+        with open(path) as f:
+            definition = f.read()
+        with open(path, 'w') as f:
+            f.write(definition.replace('name: read_0', 'name: renamed'))
+        _, updates = self.plan()
+        self.assertEqual(updates, {'ds_0.df_0.secure_read', 'ds_0.df_1.read_0'})
+
+    def test_cached_state(self):
+        client = self.server.client()
+        client.session.cache = SnapshotCache(self.server.hostname, ttl=600,
+                                             cache_dir=os.path.join(self.dir, 'cache'))
+        self.get(client)
+        # gone since the export, which the cached listings do not know
+        self.env.delete_component(('ds_0', 'df_1'), 'read_0')
+        summary, updates = self.plan(client)
+        self.assertEqual(summary, 'Plan: 1 to create, 2 to update, 0 to delete, 11 unchanged')
+        # as is the transform reading from it, whose input no longer resolves
+        self.assertEqual(updates, {'ds_0.df_0.secure_read', 'ds_0.df_1.transform_1'})
+        # reads outside of apply are still served from the cache
+        self.server.reset_stats()
+        client.get_data_service('ds_0')
+        self.assertEqual(sum(self.server.requests.values()), 0)
+
+    def test_cached_delete(self):
+        client = self.server.client()
+        client.session.cache = SnapshotCache(self.server.hostname, ttl=600,
+                                             cache_dir=os.path.join(self.dir, 'cache'))
+        self.get(client)
+        # created since the export, which the cached listings do not know
+        self.env.add_component('ds_0', 'df_1', 'pub', 'added', {
+            'inputUUID': self.env.components[('ds_0', 'df_1')]['read_0']['uuid']})
+        with self.assertRaisesRegex(ValueError, 'contains data feeds'):
+            self.resource_session(client).delete('ds_0.df_1', SimpleNamespace(
+                recursive=True, dry_run=True))
@@ -0,0 +1,314 @@
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+from email.utils import formatdate
+
+import requests
+from requests import HTTPError
+
+from ascend.auth import token_expiry
+from ascend.fake_api import FakeAscendServer, FakeEnvironment
+from ascend.session import NO_RETRY, DeadlineExceeded, RetryPolicy, Session, \
+    parse_retry_after
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeAscendServer(FakeEnvironment.synthetic(data_services=2)).start()
+        self.session = self.server.session(retry=RetryPolicy(retries=3, backoff=0.01))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def count(self, method, endpoint):
+        return self.server.requests[(method, '/api/v1/' + endpoint)]
+
+    def test_get_retried(self):
+        self.server.inject_errors(count=2, status=503)
+        self.assertEqual(len(self.session.get('organizations')['data']), 2)
+        self.assertEqual(self.count('GET', 'organizations'), 3)
+
+    def test_retries_run_out(self):
+        self.server.inject_errors(count=10, status=502)
+        with self.assertRaises(HTTPError) as cm:
+            self.session.get('organizations')
+        self.assertEqual(cm.exception.response.status_code, 502)
+        self.assertEqual(self.count('GET', 'organizations'), 4)
+
+    def test_not_retried(self):
+        self.server.inject_errors(count=1, status=500)
+        with self.assertRaises(HTTPError):
+            self.session.get('organizations')
+        self.assertEqual(self.count('GET', 'organizations'), 1)
+
+    def test_post_idempotency(self):
+        data = {'id': 'ds_new', 'name': 'ds_new'}
+        self.server.inject_errors(count=1, status=503)
+        with self.assertRaises(HTTPError):
+            self.session.post('organizations', data)
+        self.assertEqual(self.count('POST', 'organizations'), 1)
+
+        # too many requests were not processed, and any request may be sent again
+        self.server.inject_errors(count=1, status=429)
+        self.session.post('organizations', data)
+        self.assertEqual(self.count('POST', 'organizations'), 3)
+
+        self.server.inject_errors(count=1, status=503)
+        self.session.post('organizations', dict(data, id='ds_other'), idempotent=True)
+        self.assertEqual(self.count('POST', 'organizations'), 5)
+
+    def test_retry_after(self):
+        self.server.inject_errors(count=1, status=503, retry_after=0.3)
+        start = time.monotonic()
+        self.session.get('organizations')
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+        # a longer wait than allowed gives up at once
+        session = self.server.session(retry=RetryPolicy(backoff=0.01, max_retry_after=1))
+        self.server.inject_errors(count=1, status=503, retry_after=60)
+        with self.assertRaises(HTTPError):
+            session.get('organizations')
+
+    def test_deadlines(self):
+        session = self.server.session(retry=RetryPolicy(backoff=0.01, deadline=0.2))
+        self.server.inject_errors(count=1, status=503, retry_after=1)
+        start = time.monotonic()
+        with self.assertRaises(HTTPError):
+            session.get('organizations')
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        with self.session.deadline(0.2):
+            with self.session.deadline(60):
+                self.assertEqual(len(self.session.get('organizations')['data']), 2)
+                time.sleep(0.25)
+                with self.assertRaises(DeadlineExceeded):
+                    self.session.get('organizations')
+        self.assertEqual(len(self.session.get('organizations')['data']), 2)
+
+    def test_stream_retried(self):
+        comp = self.session.get('organizations/ds_0/projects/df_0/components')['data'][0]
+        endpoint = f'organizations/ds_0/projects/df_0/sources/{comp["id"]}/records-stream'
+        self.server.inject_errors(count=1, status=503, path=endpoint)
+        self.assertEqual(list(self.session.stream(endpoint)), [])
+        self.assertEqual(self.count('GET', endpoint), 2)
+
+    def test_connection_refused(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        # the request was never sent, so even a POST may be sent again
+        with mock.patch('ascend.session.time.sleep') as sleep:
+            with self.assertRaises(requests.ConnectionError):
+                self.session.send(requests.Session(), 'POST', f'http://127.0.0.1:{port}/')
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 30, usegmt=True)),
+                               30, delta=2)
+        self.assertEqual(parse_retry_after(formatdate(0, usegmt=True)), 0.0)
+
+
+class TestTokenRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeAscendServer(FakeEnvironment.synthetic(), token_ttl=2).start()
+        self.addCleanup(self.server.stop)
+
+    def session(self):
+        session = self.server.session()
+        session.authenticate()
+        return session
+
+    def get_all(self, session, threads=16, replays=0):
+        errors = []
+
+        def get():
+            try:
+                session.get('organizations')
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=get) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.server.requests[('GET', '/api/v1/organizations')],
+                         threads + replays)
+
+    def test_tokens_published_last(self):
+        published = []
+
+        class Recording(Session):
+            def __setattr__(self, name, value):
+                if name == 'access_token' and value is not None:
+                    # what another thread finds once it sees the token set
+                    published.append((value, self.bearer_session.auth.access_token,
+                                      self._token_stale_at is not None))
+                super().__setattr__(name, value)
+
+        session = Recording(self.server.hostname, self.server.access_key,
+                            self.server.secret_key, base_uri=self.server.base_uri)
+        session.get('organizations')
+        self.server.expire_tokens()
+        session.get('organizations')
+        self.assertEqual(len(published), 2)
+        for token, auth_token, timed in published:
+            self.assertEqual(auth_token, token)
+            self.assertTrue(timed)
+
+    def test_background_refresh(self):
+        session = self.session()
+        token = session.access_token
+        # past the refresh point, 0.4s before the expiry
+        time.sleep(1.65)
+        session.get('organizations')
+        for _ in range(100):
+            if session.access_token != token:
+                break
+            time.sleep(0.01)
+        self.assertNotEqual(session.access_token, token)
+        self.assertEqual(self.server.token_exchanges, 2)
+        # no request was refused and replayed
+        self.assertEqual(self.server.requests[('GET', '/api/v1/organizations')], 1)
+
+    def test_single_flight(self):
+        session = self.session()
+        # past the point where requests wait for a new token
+        time.sleep(1.85)
+        self.get_all(session)
+        self.assertEqual(self.server.token_exchanges, 2)
+
+    def test_revoked_token(self):
+        session = self.session()
+        self.server.expire_tokens()
+        self.server.reset_stats()
+        # each request refused before the exchange is replayed once, after it
+        self.get_all(session, threads=1, replays=1)
+        self.assertEqual(self.server.token_exchanges, 1)
+
+        # a rejected refresh token falls back to the access keys
+        self.server.expire_tokens()
+        self.server.refresh_tokens.clear()
+        self.assertEqual(len(session.get('organizations')['data']), 1)
+        self.assertEqual(self.server.token_exchanges, 2)
+
+    def test_lazy_authentication(self):
+        session = self.server.session()
+        self.assertEqual(self.server.token_exchanges, 0)
+        # concurrent first requests share the exchange
+        self.get_all(session)
+        self.assertEqual(self.server.token_exchanges, 1)
+
+    def test_prewarm(self):
+        session = self.server.session()
+        session._prewarm.join()
+        manager = session.signed_session.get_adapter(session.base_uri).poolmanager
+
+        def connections():
+            return sum(manager.pools[key].num_connections for key in manager.pools.keys())
+
+        self.assertEqual(connections(), 1)
+        # the token exchange goes out on the open connection
+        session.authenticate()
+        self.assertEqual(connections(), 1)
+        self.assertIsNone(self.server.session(prewarm=False)._prewarm)
+
+    def test_prewarm_stalled(self):
+        # a server which accepts connections, but never completes a TLS handshake
+        with socket.socket() as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen(8)
+            session = Session(self.server.hostname, self.server.access_key,
+                              self.server.secret_key,
+                              base_uri=f'https://127.0.0.1:{server.getsockname()[1]}/',
+                              connect_timeout=0.5, read_timeout=0.5, retry=NO_RETRY)
+            start = time.monotonic()
+            with self.assertRaises(requests.Timeout):
+                session.get('organizations')
+            # the request waited no longer than its own timeouts for the pre-warm
+            self.assertLess(time.monotonic() - start, 3)
+            # the stalled pre-warm gave up as well
+            time.sleep(0.2)
+            self.assertFalse(any(t.name == 'ascend-prewarm' and t.is_alive()
+                                 for t in threading.enumerate()))
+
+    def test_token_expiry(self):
+        session = self.session()
+        self.assertAlmostEqual(token_expiry(session.access_token), time.time() + 2, delta=2)
+        for token in (None, '', 'opaque', 'a.b.c', 'a.bnVsbA.c'):
+            self.assertIsNone(token_expiry(token))
+
+
+class TestPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeAscendServer(FakeEnvironment.synthetic()).start()
+        self.addCleanup(self.server.stop)
+
+    def get_all(self, session, threads=8):
+        workers = [threading.Thread(target=session.get, args=('organizations',))
+                   for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_shared_pool(self):
+        session = self.server.session()
+        session.get('organizations')
+        self.server.expire_tokens()
+        session.get('organizations')
+        stats = session.pool_stats()
+        # the pre-warmed connection served the exchange, the refresh and the requests
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(self.server.token_exchanges, 2)
+
+    def test_saturation(self):
+        self.server.latency = 0.05
+        small = self.server.session(pool_size=2)
+        small.authenticate()
+        self.get_all(small)
+        stats = small.pool_stats()
+        self.assertGreater(stats['saturated'], 0)
+        self.assertGreater(stats['discarded'], 0)
+        self.assertGreater(stats['peak_in_use'], 2)
+        self.assertEqual(stats['in_use'], 0)
+
+        large = self.server.session(pool_size=8)
+        large.authenticate()
+        self.get_all(large)
+        stats = large.pool_stats()
+        self.assertEqual((stats['saturated'], stats['discarded']), (0, 0))
+        with self.assertRaises(ValueError):
+            self.server.session(pool_size=0)
+
+    def test_keep_alive(self):
+        session = self.server.session(keep_alive=False, prewarm=False)
+        for _ in range(3):
+            session.get('organizations')
+        stats = session.pool_stats()
+        self.assertEqual(stats['opened'], stats['requests'])
+
+    def test_timeouts(self):
+        session = self.server.session(read_timeout=0.1, retry=NO_RETRY)
+        session.authenticate()
+        self.assertEqual(session.timeout, (10.0, 0.1))
+        self.server.latency = 0.5
+        with self.assertRaises(requests.ReadTimeout):
+            session.get('organizations')
+        # the policy's timeout takes precedence
+        session.retry = RetryPolicy(retries=0, timeout=2)
+        self.assertEqual(len(session.get('organizations')['data']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()